@@ -1,5 +1,7 @@
 import time
+import calendar
 import threading
+from datetime import datetime
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlparse
@@ -8,14 +10,18 @@ from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as
 import requests
 import feedparser
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.exc import IntegrityError
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
-from langchain_community.document_loaders import WebBaseLoader
+from bs4 import BeautifulSoup
+
+import http_cache # Cache em disco compartilhado com a E3 (evita baixar a mesma página duas vezes)
+import metricas
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import setup_db
 
 # --- CONFIGURAÇÕES DE DB E AMBIENTE (PADRÃO CI/CD) ---
 load_dotenv()
@@ -66,16 +72,8 @@ HEADERS = {"User-Agent": "Mozilla/5.0 (feed-fetcher/1.0)"}
 
 # ---------------------- FUNÇÕES DE BANCO DE DADOS (NOVO) ----------------------
 def get_db_engine():
-    """Cria e verifica a engine do SQLAlchemy."""
-    try:
-        engine = create_engine(DB_URL)
-        with engine.connect() as connection:
-            connection.execute(text(f"SELECT 1"))
-        print(f"✅ Conexão com o DB estabelecida: {DB_URL.split('://')[0]}")
-        return engine
-    except SQLAlchemyError as e:
-        print(f"🚨 ERRO CRÍTICO: Não foi possível conectar ao banco de dados em {DB_URL}. Erro: {e}")
-        raise RuntimeError("Falha na conexão com o Banco de Dados.")
+    """Engine compartilhada do DB, com pool e pragmas do SQLite (ver armazenamento.py)."""
+    return armazenamento.get_db_engine(DB_URL)
 
 def get_urls_historicas_db(engine) -> set:
     """Consulta o DB para obter todas as URLs existentes (histórico)."""
@@ -98,14 +96,15 @@ def save_to_db(df: pd.DataFrame, engine):
     """Salva o DataFrame no banco de dados com tratamento de duplicidade."""
     print(f"Salvando {len(df)} novos registros na tabela '{TABLE_NAME}'...")
     try:
-        df.to_sql(
+        armazenamento.escrever(engine, lambda connection: df.to_sql(
             TABLE_NAME, 
-            engine, 
+            connection, 
             if_exists='append', 
             index=False,
             # Se fosse PostgreSQL, poderia usar: conflict='ignore', se a coluna 'url' for UNIQUE
-        )
+        ))
         print(f"✅ {len(df)} registros salvos com sucesso no DB.")
+        metricas.incrementar('linhas_atualizadas_total', len(df), etapa='E1')
     except IntegrityError as e:
         # Geralmente, indica que uma URL duplicada tentou ser inserida (se a coluna 'url' for UNIQUE)
         print(f"⚠️ Aviso: Falha de Integridade (Duplicidade). Alguns registros foram ignorados pelo DB.")
@@ -149,14 +148,26 @@ def coletar_links_feeds(default_feeds: dict, max_workers: int = 8):
             chave, feed = futuros[fut]
             try:
                 parsed = fut.result()
+                metricas.incrementar('feeds_baixados_total', resultado='ok')
                 for entry in getattr(parsed, 'entries', []):
                     link = getattr(entry, 'link', None)
                     if link:
-                        tarefas.append({'chave': chave, 'url_google': link})
+                        tarefas.append({'chave': chave, 'url_google': link, 'publicado_em': _data_publicacao(entry)})
             except Exception as e:
+                metricas.incrementar('feeds_baixados_total', resultado='falha')
                 print(f"AVISO: Falha ao baixar feed '{feed}' ({chave}): {e}")
     return tarefas
 
+def _data_publicacao(entry):
+    """Data de publicação da entrada do feed (UTC no feedparser) convertida para a hora local, como timestamp_e1."""
+    data = getattr(entry, 'published_parsed', None) or getattr(entry, 'updated_parsed', None)
+    if not data:
+        return None
+    try:
+        return datetime.fromtimestamp(calendar.timegm(data))
+    except (OverflowError, ValueError):
+        return None
+
 def _eh_intermediario_google(url: str) -> bool:
     try:
         host = (urlparse(url).hostname or "").lower()
@@ -233,37 +244,56 @@ MIN_TITULO_CHARS = 8
 MIN_TOTAL_CHARS = 12
 BLACKLIST_TITULOS = {"home", "login", "index of", "redirecting", "oops", "error"}
 
-def _invalida_por_conteudo(titulo: str, subtitulo: str) -> bool:
+def _motivo_descarte(titulo: str, subtitulo: str):
+    """Motivo pelo qual a página é descartada (rótulo da métrica de descartes), ou None se for válida."""
     titulo = (titulo or "").strip()
     subtitulo = (subtitulo or "").strip()
+    if not titulo or not subtitulo: # _texto_suspeito também recusa campos vazios
+        return "vazio"
     if _texto_suspeito(titulo) or _texto_suspeito(subtitulo):
-        return True
-    if not titulo and not subtitulo:
-        return True
+        return "bloqueio"
     if len(titulo) < MIN_TITULO_CHARS and len((titulo + " " + subtitulo).strip()) < MIN_TOTAL_CHARS:
-        return True
+        return "curto"
     if titulo.lower() in BLACKLIST_TITULOS:
-        return True
-    return False
+        return "blacklist"
+    return None
 
-def extrair_conteudo_worker(chave, url):
+def _invalida_por_conteudo(titulo: str, subtitulo: str) -> bool:
+    return _motivo_descarte(titulo, subtitulo) is not None
+
+def _extrair_metadados(html: str, url: str) -> dict:
+    """Extrai título e descrição da página (mesmos campos que o WebBaseLoader expunha)."""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {'source': url}
+    if soup.title:
+        metadata['title'] = soup.title.get_text()
+    descricao = soup.find("meta", attrs={"name": "description"})
+    if descricao:
+        metadata['description'] = descricao.get("content", "No description found.") # Mesmo padrão do WebBaseLoader
+    return metadata
+
+def extrair_conteudo_worker(chave, url, publicado_em=None):
+    """
+    Baixa a página (via cache HTTP) e monta a linha da notícia, ou None se ela for descartada.
+    Respostas 4xx/5xx são descartadas com motivo 'http': a página de erro nunca chega a
+    _motivo_descarte (o WebBaseLoader devolvia o corpo do erro e o descarte dependia do conteúdo).
+    """
     try:
-        try:
-            loader = WebBaseLoader(url, requests_kwargs={"timeout": (5, 15)})
-        except TypeError:
-            loader = WebBaseLoader(url)
-
-        data = loader.load()
-        if not data:
+        # O HTML fica no cache em disco para que a E3 faça o parse sem novo download
+        html = http_cache.baixar_com_cache(url)
+        if not html:
+            metricas.incrementar('descartes_total', motivo='sem_conteudo')
             print(f"    · DESCARTADO: nenhum conteúdo retornado — {url[:90]}")
             return None
 
-        metadata = data[0].metadata or {}
+        metadata = _extrair_metadados(html, url)
         titulo = (metadata.get('title', '') or '').strip()
         subtitulo = (metadata.get('description', '') or '').strip()
 
-        if _invalida_por_conteudo(titulo, subtitulo):
-            print(f"    · DESCARTADO: conteúdo inválido/bloqueado — {url[:90]}")
+        motivo = _motivo_descarte(titulo, subtitulo)
+        if motivo:
+            metricas.incrementar('descartes_total', motivo=motivo)
+            print(f"    · DESCARTADO: conteúdo inválido/bloqueado ({motivo}) — {url[:90]}")
             return None
 
         # Estrutura do DB: Note que os campos vazios (alvo, classificacao, etc) 
@@ -281,12 +311,128 @@ def extrair_conteudo_worker(chave, url):
             'descricao': None,
             'justificativa_alvo': None,
             'status_e2': 'PENDENTE', # NOVO: Ajuda na orquestração da próxima etapa (E2)
-            'timestamp_e1': pd.Timestamp.now() # NOVO: Para registro do tempo de coleta
+            'timestamp_e1': pd.Timestamp.now(), # NOVO: Para registro do tempo de coleta
+            'publicado_em': publicado_em # Data do feed (latência publicação -> ingestão)
         }
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else '?'
+        metricas.incrementar('descartes_total', motivo='http')
+        print(f"    · DESCARTADO: página respondeu HTTP {status} — {url[:90]}")
+        return None
     except Exception as e:
+        metricas.incrementar('descartes_total', motivo='erro')
         print(f"    · DESCARTADO: erro na extração ({type(e).__name__}) — {url[:90]}")
         return None
 
+def coletar_novas_noticias(engine, urls_historicas: set, links_vistos: set = None) -> list:
+    """
+    Etapas 1 a 4 da E1: feeds -> resolução dos links -> metadados -> inserção no DB.
+    'urls_historicas' é atualizado com as URLs inseridas; 'links_vistos' (opcional, modo daemon)
+    guarda os links dos feeds já tratados para que ciclos seguintes os ignorem.
+    Retorna as URLs inseridas.
+    """
+    # ETAPA 1: Coleta dos links dos feeds RSS
+    print("\n[ETAPA 1/4] Coletando links dos feeds RSS...")
+    tarefas_rss = coletar_links_feeds(DEFAULT_FEEDS, max_workers=MAX_WORKERS_FEEDS)
+    print(f"✅ Etapa 1 concluída: {len(tarefas_rss)} links encontrados nos feeds.")
+
+    if not tarefas_rss:
+        print("\n⚠️ Nenhum link obtido dos feeds. Encerrando.")
+        return []
+
+    # Modo daemon: links do feed já vistos em ciclos anteriores não passam de novo pelo Selenium
+    if links_vistos is not None:
+        tarefas_rss = [t for t in tarefas_rss if t['url_google'] not in links_vistos]
+        links_vistos.update(t['url_google'] for t in tarefas_rss)
+        print(f"  -> {len(tarefas_rss)} link(s) inédito(s) neste ciclo.")
+
+    # ETAPA 2: Resolver links e filtrar duplicatas/histórico
+    print(f"\n[ETAPA 2/4] Resolvendo {len(tarefas_rss)} links do Google News com {MAX_WORKERS_SELENIUM} workers...")
+    links_finais_brutos = []
+
+    # 2.1 e 2.2 (Lógica de resolução de links mantida)
+    for t in tarefas_rss:
+        if not precisa_selenium(t['url_google']):
+            links_finais_brutos.append({'chave': t['chave'], 'url_final': t['url_google'], 'publicado_em': t['publicado_em']})
+            metricas.incrementar('links_resolvidos_total', metodo='direto')
+
+    tarefas_selenium = [t for t in tarefas_rss if precisa_selenium(t['url_google'])]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS_SELENIUM) as executor:
+        future_to_tarefa = {executor.submit(obter_link_final_otimizado, t['url_google']): t for t in tarefas_selenium}
+        for i, future in enumerate(as_completed(future_to_tarefa)):
+            t = future_to_tarefa[future]
+            print(f"  - Progresso: [{i + 1}/{len(tarefas_selenium)}] Resolvido para '{t['chave']}'...")
+            try:
+                url_final = future.result(timeout=20)
+            except Exception:
+                url_final = None # Erros já são logados na função obter_link_final_otimizado
+            if url_final:
+                links_finais_brutos.append({'chave': t['chave'], 'url_final': url_final, 'publicado_em': t['publicado_em']})
+            metricas.incrementar('links_resolvidos_total', metodo='selenium' if url_final else 'falha')
+
+    # deduplicação e filtro por DB
+    urls_vistas = set()
+    links_finais = []
+    for link_info in links_finais_brutos:
+        # 1. Deduplicação interna
+        if link_info['url_final'] not in urls_vistas:
+            urls_vistas.add(link_info['url_final'])
+
+            # 2. Filtro por histórico do DB
+            if link_info['url_final'] not in urls_historicas:
+                links_finais.append(link_info)
+
+    removidos = len(links_finais_brutos) - len(links_finais)
+    print(f"✅ Etapa 2 concluída. Links únicos após filtros: {len(links_finais)}")
+    print(f"  ->  Total de links removidos (Duplicados/Histórico): {removidos}")
+
+
+    if not links_finais:
+        print("\n✅ Nenhuma notícia nova para processar. Encerrando.")
+        return []
+
+    # ETAPA 3: Extração de metadados em paralelo
+    print(f"\n[ETAPA 3/4] Extraindo metadados de {len(links_finais)} NOVOS links...")
+    dados_para_df = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS_EXTRACAO) as executor:
+        future_to_url = {
+            executor.submit(extrair_conteudo_worker, tarefa['chave'], tarefa['url_final'], tarefa['publicado_em']): tarefa['url_final']
+            for tarefa in links_finais
+        }
+        for i, future in enumerate(as_completed(future_to_url)):
+            print(f"  - Progresso: [{i + 1}/{len(links_finais)}] Conteúdo extraído...")
+            try:
+                resultado = future.result()
+                if resultado:
+                    dados_para_df.append(resultado)
+            except Exception as e:
+                print(f"AVISO: Future falhou ({type(e).__name__})")
+                continue
+
+    print(f"✅ Etapa 3 concluída: {len(dados_para_df)} conteúdos válidos extraídos.")
+    descartados = len(links_finais) - len(dados_para_df)
+    print(f"  -> Descuidos/Inválidos descartados nesta fase: {descartados}")
+
+    # ETAPA 4: SALVAMENTO NO BANCO DE DADOS (Substitui CSV)
+    if dados_para_df:
+        noticias_para_analise = pd.DataFrame(dados_para_df)
+        save_to_db(noticias_para_analise, engine)
+        urls_historicas.update(noticias_para_analise['url'])
+        print(f"✅ Etapa 4 concluída: {len(noticias_para_analise)} novas notícias inseridas no DB para análise subsequente (E2).")
+        return noticias_para_analise['url'].tolist()
+    print("⚠️ Nenhuma notícia válida foi processada. Nada foi inserido no DB.")
+    return []
+
+def fechar_drivers():
+    """Encerra os Chrome criados pelas threads de resolução de links."""
+    for d in set(DRIVERS_CRIADOS):
+        try:
+            d.quit()
+        except Exception:
+            pass
+    DRIVERS_CRIADOS.clear()
+
 # ---------------------- MAIN - FLUXO ORQUESTRADO ----------------------
 
 def main():
@@ -297,93 +443,13 @@ def main():
     DB_ENGINE = None
     try:
         DB_ENGINE = get_db_engine()
+        setup_db.garantir_schema(DB_ENGINE) # Colunas novas (ex.: publicado_em) em bancos antigos
         
         # ETAPA 0: Carregar URLs existentes do DB (Substitui CSV)
         urls_historicas = get_urls_historicas_db(DB_ENGINE)
         print(f"✅ Etapa 0 concluída: {len(urls_historicas)} URLs encontradas no histórico do DB.")
 
-        # ETAPA 1: Coleta dos links dos feeds RSS
-        print("\n[ETAPA 1/4] Coletando links dos feeds RSS...")
-        tarefas_rss = coletar_links_feeds(DEFAULT_FEEDS, max_workers=MAX_WORKERS_FEEDS)
-        print(f"✅ Etapa 1 concluída: {len(tarefas_rss)} links encontrados nos feeds.")
-
-        if not tarefas_rss:
-            print("\n⚠️ Nenhum link obtido dos feeds. Encerrando.")
-            return
-
-        # ETAPA 2: Resolver links e filtrar duplicatas/histórico
-        print(f"\n[ETAPA 2/4] Resolvendo {len(tarefas_rss)} links do Google News com {MAX_WORKERS_SELENIUM} workers...")
-        links_finais_brutos = []
-
-        # 2.1 e 2.2 (Lógica de resolução de links mantida)
-        for t in tarefas_rss:
-            if not precisa_selenium(t['url_google']):
-                links_finais_brutos.append({'chave': t['chave'], 'url_final': t['url_google']})
-
-        tarefas_selenium = [t for t in tarefas_rss if precisa_selenium(t['url_google'])]
-
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_SELENIUM) as executor:
-            future_to_tarefa = {executor.submit(obter_link_final_otimizado, t['url_google']): t for t in tarefas_selenium}
-            for i, future in enumerate(as_completed(future_to_tarefa)):
-                t = future_to_tarefa[future]
-                print(f"  - Progresso: [{i + 1}/{len(tarefas_selenium)}] Resolvido para '{t['chave']}'...")
-                try:
-                    url_final = future.result(timeout=20)
-                    if url_final:
-                        links_finais_brutos.append({'chave': t['chave'], 'url_final': url_final})
-                except Exception:
-                    pass # Erros já são logados na função obter_link_final_otimizado
-
-        # deduplicação e filtro por DB
-        urls_vistas = set()
-        links_finais = []
-        for link_info in links_finais_brutos:
-            # 1. Deduplicação interna
-            if link_info['url_final'] not in urls_vistas:
-                urls_vistas.add(link_info['url_final'])
-                
-                # 2. Filtro por histórico do DB
-                if link_info['url_final'] not in urls_historicas:
-                    links_finais.append(link_info)
-
-        removidos = len(links_finais_brutos) - len(links_finais)
-        print(f"✅ Etapa 2 concluída. Links únicos após filtros: {len(links_finais)}")
-        print(f"  ->  Total de links removidos (Duplicados/Histórico): {removidos}")
-
-
-        if not links_finais:
-            print("\n✅ Nenhuma notícia nova para processar. Encerrando.")
-            return
-
-        # ETAPA 3: Extração de metadados em paralelo
-        print(f"\n[ETAPA 3/4] Extraindo metadados de {len(links_finais)} NOVOS links...")
-        dados_para_df = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_EXTRACAO) as executor:
-            future_to_url = {
-                executor.submit(extrair_conteudo_worker, tarefa['chave'], tarefa['url_final']): tarefa['url_final']
-                for tarefa in links_finais
-            }
-            for i, future in enumerate(as_completed(future_to_url)):
-                print(f"  - Progresso: [{i + 1}/{len(links_finais)}] Conteúdo extraído...")
-                try:
-                    resultado = future.result()
-                    if resultado:
-                        dados_para_df.append(resultado)
-                except Exception as e:
-                    print(f"AVISO: Future falhou ({type(e).__name__})")
-                    continue
-
-        print(f"✅ Etapa 3 concluída: {len(dados_para_df)} conteúdos válidos extraídos.")
-        descartados = len(links_finais) - len(dados_para_df)
-        print(f"  -> Descuidos/Inválidos descartados nesta fase: {descartados}")
-
-        # ETAPA 4: SALVAMENTO NO BANCO DE DADOS (Substitui CSV)
-        if dados_para_df:
-            noticias_para_analise = pd.DataFrame(dados_para_df)
-            save_to_db(noticias_para_analise, DB_ENGINE)
-            print(f"✅ Etapa 4 concluída: {len(noticias_para_analise)} novas notícias inseridas no DB para análise subsequente (E2).")
-        else:
-            print("⚠️ Nenhuma notícia válida foi processada. Nada foi inserido no DB.")
+        coletar_novas_noticias(DB_ENGINE, urls_historicas)
 
     except RuntimeError as e:
         # Captura erros críticos como falha na conexão com o DB
@@ -392,11 +458,7 @@ def main():
         print(f"\n🚨 ERRO GERAL NO FLUXO: {e}")
     
     finally:
-        for d in set(DRIVERS_CRIADOS):
-            try:
-                d.quit()
-            except Exception:
-                pass
+        fechar_drivers()
         end_time = time.time()
         print(f"\n🏁 PROCESSO E1 CONCLUÍDO em {end_time - start_time:.2f} segundos. 🏁")
 
@@ -2,11 +2,18 @@ from dotenv import load_dotenv
 import os
 import time
 import json
+from datetime import datetime
 from groq import Groq
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import reservas
+import setup_db
+import metricas
+import prioridade # Critério de notícias prioritárias (pré-extração especulativa da E3)
+import textos_frios # resposta_modelo fica comprimida fora da linha quente
 
 # --- CONFIGURAÇÕES DE DB E AMBIENTE (PADRÃO CI/CD) ---
 load_dotenv()
@@ -19,6 +26,12 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MAX_WORKERS_API = int(os.getenv("MAX_WORKERS_API", 1)) 
 SLEEP_PER_CALL = float(os.getenv("SLEEP_API", 15.0)) # Aumentado para 1.0s
 
+# Pré-extração especulativa: enquanto a E2 espera o rate limit, a E3 já baixa o texto das notícias prioritárias
+E2_PREFETCH_E3 = os.getenv("E2_PREFETCH_E3", "false").lower() in ("1", "true", "sim")
+# Tempo máximo de classificação por execução (0 = sem limite); a fila é atendida por prioridade,
+# então o que sobra para a próxima execução é o de menor valor
+E2_ORCAMENTO_SEGUNDOS = float(os.getenv("E2_ORCAMENTO_SEGUNDOS", 0))
+
 # --------- Utilidades de log e sanitização ---------
 def log(msg: str):
     print(f"[{time.strftime('%H:%M:%S')}] {msg}")
@@ -31,51 +44,45 @@ def sanitize_text(x):
 # --------- Funções de DB ---------
 
 def get_db_engine():
-    """Cria e retorna a engine do SQLAlchemy."""
-    try:
-        engine = create_engine(DB_URL)
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return engine
-    except SQLAlchemyError as e:
-        log(f"🚨 ERRO CRÍTICO: Falha na conexão com o Banco de Dados. Erro: {e}")
-        raise RuntimeError("Falha na conexão com o DB.")
-
-def load_pending_news(engine: create_engine) -> pd.DataFrame:
-    """Carrega apenas as notícias que a Etapa 1 inseriu e ainda não foram classificadas."""
-    log(f"Buscando notícias com status_e2='PENDENTE' na tabela '{TABLE_NAME}'...")
-    
-    # Seleciona apenas as colunas necessárias e filtra pelo status
-    query = f"""
-    SELECT url, titulo, subtitulo
+    """Engine compartilhada do DB, com pool e pragmas do SQLite (ver armazenamento.py)."""
+    return armazenamento.get_db_engine(DB_URL)
+
+# Fila da E2 (índice parcial ix_noticias_fila_e2, ver migracoes.py)
+CONSULTA_FILA_E2 = f"""
+    SELECT url, titulo, subtitulo, gestora
     FROM {TABLE_NAME}
     WHERE status_e2 = 'PENDENTE'
     """
+
+def load_pending_news(engine: create_engine, urls=None) -> list:
+    """
+    Carrega (como dicts) as notícias que a Etapa 1 inseriu e ainda não foram classificadas,
+    opcionalmente só das 'urls' (um bloco da fila, ver setup_db.urls_da_fila).
+    """
+    # Seleciona apenas as colunas necessárias e filtra pelo status
     try:
-        df = pd.read_sql(query, engine)
-        return df
+        consulta, params = setup_db.consulta_pendentes(CONSULTA_FILA_E2, urls)
+        with engine.connect() as connection:
+            return [dict(linha) for linha in connection.execute(consulta, params).mappings()]
     except Exception as e:
         log(f"🚨 ERRO ao carregar notícias pendentes do DB: {e}")
         raise
 
 def update_news_classification(engine: create_engine, data: list):
-    """Atualiza as linhas do DB com os resultados da classificação."""
+    """Atualiza as linhas do DB com os resultados da classificação (resposta_modelo vai para a tabela fria)."""
     log(f"Iniciando atualização de {len(data)} linhas no DB...")
     
-    # Prepara o comando SQL de UPDATE
-    update_template = f"""
-    UPDATE {TABLE_NAME}
-    SET interesse = :interesse,
-        classificacao = :classificacao,
-        resposta_modelo = :resposta_modelo,
-        status_e2 = 'CONCLUIDO'
-    WHERE url = :url
-    """
+    # UPDATE único para o lote: interesse, classificacao, timestamp_e2 e status_e2 = 'CONCLUIDO'
+    agora = datetime.now()
+    data = [{**d, 'timestamp_e2': agora} for d in data]
+    def gravar(connection):
+        armazenamento.atualizar_em_lote(connection, TABLE_NAME, data, ['interesse', 'classificacao', 'timestamp_e2'],
+                                        expressoes={'status_e2': "'CONCLUIDO'"})
+        textos_frios.gravar_textos(connection, data, 'resposta_modelo')
     try:
-        with engine.begin() as connection:
-            # Executa o comando UPDATE para cada resultado
-            connection.execute(text(update_template), data)
+        armazenamento.escrever(engine, gravar)
         log(f"✅ {len(data)} linhas atualizadas com sucesso.")
+        metricas.incrementar('linhas_atualizadas_total', len(data), etapa='E2')
     except Exception as e:
         log(f"🚨 ERRO ao atualizar o DB: {e}")
         raise
@@ -112,7 +119,7 @@ Título: {titulo}
 Subtítulo: {subtitulo}
 """.strip()
 
-def classify_worker(row: pd.Series, client: Groq):
+def classify_worker(row: dict, client: Groq):
     """Worker que chama a API, trata erros e retorna o resultado formatado."""
     url = row['url']
     titulo = sanitize_text(row.get("titulo", ""))
@@ -145,20 +152,122 @@ def classify_worker(row: pd.Series, client: Groq):
 
             # Validação: se o LLM falhar no formato, forçamos 'N' e 'L0'
             if interesse not in {"S", "N"} or not classificacao.startswith("L"):
+                metricas.incrementar('chamadas_llm_total', etapa='E2', resultado='fora_do_padrao')
                 log(f"Aviso: LLM fora do padrão. URL: {url[:50]}...")
             else:
+                metricas.incrementar('chamadas_llm_total', etapa='E2', resultado='ok')
                 result_data['interesse'] = interesse
                 result_data['classificacao'] = classificacao
         
         except json.JSONDecodeError:
+            metricas.incrementar('chamadas_llm_total', etapa='E2', resultado='json_invalido')
             log(f"ERRO: Resposta não é JSON válido. URL: {url[:50]}...")
 
     except Exception as e:
+        metricas.incrementar('chamadas_llm_total', etapa='E2', resultado='erro')
         log(f"ERRO ao chamar a API para URL {url[:50]}...: {type(e).__name__} (RateLimit?)")
         
     return result_data
 
 
+def classificar_pendentes(engine, client: Groq, urls=None) -> list:
+    """
+    Classifica as notícias pendentes (todas, ou só as 'urls' informadas) e grava o resultado.
+    Com RESERVA_LOTE, a fila é processada em lotes reservados por este worker (ver reservas.py).
+    Retorna as URLs classificadas com interesse='S' (entrada da E3).
+    """
+    # O orçamento vale para a execução inteira, não para cada lote reservado
+    prazo = time.monotonic() + E2_ORCAMENTO_SEGUNDOS if E2_ORCAMENTO_SEGUNDOS else None
+    return reservas.processar_reservando(engine, 'E2', CONSULTA_FILA_E2,
+                                         lambda lote: _classificar_lote(engine, client, lote, prazo), urls, prazo=prazo)
+
+def _classificar_lote(engine, client: Groq, urls=None, prazo: float = None) -> list:
+    log(f"Buscando notícias com status_e2='PENDENTE' na tabela '{TABLE_NAME}'...")
+    # Fila em ordem de prioridade (gestora exclusiva, regulador, recência, fonte): as linhas são
+    # pontuadas à medida que saem do cursor e só as URLs ficam em memória
+    fila = prioridade.urls_por_prioridade(
+        setup_db.iterar_fila(engine, CONSULTA_FILA_E2, urls, colunas=prioridade.COLUNAS_PONTUACAO))
+    
+    total = len(fila)
+    log(f"✅ {total} notícias pendentes de classificação na fila (lidas em blocos de {setup_db.LEITURA_BLOCO}).")
+
+    if total == 0:
+        log("✅ Nenhuma notícia nova para classificar. Encerrando E2.")
+        return []
+
+    interessantes = []
+    i = 0
+    # Um bloco por vez: só LEITURA_BLOCO notícias em memória, e o resultado de cada bloco já fica gravado
+    for bloco in setup_db.em_blocos(fila):
+        if prazo is not None and time.monotonic() >= prazo:
+            log(f"⏱️ Orçamento de {E2_ORCAMENTO_SEGUNDOS:g}s esgotado: {total - i} notícia(s) de menor prioridade ficam para a próxima execução.")
+            break
+        # Relê o bloco: o que outro worker/execução já classificou nesse meio-tempo não vai ao LLM
+        ordem = {url: n for n, url in enumerate(bloco)}
+        noticias = sorted(load_pending_news(engine, bloco), key=lambda noticia: ordem[noticia['url']])
+        pre_extracao = iniciar_pre_extracao(engine, noticias) if E2_PREFETCH_E3 else None
+        resultados_classificacao = []
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS_API) as executor:
+            # Mapeia cada notícia do bloco para a função classify_worker (submetidas em ordem de prioridade)
+            futures = [executor.submit(classify_worker, noticia, client) for noticia in noticias]
+            
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                i += 1
+                if prazo is not None and time.monotonic() >= prazo:
+                    for pendente in futures:
+                        pendente.cancel() # As que ainda não começaram ficam PENDENTE no DB
+                try:
+                    result = future.result()
+                    resultados_classificacao.append(result)
+                    log(f"[Progresso: {i}/{total}] Classificada -> interesse={result['interesse']} | classificacao={result['classificacao']}")
+                except Exception as e:
+                    log(f"AVISO: Thread de classificação falhou: {e}")
+                
+                # Pausa de controle para evitar Rate Limit (Chave para o sucesso em CI/CD com APIs externas)
+                time.sleep(SLEEP_PER_CALL) 
+
+        if pre_extracao is not None:
+            # A pré-extração grava antes da classificação: nunca concorre com a E3 pelas mesmas linhas
+            log("Aguardando o fim da pré-extração da E3...")
+            pre_extracao.join()
+
+        # Atualização do Banco de Dados
+        if resultados_classificacao:
+            update_news_classification(engine, resultados_classificacao)
+        interessantes.extend(r['url'] for r in resultados_classificacao if r['interesse'] == 'S')
+
+    log("✅ Classificação de todas as notícias concluída.")
+    return interessantes
+
+def iniciar_pre_extracao(engine, noticias: list):
+    """
+    Dispara, numa thread, a extração de texto (E3) das notícias prioritárias do lote
+    (gestoras de fundos exclusivos ou títulos com termos de regulador), aproveitando a rede ociosa
+    durante as pausas do LLM. Retorna a thread (ou None se não houver notícia prioritária).
+    """
+    prioritarias = [
+        row['url'] for row in noticias
+        if prioridade.eh_prioritaria(row.get('gestora'), sanitize_text(row.get('titulo')), sanitize_text(row.get('subtitulo')))
+    ]
+    if not prioritarias:
+        return None
+    import E3_noticia_DB as E3 # Import tardio: só quem liga a pré-extração carrega o newspaper
+
+    def executar():
+        try:
+            gravadas = E3.pre_extrair(engine, prioritarias)
+            log(f"⚡ Pré-extração: {gravadas}/{len(prioritarias)} texto(s) prioritário(s) prontos para a E4.")
+        except Exception as e:
+            log(f"AVISO: Pré-extração da E3 falhou (a E3 normal segue responsável): {e}")
+
+    log(f"⚡ Pré-extraindo o texto de {len(prioritarias)} notícia(s) prioritária(s) durante a classificação...")
+    thread = threading.Thread(target=executar, name='E2-prefetch-E3', daemon=True)
+    thread.start()
+    return thread
+
 # --------- MAIN - LÓGICA DO PIPELINE ---------
 
 def main():
@@ -170,42 +279,12 @@ def main():
 
     # 1. Conexão e Carregamento de Dados
     DB_ENGINE = get_db_engine()
-    df_pendente = load_pending_news(DB_ENGINE)
-    
-    total = len(df_pendente)
-    log(f"✅ {total} notícias pendentes de classificação carregadas do DB.")
-
-    if total == 0:
-        log("✅ Nenhuma notícia nova para classificar. Encerrando E2.")
-        return
+    setup_db.garantir_schema(DB_ENGINE)
 
-    # 2. Inicialização da API e Paralelismo
+    # 2. Inicialização da API, classificação e atualização do DB
     log(f"Iniciando cliente Groq/LLM com modelo '{MODEL}' e {MAX_WORKERS_API} workers...")
     client = Groq(api_key=GROQ_API_KEY)
-    
-    resultados_classificacao = []
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS_API) as executor:
-        # Mapeia cada linha do DataFrame para a função classify_worker
-        futures = {executor.submit(classify_worker, row, client): index 
-                   for index, row in df_pendente.iterrows()}
-        
-        for i, future in enumerate(as_completed(futures), 1):
-            try:
-                result = future.result()
-                resultados_classificacao.append(result)
-                log(f"[Progresso: {i}/{total}] Classificada -> interesse={result['interesse']} | classificacao={result['classificacao']}")
-            except Exception as e:
-                log(f"AVISO: Thread de classificação falhou: {e}")
-            
-            # Pausa de controle para evitar Rate Limit (Chave para o sucesso em CI/CD com APIs externas)
-            time.sleep(SLEEP_PER_CALL) 
-
-    log("✅ Classificação de todas as notícias concluída.")
-
-    # 3. Atualização do Banco de Dados
-    if resultados_classificacao:
-        update_news_classification(DB_ENGINE, resultados_classificacao)
+    classificar_pendentes(DB_ENGINE, client)
     
     log("🏁 PROCESSO E2 CONCLUÍDO. O DB está pronto para a Etapa 3. 🏁")
 
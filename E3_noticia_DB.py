@@ -3,45 +3,78 @@ from newspaper import Article, Config
 import time
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
-from concurrent.futures import ThreadPoolExecutor, as_completed # NOVO: Para paralelismo
+from sqlalchemy import create_engine
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import http_pool # Sessão HTTP compartilhada e agendamento por domínio
+import http_cache # HTML já baixado pela E1 é reaproveitado
+from datetime import datetime, timedelta
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import reservas
+import setup_db # Schema compartilhado (garante as colunas de retentativa em bancos antigos)
+import textos_frios # O texto extraído fica comprimido fora da linha quente
+import metricas
+import extratores # Templates por portal (caminho rápido antes do newspaper)
 
 # --- CONFIGURAÇÕES DE DB E AMBIENTE (PADRÃO CI/CD) ---
 load_dotenv()
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/noticias_pipeline.db")
 TABLE_NAME = "noticias" 
-MAX_WORKERS_EXTRACAO_TEXTO = int(os.getenv("MAX_WORKERS_E3", 10)) # NOVO: Aumento do paralelismo
-SLEEP_PER_DOWNLOAD = float(os.getenv("SLEEP_E3", 0.1)) # NOVO: Reduzido para melhorar a velocidade (0.5s era muito)
+MAX_WORKERS_EXTRACAO_TEXTO = int(os.getenv("MAX_WORKERS_E3", 16)) # Concorrência total; a polidez é controlada por domínio
+MAX_POR_HOST_E3 = int(os.getenv("MAX_POR_HOST_E3", http_pool.MAX_POR_HOST)) # Downloads simultâneos por domínio
+INTERVALO_POR_HOST_E3 = float(os.getenv("INTERVALO_POR_HOST_E3", http_pool.INTERVALO_POR_HOST)) # Substitui o antigo SLEEP_E3
+MAX_PROCESSOS_PARSE_E3 = int(os.getenv("MAX_PROCESSOS_PARSE_E3", os.cpu_count() or 1)) # Processos de parse (CPU)
+TAMANHO_FILA_PARSE_E3 = int(os.getenv("TAMANHO_FILA_PARSE_E3", 64)) # Páginas baixadas aguardando parse
+MIN_URLS_PROCESSOS_E3 = int(os.getenv("MIN_URLS_PROCESSOS_E3", 20)) # Abaixo disso o parse roda inline
+# Os processos de parse nunca nascem de fork do processo atual (que tem threads de download,
+# da pré-extração da E2 ou do daemon): um fork herdaria locks tomados no meio de uma operação
+_CONTEXTO_PARSE = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Agenda de retentativas: falhas voltam com backoff exponencial até o limite de tentativas
+E3_MAX_TENTATIVAS = int(os.getenv("E3_MAX_TENTATIVAS", 5))
+E3_BACKOFF_BASE = float(os.getenv("E3_BACKOFF_BASE", 3600)) # Segundos até a 1ª retentativa (dobra a cada falha)
+
+_FIM_DA_FILA = object()
+
+# Configuração do newspaper criada uma única vez (o download é feito pela sessão compartilhada)
+NEWSPAPER_CONFIG = Config()
+NEWSPAPER_CONFIG.browser_user_agent = http_pool.USER_AGENT
+NEWSPAPER_CONFIG.request_timeout = 10
 
 # --- FUNÇÕES DE DB (REUTILIZADAS DA E2) ---
 
 def get_db_engine():
-    """Cria e retorna a engine do SQLAlchemy."""
-    try:
-        engine = create_engine(DB_URL)
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return engine
-    except SQLAlchemyError as e:
-        print(f"🚨 ERRO CRÍTICO: Falha na conexão com o Banco de Dados. Erro: {e}")
-        raise RuntimeError("Falha na conexão com o DB.")
+    """Engine compartilhada do DB, com pool e pragmas do SQLite (ver armazenamento.py)."""
+    return armazenamento.get_db_engine(DB_URL)
 
-def load_relevant_unprocessed_news(engine: create_engine) -> pd.DataFrame:
+# Fila da E3: status_e3 pendente/falha E agenda vencida E Interesse='S' E Status E2='CONCLUIDO'
+# E sem texto na tabela fria (a coluna inline 'texto' é sempre NULL depois de textos_frios)
+# (índice parcial ix_noticias_fila_e3, ver migracoes.py)
+CONSULTA_FILA_E3 = f"""
+    SELECT url, e3_attempts
+    FROM {TABLE_NAME}
+    WHERE (status_e3 IS NULL OR status_e3 IN ('PENDENTE', 'FALHA'))
+      AND (e3_next_attempt_at IS NULL OR e3_next_attempt_at <= :agora)
+      AND interesse = 'S' AND status_e2 = 'CONCLUIDO'
+      AND NOT EXISTS (
+            SELECT 1 FROM {setup_db.TEXTOS_TABLE_NAME} t
+            WHERE t.url = {TABLE_NAME}.url AND t.campo = 'texto')
     """
-    Carrega notícias que foram classificadas como interesse='S' na E2 
-    E que ainda não têm o campo 'texto' preenchido (ou seja, status_e2='CONCLUIDO').
+
+def load_relevant_unprocessed_news(engine: create_engine, urls=None) -> list:
     """
-    print(f"Buscando notícias relevantes e sem texto na tabela '{TABLE_NAME}'...")
-    # Filtro: Interesse='S' E Status E2='CONCLUIDO' (classificado) E Texto IS NULL (ainda não processado)
-    query = f"""
-    SELECT url
-    FROM {TABLE_NAME}
-    WHERE interesse = 'S' AND status_e2 = 'CONCLUIDO' AND texto IS NULL
+    Carrega (como dicts {'url', 'e3_attempts'}) as notícias que foram classificadas como interesse='S'
+    na E2 E que ainda não têm o texto extraído (ou seja, status_e2='CONCLUIDO').
+    Falhas anteriores só voltam quando a próxima tentativa agendada já venceu;
+    notícias com status 'ESGOTADO' não são mais baixadas. 'urls' restringe a busca a um bloco da fila.
     """
     try:
-        df = pd.read_sql(query, engine)
-        return df
+        consulta, params = setup_db.consulta_pendentes(CONSULTA_FILA_E3, urls, {'agora': datetime.now()})
+        with engine.connect() as connection:
+            return [dict(linha) for linha in connection.execute(consulta, params).mappings()]
     except Exception as e:
         print(f"🚨 ERRO ao carregar notícias do DB: {e}")
         raise
@@ -49,133 +82,282 @@ def load_relevant_unprocessed_news(engine: create_engine) -> pd.DataFrame:
 def update_news_text(engine: create_engine, data: list):
     """
     Atualiza as linhas do DB com o texto principal extraído.
-    O 'data' deve ser uma lista de dicionários com 'url', 'texto' e 'status_e3'.
+    O texto é gravado comprimido na tabela fria; a linha de 'noticias' guarda apenas status e agenda.
+    O 'data' deve ser uma lista de dicionários com 'url', 'texto', 'status_e3',
+    'e3_attempts' e 'e3_next_attempt_at'.
     """
     print(f"Iniciando atualização de {len(data)} linhas (texto principal) no DB...")
     
-    # Prepara o comando SQL de UPDATE
-    # O comando é parametrizado para evitar SQL Injection
-    update_template = f"""
-    UPDATE {TABLE_NAME}
-    SET texto = :texto,
-        status_e3 = 'CONCLUIDO'
-    WHERE url = :url
-    """
+    # UPDATE único para o lote (valores parametrizados via tabela temporária)
+    # timestamp_e3 só muda quando a extração foi concluída
+    agora = datetime.now()
+    data = [{**d, 'timestamp_e3': agora} for d in data]
+    def gravar(connection):
+        armazenamento.atualizar_em_lote(
+            connection, TABLE_NAME, data, ['status_e3', 'e3_attempts', 'e3_next_attempt_at', 'timestamp_e3'],
+            expressoes={'timestamp_e3': f"CASE WHEN v.status_e3 = 'CONCLUIDO' THEN v.timestamp_e3 ELSE {TABLE_NAME}.timestamp_e3 END"}
+        )
+        textos_frios.gravar_textos(connection, data, 'texto')
     try:
-        with engine.begin() as connection:
-            connection.execute(text(update_template), data)
+        armazenamento.escrever(engine, gravar)
         print(f"✅ {len(data)} linhas atualizadas com sucesso no DB (texto inserido).")
+        metricas.incrementar('linhas_atualizadas_total', len(data), etapa='E3')
     except Exception as e:
         print(f"🚨 ERRO ao atualizar o DB (Texto): {e}")
         raise
 
-# --- FUNÇÃO DE EXTRAÇÃO (ADAPTADA PARA PARALELISMO) ---
-
-def extrair_noticia(url):
+def agendar_tentativa(resultado: dict, tentativas_anteriores) -> dict:
     """
-    Extrai o texto principal de uma notícia a partir de uma URL.
-    Retorna um dicionário {url: texto} ou {url: None} em caso de falha.
+    Monta a linha de atualização da E3 com a agenda de retentativas.
+    Falhas são reagendadas com backoff exponencial (E3_BACKOFF_BASE * 2^(n-1));
+    após E3_MAX_TENTATIVAS a notícia recebe status 'ESGOTADO' e sai da fila.
     """
-    # Validação básica da URL
+    tentativas = (0 if pd.isna(tentativas_anteriores) else int(tentativas_anteriores)) + 1
+    if resultado['texto']:
+        return {'url': resultado['url'], 'texto': resultado['texto'], 'status_e3': 'CONCLUIDO',
+                'e3_attempts': tentativas, 'e3_next_attempt_at': None}
+    if tentativas >= E3_MAX_TENTATIVAS:
+        return {'url': resultado['url'], 'texto': None, 'status_e3': 'ESGOTADO',
+                'e3_attempts': tentativas, 'e3_next_attempt_at': None}
+    espera = timedelta(seconds=E3_BACKOFF_BASE * (2 ** (tentativas - 1)))
+    return {'url': resultado['url'], 'texto': None, 'status_e3': 'FALHA',
+            'e3_attempts': tentativas, 'e3_next_attempt_at': datetime.now() + espera}
+
+# --- FUNÇÕES DE EXTRAÇÃO (DOWNLOAD EM THREADS, PARSE EM PROCESSOS) ---
+
+def _normalizar_url(url):
+    """Valida a URL e garante o esquema; retorna None se estiver vazia."""
     if pd.isna(url) or not str(url).strip():
-        print(f"AVISO: URL inválida ou vazia: {url}")
-        return {'url': url, 'texto': None}
-        
+        return None
     url = str(url).strip()
     if not url.startswith(('http://', 'https://')):
         url = 'https://' + url
-    
-    # Configuração para simular um navegador e evitar bloqueios
-    user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
-    config = Config()
-    config.browser_user_agent = user_agent
-    config.request_timeout = 10
-    
+    return url
+
+def baixar_noticia(url):
+    """
+    Etapa de I/O: obtém o HTML bruto (cache da E1 ou sessão keep-alive compartilhada).
+    Sem cache, portais com template baixam a versão reescrita (impressão/AMP), mais leve.
+    Retorna (url, html), com html=None em caso de falha.
+    """
+    url_http = _normalizar_url(url)
+    if url_http is None:
+        print(f"AVISO: URL inválida ou vazia: {url}")
+        return url, None
+    try:
+        html = http_cache.obter(url_http)
+        if html is None:
+            html = http_cache.baixar_com_cache(extratores.url_de_download(url_http))
+        return url, html
+    except Exception as e:
+        print(f"FALHA ao baixar a URL {url_http[:60]}...: {e}")
+        return url, None
+
+def parse_noticia(url, html):
+    """
+    Etapa de CPU: tenta o template do portal (uma passada de lxml) e, para domínios
+    desconhecidos ou extração curta, aplica as heurísticas do newspaper sobre o HTML já baixado.
+    Função de módulo para poder rodar dentro do ProcessPoolExecutor.
+    """
     texto_extraido = None
     
-    try:
-        article = Article(url, config=config)
-        
-        article.download()
-        
-        # Pausa reduzida e externalizada para controle do ambiente/CI/CD
-        time.sleep(SLEEP_PER_DOWNLOAD)
-        
-        article.parse()
-        
-        if article.text and article.text.strip():
-            texto_extraido = article.text.strip()
-        else:
-            print(f"AVISO: Nenhum texto encontrado para a URL: {url[:60]}...")
+    if html:
+        try:
+            texto_extraido = extratores.extrair_por_template(url, html)
+        except Exception as e:
+            print(f"AVISO: Template falhou para a URL {url[:60]}...: {e}")
+    
+    if html and not texto_extraido:
+        try:
+            article = Article(_normalizar_url(url), config=NEWSPAPER_CONFIG)
+            article.download(input_html=html)
+            article.parse()
             
-    except Exception as e:
-        print(f"FALHA ao processar a URL {url[:60]}...: {e}")
+            if article.text and article.text.strip():
+                texto_extraido = article.text.strip()
+            else:
+                print(f"AVISO: Nenhum texto encontrado para a URL: {url[:60]}...")
+                
+        except Exception as e:
+            print(f"FALHA ao processar a URL {url[:60]}...: {e}")
         
     # Retorna o dicionário de resultados para atualização do DB
     return {'url': url, 'texto': texto_extraido, 'status_e3': 'CONCLUIDO' if texto_extraido else 'FALHA'}
 
+def extrair_noticia(url):
+    """
+    Extrai o texto principal de uma notícia a partir de uma URL (download + parse na mesma thread).
+    Retorna um dicionário {url: texto} ou {url: None} em caso de falha.
+    """
+    return parse_noticia(*baixar_noticia(url))
 
-# --- MAIN - FLUXO ORQUESTRADO ---
+def _baixar_para_fila(urls, fila: queue.Queue):
+    """Produtor: baixa as páginas com agendamento por domínio e as coloca na fila limitada."""
+    try:
+        execucao = http_pool.executar_por_host(
+            urls,
+            baixar_noticia,
+            max_workers=MAX_WORKERS_EXTRACAO_TEXTO,
+            max_por_host=MAX_POR_HOST_E3,
+            intervalo=INTERVALO_POR_HOST_E3,
+        )
+        for url, resultado, erro in execucao:
+            if erro is not None:
+                print(f"AVISO: Thread de download falhou: {erro}")
+                resultado = (url, None)
+            # put() bloqueia quando a fila está cheia: o parse dita o ritmo dos downloads
+            fila.put(resultado)
+    finally:
+        fila.put(_FIM_DA_FILA)
 
-def main():
-    start_time = time.time()
-    print("🚀 E3 - INICIANDO EXTRAÇÃO DE CONTEÚDO (NEWSPAPER) 🚀")
-    
-    DB_ENGINE = get_db_engine()
-    
-    # 1. Carregar os dados (Notícias Relevantes e sem texto)
-    df_pendente = load_relevant_unprocessed_news(DB_ENGINE)
-    total_urls = len(df_pendente)
+def extrair_em_pipeline(urls):
+    """
+    Pipeline em dois estágios: threads de download alimentam uma fila limitada
+    e um ProcessPoolExecutor faz o parse, escalando com o número de núcleos.
+    Backlogs pequenos são processados inline, sem o custo de subir processos.
+    Gera os dicionários de resultado na ordem de conclusão.
+    """
+    fila = queue.Queue(maxsize=TAMANHO_FILA_PARSE_E3)
+    produtor = threading.Thread(target=_baixar_para_fila, args=(urls, fila), daemon=True)
+
+    if len(urls) < MIN_URLS_PROCESSOS_E3 or MAX_PROCESSOS_PARSE_E3 <= 1:
+        produtor.start()
+        while (item := fila.get()) is not _FIM_DA_FILA:
+            yield parse_noticia(*item)
+        return
+
+    pendentes = {} # future -> url
+    # O pool é criado antes de qualquer thread desta função (e via forkserver/spawn, nunca fork)
+    with ProcessPoolExecutor(max_workers=MAX_PROCESSOS_PARSE_E3, mp_context=_CONTEXTO_PARSE) as executor:
+        produtor.start()
+        while (item := fila.get()) is not _FIM_DA_FILA:
+            url, html = item
+            if not html:
+                # Falha no download não precisa passar pelo pool de processos
+                yield {'url': url, 'texto': None, 'status_e3': 'FALHA'}
+                continue
+            pendentes[executor.submit(parse_noticia, url, html)] = url
+            # Limita os parses em voo para não acumular HTML na memória
+            if len(pendentes) >= 2 * MAX_PROCESSOS_PARSE_E3:
+                prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                for future in prontos:
+                    yield _resultado_parse(future, pendentes.pop(future))
+        for future in as_completed(list(pendentes)):
+            yield _resultado_parse(future, pendentes.pop(future))
+
+def _resultado_parse(future, url):
+    """Resultado do parse; se o processo falhou, a URL volta como FALHA (entra na agenda de retentativas)."""
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"AVISO: Processo de parse falhou para a URL {url[:60]}...: {e}")
+        return {'url': url, 'texto': None, 'status_e3': 'FALHA'}
+
+
+def extrair_pendentes(engine, urls=None) -> list:
+    """
+    Baixa e extrai o texto das notícias pendentes (todas, ou só as 'urls' informadas) e grava o resultado.
+    Com RESERVA_LOTE, a fila é processada em lotes reservados por este worker (ver reservas.py).
+    Retorna as URLs com texto extraído (entrada da E4).
+    """
+    concluidas = reservas.processar_reservando(engine, 'E3', CONSULTA_FILA_E3,
+                                               lambda lote: _extrair_lote(engine, lote), urls,
+                                               {'agora': datetime.now()})
+    return list(dict.fromkeys(concluidas + ja_extraidas(engine, urls)))
+
+def _extrair_lote(engine, urls=None) -> list:
+    # 1. Fila da E3 (só as URLs); url/e3_attempts são relidos bloco a bloco
+    print(f"Buscando notícias relevantes e sem texto na tabela '{TABLE_NAME}'...")
+    fila = setup_db.urls_da_fila(engine, CONSULTA_FILA_E3, urls, {'agora': datetime.now()})
+    total_urls = len(fila)
     
-    print(f"✅ {total_urls} notícias relevantes e sem texto carregadas do DB.")
+    print(f"✅ {total_urls} notícias relevantes e sem texto na fila (processadas em blocos de {setup_db.LEITURA_BLOCO}).")
     
     if total_urls == 0:
         print("✅ Nenhuma notícia nova e relevante para extrair texto. Encerrando E3.")
-        return
+        return []
 
-    # 2. Extração do texto em Paralelo
-    print(f"\n[ETAPA 2/3] Iniciando a extração paralela dos textos com {MAX_WORKERS_EXTRACAO_TEXTO} workers...")
+    # 2. Extração do texto em Paralelo (round-robin entre domínios, com limite por host)
+    print(f"\n[ETAPA 2/3] Iniciando a extração paralela dos textos com {MAX_WORKERS_EXTRACAO_TEXTO} workers "
+          f"(máx. {MAX_POR_HOST_E3} por domínio, intervalo de {INTERVALO_POR_HOST_E3}s)...")
     
-    urls_a_processar = df_pendente['url'].tolist()
-    resultados_finais = []
+    print(f"  -> Parse em até {MAX_PROCESSOS_PARSE_E3} processos (fila de {TAMANHO_FILA_PARSE_E3} páginas).")
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS_EXTRACAO_TEXTO) as executor:
-        # Mapeia cada URL para a função extrair_noticia
-        futures = {executor.submit(extrair_noticia, url): url for url in urls_a_processar}
-        
-        for i, future in enumerate(as_completed(futures), 1):
-            try:
-                result = future.result()
-                resultados_finais.append(result)
-                print(f"[Progresso: {i}/{total_urls}] Processado: {result['url'][:50]}...")
-            except Exception as e:
-                print(f"AVISO: Thread de extração falhou: {e}")
+    concluidas = []
+    textos_nao_encontrados = esgotados = 0
+    i = 0
+    # Um bloco por vez: só LEITURA_BLOCO páginas em voo, e o resultado de cada bloco já fica gravado
+    for bloco in setup_db.em_blocos(fila):
+        # Relê o bloco: o que outra execução já extraiu (ou reagendou) nesse meio-tempo sai da lista
+        tentativas_por_url = {linha['url']: linha['e3_attempts'] for linha in load_relevant_unprocessed_news(engine, bloco)}
+        if not tentativas_por_url:
+            continue
+        resultados_bloco = []
+        for result in extrair_em_pipeline(list(tentativas_por_url)):
+            i += 1
+            if result is None:
+                continue
+            resultados_bloco.append(result)
+            print(f"[Progresso: {i}/{total_urls}] Processado: {result['url'][:50]}...")
+
+        # 3. Atualização do Banco de Dados
+        # Nota: falhas são reagendadas (status 'FALHA' + e3_next_attempt_at) ou encerradas ('ESGOTADO'),
+        # para não serem baixadas de novo a cada execução
+        dados_para_db = [agendar_tentativa(r, tentativas_por_url.get(r['url'])) for r in resultados_bloco]
+        textos_nao_encontrados += sum(1 for r in dados_para_db if not r['texto'])
+        esgotados += sum(1 for r in dados_para_db if r['status_e3'] == 'ESGOTADO')
+        if dados_para_db:
+            update_news_text(engine, dados_para_db)
+        concluidas.extend(r['url'] for r in dados_para_db if r['status_e3'] == 'CONCLUIDO')
                 
     print("Extração paralela finalizada.")
+    print(f"URLs que falharam ou retornaram texto vazio: {textos_nao_encontrados} "
+          f"({esgotados} atingiram o limite de {E3_MAX_TENTATIVAS} tentativas)")
+    print(f"Total de notícias com texto inserido: {len(concluidas)}")
+    return concluidas
 
-    # 3. Preparação e Atualização do Banco de Dados
-    
-    # Remove resultados que falharam (texto é None) para não tentar salvar lixo no DB
-    # Nota: A atualização do status 'FALHA' é importante para não reprocessar na próxima execução
-    dados_para_db = []
-    textos_nao_encontrados = 0
+def ja_extraidas(engine, urls) -> list:
+    """
+    URLs do lote cujo texto já foi extraído antes de chegarem à E3 (pré-extração durante a E2).
+    Só vale para lotes (modo daemon): sem isso elas só chegariam à E4 na próxima varredura completa.
+    """
+    if not urls:
+        return []
+    query = f"""
+    SELECT url
+    FROM {TABLE_NAME}
+    WHERE status_e3 = 'CONCLUIDO' AND interesse = 'S'
+    """
+    consulta, params = setup_db.consulta_pendentes(query, urls)
+    with engine.connect() as connection:
+        return [linha[0] for linha in connection.execute(consulta, params)]
+
+def pre_extrair(engine, urls) -> int:
+    """
+    Pré-extração especulativa (chamada pela E2 enquanto espera o rate limit do LLM):
+    baixa e extrai o texto das 'urls' antes da classificação de interesse.
+    Só os sucessos são gravados (status_e3='CONCLUIDO'), prontos para a E4 assim que interesse='S' chegar;
+    falhas não consomem tentativas e ficam para a E3 normal (o HTML baixado segue no cache HTTP).
+    Retorna o número de textos gravados.
+    """
+    if not urls:
+        return 0
+    dados_para_db = [agendar_tentativa(r, 0) for r in extrair_em_pipeline(list(urls)) if r and r['texto']]
+    if dados_para_db:
+        update_news_text(engine, dados_para_db)
+    return len(dados_para_db)
+
+
+# --- MAIN - FLUXO ORQUESTRADO ---
+
+def main():
+    start_time = time.time()
+    print("🚀 E3 - INICIANDO EXTRAÇÃO DE CONTEÚDO (NEWSPAPER) 🚀")
     
-    for r in resultados_finais:
-        # Colocamos o status de falha/concluído na lista para atualizar o DB
-        if r['texto']:
-            dados_para_db.append({'url': r['url'], 'texto': r['texto'], 'status_e3': 'CONCLUIDO'})
-        else:
-            dados_para_db.append({'url': r['url'], 'texto': None, 'status_e3': 'FALHA'})
-            textos_nao_encontrados += 1
-
-    print(f"URLs que falharam ou retornaram texto vazio: {textos_nao_encontrados}")
+    DB_ENGINE = get_db_engine()
+    setup_db.garantir_schema(DB_ENGINE)
     
-    # 4. Atualização do Banco de Dados
-    if dados_para_db:
-        update_news_text(DB_ENGINE, dados_para_db)
-        print(f"Total de notícias com texto inserido: {len(dados_para_db) - textos_nao_encontrados}")
-    else:
-        print("Nenhuma notícia foi extraída com sucesso para atualização do DB.")
+    extrair_pendentes(DB_ENGINE)
     
     print("🏁 PROCESSO E3 CONCLUÍDO. O DB está pronto para a Etapa 4. 🏁")
     end_time = time.time()
@@ -2,11 +2,17 @@ from dotenv import load_dotenv
 import os
 import time
 import json
+from datetime import datetime
 from groq import Groq
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import reservas
+import setup_db
+import metricas
+import prioridade
+import textos_frios # texto (leitura) e justificativa_alvo (gravação) ficam na tabela fria
 
 # --- CONFIGURAÇÕES DE DB E AMBIENTE (PADRÃO CI/CD) ---
 load_dotenv()
@@ -18,6 +24,9 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # Controle de Rate Limit (ajuste aqui para evitar RateLimitError)
 MAX_WORKERS_API = int(os.getenv("MAX_WORKERS_API", 1))
 SLEEP_PER_CALL = float(os.getenv("SLEEP_API", 15.0))
+# Tempo máximo de classificação por execução (0 = sem limite); a fila é atendida por prioridade,
+# então o que sobra para a próxima execução é o de menor valor
+E4_ORCAMENTO_SEGUNDOS = float(os.getenv("E4_ORCAMENTO_SEGUNDOS", 0))
 
 # --------- Utilidades de Log e Sanitização ---------
 def log(msg: str):
@@ -31,53 +40,52 @@ def sanitize_text(x):
 # --------- Funções de DB ---------
 
 def get_db_engine():
-    """Cria e retorna a engine do SQLAlchemy."""
-    try:
-        engine = create_engine(DB_URL)
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return engine
-    except SQLAlchemyError as e:
-        log(f"🚨 ERRO CRÍTICO: Falha na conexão com o Banco de Dados. Erro: {e}")
-        raise RuntimeError("Falha na conexão com o DB.")
-
-def load_pending_news_e4(engine: create_engine) -> pd.DataFrame:
-    """Carrega notícias prontas (Interesse=S, Texto preenchido) e não processadas pela E4."""
-    log(f"Buscando notícias prontas (E3=CONCLUIDO, E4=PENDENTE) na tabela '{TABLE_NAME}'...")
-    
-    # Filtro: Interesse='S' AND status_e3='CONCLUIDO' AND texto IS NOT NULL AND status_e4='PENDENTE'
-    query = f"""
+    """Engine compartilhada do DB, com pool e pragmas do SQLite (ver armazenamento.py)."""
+    return armazenamento.get_db_engine(DB_URL)
+
+# Fila da E4: Interesse='S' AND status_e3='CONCLUIDO' AND texto existe (inline ou frio) AND status_e4='PENDENTE'
+# (índice parcial ix_noticias_fila_e4, ver migracoes.py)
+CONSULTA_FILA_E4 = f"""
     SELECT url, gestora, titulo, subtitulo, texto
     FROM {TABLE_NAME}
     WHERE interesse = 'S' 
       AND status_e3 = 'CONCLUIDO' 
-      AND texto IS NOT NULL
+      AND (texto IS NOT NULL OR EXISTS (
+            SELECT 1 FROM {setup_db.TEXTOS_TABLE_NAME} t
+            WHERE t.url = {TABLE_NAME}.url AND t.campo = 'texto'))
       AND (status_e4 IS NULL OR status_e4 = 'PENDENTE')
     """
+
+def load_pending_news_e4(engine: create_engine, urls=None) -> list:
+    """
+    Carrega (como dicts) as notícias prontas (Interesse=S, Texto preenchido) e não processadas pela E4,
+    opcionalmente só das 'urls' (um bloco da fila, ver setup_db.urls_da_fila).
+    """
     try:
-        df = pd.read_sql(query, engine)
-        return df
+        consulta, params = setup_db.consulta_pendentes(CONSULTA_FILA_E4, urls)
+        with engine.connect() as connection:
+            noticias = [dict(linha) for linha in connection.execute(consulta, params).mappings()]
+        # Acessor transparente: descomprime o texto da tabela fria apenas das linhas carregadas
+        return textos_frios.anexar_textos_linhas(engine, noticias, ['texto'])
     except Exception as e:
         log(f"🚨 ERRO ao carregar notícias pendentes da E4 do DB: {e}")
         raise
 
 def update_news_alvo(engine: create_engine, data: list):
-    """Atualiza as linhas do DB com os resultados da classificação de Alvo."""
+    """Atualiza as linhas do DB com os resultados da classificação de Alvo (justificativa vai para a tabela fria)."""
     log(f"Iniciando atualização de {len(data)} linhas (Alvo) no DB...")
     
-    # Prepara o comando SQL de UPDATE
-    update_template = f"""
-    UPDATE {TABLE_NAME}
-    SET alvo = :alvo,
-        descricao = :descricao,
-        justificativa_alvo = :justificativa_alvo,
-        status_e4 = 'CONCLUIDO'
-    WHERE url = :url
-    """
+    # UPDATE único para o lote: alvo, descricao, timestamp_e4 e status_e4 = 'CONCLUIDO'
+    agora = datetime.now()
+    data = [{**d, 'timestamp_e4': agora} for d in data]
+    def gravar(connection):
+        armazenamento.atualizar_em_lote(connection, TABLE_NAME, data, ['alvo', 'descricao', 'timestamp_e4'],
+                                        expressoes={'status_e4': "'CONCLUIDO'"})
+        textos_frios.gravar_textos(connection, data, 'justificativa_alvo')
     try:
-        with engine.begin() as connection:
-            connection.execute(text(update_template), data)
+        armazenamento.escrever(engine, gravar)
         log(f"✅ {len(data)} linhas atualizadas com sucesso no DB (Alvo inserido).")
+        metricas.incrementar('linhas_atualizadas_total', len(data), etapa='E4')
     except Exception as e:
         log(f"🚨 ERRO ao atualizar o DB (Alvo): {e}")
         raise
@@ -131,7 +139,7 @@ Subtítulo: {subtitulo}
 Texto: {texto_truncado}{sufixo}
 """.strip()
 
-def classify_alvo_worker(row: pd.Series, client: Groq):
+def classify_alvo_worker(row: dict, client: Groq):
     """Worker que chama a API em paralelo, trata erros e retorna o resultado formatado."""
     url = row['url']
     gestora = sanitize_text(row.get("gestora", ""))
@@ -172,21 +180,91 @@ def classify_alvo_worker(row: pd.Series, client: Groq):
             descricao = str(data.get("descricao", "")).strip()
             
             if alvo not in {"S", "N"}:
+                metricas.incrementar('chamadas_llm_total', etapa='E4', resultado='fora_do_padrao')
                 log(f"Aviso: LLM fora do padrão. URL: {url[:50]}...")
             else:
+                metricas.incrementar('chamadas_llm_total', etapa='E4', resultado='ok')
                 result_data['alvo'] = alvo
                 # Salva a descrição apenas se o Alvo for 'S'
                 result_data['descricao'] = descricao if alvo == 'S' else None 
         
         except json.JSONDecodeError:
+            metricas.incrementar('chamadas_llm_total', etapa='E4', resultado='json_invalido')
             log(f"ERRO: Resposta não é JSON válido. URL: {url[:50]}...")
 
     except Exception as e:
+        metricas.incrementar('chamadas_llm_total', etapa='E4', resultado='erro')
         log(f"ERRO ao chamar a API para URL {url[:50]}...: {type(e).__name__} (RateLimit?)")
         
     return result_data
 
 
+def classificar_alvo_pendentes(engine, client: Groq, urls=None) -> list:
+    """
+    Classifica o alvo das notícias prontas (todas, ou só as 'urls' informadas) e grava o resultado.
+    Com RESERVA_LOTE, a fila é processada em lotes reservados por este worker (ver reservas.py).
+    Retorna as URLs classificadas com alvo='S' (entrada da E5).
+    """
+    # O orçamento vale para a execução inteira, não para cada lote reservado
+    prazo = time.monotonic() + E4_ORCAMENTO_SEGUNDOS if E4_ORCAMENTO_SEGUNDOS else None
+    return reservas.processar_reservando(engine, 'E4', CONSULTA_FILA_E4,
+                                         lambda lote: _classificar_alvo_lote(engine, client, lote, prazo), urls, prazo=prazo)
+
+def _classificar_alvo_lote(engine, client: Groq, urls=None, prazo: float = None) -> list:
+    log(f"Buscando notícias prontas (E3=CONCLUIDO, E4=PENDENTE) na tabela '{TABLE_NAME}'...")
+    # Fila em ordem de prioridade (gestora exclusiva, regulador, rótulo da E2, recência, fonte), sem o texto
+    # (pontuadas à medida que saem do cursor: só as URLs ficam em memória)
+    fila = prioridade.urls_por_prioridade(
+        setup_db.iterar_fila(engine, CONSULTA_FILA_E4, urls, colunas=prioridade.COLUNAS_PONTUACAO))
+    
+    total = len(fila)
+    log(f"✅ {total} notícias prontas (interesse=S, texto=OK) pendentes de classificação de alvo "
+        f"(lidas em blocos de {setup_db.LEITURA_BLOCO}).")
+
+    if total == 0:
+        log("✅ Nenhuma notícia pronta para classificação de alvo. Encerrando E4.")
+        return []
+
+    alvos = []
+    i = 0
+    # Um bloco por vez: só os textos de LEITURA_BLOCO notícias descomprimidos em memória
+    for bloco in setup_db.em_blocos(fila):
+        if prazo is not None and time.monotonic() >= prazo:
+            log(f"⏱️ Orçamento de {E4_ORCAMENTO_SEGUNDOS:g}s esgotado: {total - i} notícia(s) de menor prioridade ficam para a próxima execução.")
+            break
+        ordem = {url: n for n, url in enumerate(bloco)}
+        noticias = sorted(load_pending_news_e4(engine, bloco), key=lambda noticia: ordem[noticia['url']])
+        resultados_classificacao = []
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS_API) as executor:
+            # Submetidas em ordem de prioridade
+            futures = [executor.submit(classify_alvo_worker, noticia, client) for noticia in noticias]
+            
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                i += 1
+                if prazo is not None and time.monotonic() >= prazo:
+                    for pendente in futures:
+                        pendente.cancel() # As que ainda não começaram ficam PENDENTE no DB
+                try:
+                    result = future.result()
+                    resultados_classificacao.append(result)
+                    log(f"[Progresso: {i}/{total}] Classificada -> Alvo={result['alvo']}")
+                except Exception as e:
+                    log(f"AVISO: Thread de classificação falhou: {e}")
+                
+                # Pausa de controle para evitar Rate Limit
+                time.sleep(SLEEP_PER_CALL) 
+
+        # Atualização do Banco de Dados
+        if resultados_classificacao:
+            update_news_alvo(engine, resultados_classificacao)
+        alvos.extend(r['url'] for r in resultados_classificacao if r['alvo'] == 'S')
+
+    log("✅ Classificação de Alvo concluída.")
+    return alvos
+
 # --------- MAIN - FLUXO ORQUESTRADO ---------
 
 def main():
@@ -198,46 +276,16 @@ def main():
 
     # 1. Conexão e Carregamento de Dados
     DB_ENGINE = get_db_engine()
-    df_pendente = load_pending_news_e4(DB_ENGINE)
-    
-    total = len(df_pendente)
-    log(f"✅ {total} notícias prontas (interesse=S, texto=OK) pendentes de classificação de alvo.")
-
-    if total == 0:
-        log("✅ Nenhuma notícia pronta para classificação de alvo. Encerrando E4.")
-        return
+    setup_db.garantir_schema(DB_ENGINE)
 
-    # 2. Inicialização da API e Paralelismo
+    # 2. Inicialização da API, classificação e atualização do DB
     log(f"Iniciando cliente Groq/LLM com modelo '{MODEL}' e {MAX_WORKERS_API} workers...")
     client = Groq(api_key=GROQ_API_KEY)
-    
-    resultados_classificacao = []
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS_API) as executor:
-        futures = {executor.submit(classify_alvo_worker, row, client): index 
-                   for index, row in df_pendente.iterrows()}
-        
-        for i, future in enumerate(as_completed(futures), 1):
-            try:
-                result = future.result()
-                resultados_classificacao.append(result)
-                log(f"[Progresso: {i}/{total}] Classificada -> Alvo={result['alvo']}")
-            except Exception as e:
-                log(f"AVISO: Thread de classificação falhou: {e}")
-            
-            # Pausa de controle para evitar Rate Limit
-            time.sleep(SLEEP_PER_CALL) 
-
-    log("✅ Classificação de Alvo concluída.")
-
-    # 3. Atualização do Banco de Dados
-    if resultados_classificacao:
-        update_news_alvo(DB_ENGINE, resultados_classificacao)
+    alvos = classificar_alvo_pendentes(DB_ENGINE, client)
     
     log("🏁 PROCESSO E4 CONCLUÍDO. O DB está pronto para a Etapa 5. 🏁")
     
-    alvos_s = sum(1 for r in resultados_classificacao if r['alvo'] == 'S')
-    log(f"Estatísticas E4: {alvos_s} notícias marcadas como Alvo='S'.")
+    log(f"Estatísticas E4: {len(alvos)} notícias marcadas como Alvo='S'.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,21 @@
 from json import dumps
-from httplib2 import Http
+from html import escape
+import zlib
+import hashlib
+from collections import defaultdict
 import pandas as pd
 import time
 import os
 import csv
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from sqlalchemy import create_engine
+
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import reservas
+import setup_db
+import prioridade
+import metricas
+import notificacoes # Outbox compartilhado: entrega com sessão keep-alive, 429/Retry-After e dedup
 
 from dotenv import load_dotenv
 
@@ -14,37 +23,37 @@ from dotenv import load_dotenv
 load_dotenv() 
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/noticias_pipeline.db")
 TABLE_NAME = "noticias" 
-CHAT_WEBHOOK_URL_SAURON = os.getenv("CHAT_WEBHOOK_URL_SAURON")
-MAX_WORKERS_CHAT = int(os.getenv("MAX_WORKERS_CHAT", 4)) # Paralelismo para envio de alertas
-SLEEP_PER_SEND = float(os.getenv("SLEEP_E5", 1.0)) # Pausa para evitar rate limit do Google Chat
+CANAL_E5 = 'SAURON' # Webhook em CHAT_WEBHOOK_URL_SAURON (o ritmo de envio é controlado pelo outbox)
+
+# Modo digest: agrupa os alertas pendentes em poucos cards (cardsV2) em vez de uma mensagem por notícia
+E5_MODO_DIGEST = os.getenv("E5_MODO_DIGEST", "false").lower() in ("1", "true", "sim")
+E5_DIGEST_MAX_BYTES = int(os.getenv("E5_DIGEST_MAX_BYTES", 28000)) # Margem sob o limite de ~32KB por mensagem do Chat
+E5_DIGEST_MAX_CARDS = int(os.getenv("E5_DIGEST_MAX_CARDS", 10)) # Cards por mensagem
+
+# Gestoras cujos fundos são exclusivos (definem o tipo do alerta)
+GESTORAS_EXCLUSIVAS = prioridade.GESTORAS_EXCLUSIVAS
 
 # --- FUNÇÕES DE DB ---
 
 def get_db_engine():
-    """Cria e retorna a engine do SQLAlchemy."""
-    try:
-        engine = create_engine(DB_URL)
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
-        return engine
-    except SQLAlchemyError as e:
-        print(f"🚨 ERRO CRÍTICO: Falha na conexão com o Banco de Dados. Erro: {e}")
-        raise RuntimeError("Falha na conexão com o DB.")
-
-def load_ready_to_send_news(engine: create_engine) -> pd.DataFrame:
-    """Carrega notícias prontas (Alvo='S') e que ainda não foram enviadas (E5=PENDENTE)."""
-    print(f"Buscando notícias prontas para envio (Alvo='S', E4=CONCLUIDO, E5=PENDENTE)...")
-    
-    # Filtro: Alvo='S' AND status_e4='CONCLUIDO' AND status_e5 IS NULL/PENDENTE
-    query = f"""
+    """Engine compartilhada do DB, com pool e pragmas do SQLite (ver armazenamento.py)."""
+    return armazenamento.get_db_engine(DB_URL)
+
+# Fila da E5: Alvo='S' AND status_e4='CONCLUIDO' AND status_e5 IS NULL/PENDENTE
+# (índice parcial ix_noticias_fila_e5, ver migracoes.py)
+CONSULTA_FILA_E5 = f"""
     SELECT url, gestora, titulo, descricao
     FROM {TABLE_NAME}
     WHERE alvo = 'S' 
       AND status_e4 = 'CONCLUIDO'
       AND (status_e5 IS NULL OR status_e5 = 'PENDENTE')
     """
+
+def load_ready_to_send_news(engine: create_engine, urls=None) -> pd.DataFrame:
+    """Carrega notícias prontas (Alvo='S') e que ainda não foram enviadas (E5=PENDENTE), opcionalmente só das 'urls' (um bloco da fila)."""
     try:
-        df = pd.read_sql(query, engine)
+        consulta, params = setup_db.consulta_pendentes(CONSULTA_FILA_E5, urls)
+        df = pd.read_sql(consulta, engine, params=params)
         return df
     except Exception as e:
         print(f"🚨 ERRO ao carregar notícias do DB para envio: {e}")
@@ -54,126 +63,191 @@ def update_news_status_e5(engine: create_engine, results: list):
     """Atualiza o status E5 de todas as URLs processadas, marcando sucesso ou falha."""
     print(f"Iniciando atualização de {len(results)} linhas (Status E5) no DB...")
     
-    # Prepara o comando SQL de UPDATE
-    update_template = f"""
-    UPDATE {TABLE_NAME}
-    SET status_e5 = :status_e5,
-        msg_e5_erro = :msg_e5_erro
-    WHERE url = :url
-    """
+    # UPDATE único para o lote; timestamp_e5 só muda quando o alerta foi enviado
+    agora = datetime.now()
+    results = [{**r, 'timestamp_e5': agora} for r in results]
     try:
-        with engine.begin() as connection:
-            # results deve ser uma lista de dicts com {'url', 'status_e5', 'msg_e5_erro'}
-            connection.execute(text(update_template), results)
+        # results deve ser uma lista de dicts com {'url', 'status_e5', 'msg_e5_erro'}
+        armazenamento.escrever(engine, lambda connection: armazenamento.atualizar_em_lote(
+            connection, TABLE_NAME, results, ['status_e5', 'msg_e5_erro', 'timestamp_e5'],
+            expressoes={'timestamp_e5': f"CASE WHEN v.status_e5 = 'ENVIADO' THEN v.timestamp_e5 ELSE {TABLE_NAME}.timestamp_e5 END"}
+        ))
         print(f"✅ {len(results)} linhas de status E5 atualizadas com sucesso.")
+        metricas.incrementar('linhas_atualizadas_total', len(results), etapa='E5')
     except Exception as e:
         print(f"🚨 ERRO ao atualizar o DB (Status E5): {e}")
         raise
 
 # --- FUNÇÕES DE ENVIO (ADAPTADAS PARA TRABALHAR COM O DB) ---
 
-def enviar_noticia_worker(noticia: pd.Series):
+def montar_mensagem_individual(noticia) -> dict:
+    """Formata a mensagem de texto de uma única notícia para o Google Chat."""
+    if noticia['gestora'] in GESTORAS_EXCLUSIVAS:
+        tipo_getora = '(fundos exclusivos)'   
+    else:
+        tipo_getora = '(fundos não-exclusivos)'   
+    texto_mensagem = (
+        f"🚨 *Alerta de Notícias* 🚨\n\n"
+        f"A gestora: *{noticia['gestora'].upper()}* foi noticiada! _{tipo_getora}_\n\n"
+        f"_Descrição (gerada por IA)_ :{noticia['descricao']}\n\n"
+        f"*{noticia['titulo']}*\n\n"
+        f"Link: {noticia['url']}"
+    )
+    return {"text": texto_mensagem}
+
+def _status_do_outbox(resultado: dict):
+    """Traduz o status de uma mensagem do outbox para (status_e5, msg_e5_erro)."""
+    if resultado['status'] == 'ENVIADO':
+        return 'ENVIADO', None
+    if resultado['status'] == 'FALHA':
+        return 'FALHA_CHAT', (resultado['ultimo_erro'] or '')[:60]
+    # Reagendada pelo outbox: a notícia segue PENDENTE e será reentregue sem duplicar
+    return 'PENDENTE', (resultado['ultimo_erro'] or '')[:60]
+
+# --- MODO DIGEST (CARDSV2 AGRUPADOS) ---
+
+def _tipo_gestora(gestora: str) -> str:
+    return '(fundos exclusivos)' if gestora in GESTORAS_EXCLUSIVAS else '(fundos não-exclusivos)'
+
+def _widget_noticia(noticia) -> dict:
+    """Um parágrafo do card por notícia (título, descrição da IA e link)."""
+    return {"textParagraph": {"text": (
+        f"<b>{escape(str(noticia['titulo']))}</b><br>"
+        f"<i>Descrição (gerada por IA):</i> {escape(str(noticia['descricao']))}<br>"
+        f"<a href=\"{escape(str(noticia['url']), quote=True)}\">Abrir notícia</a>"
+    )}}
+
+def _card_gestora(gestora: str, noticias: list) -> dict:
+    return {
+        "cardId": f"alerta-{zlib.crc32(str(noticias[0]['url']).encode('utf-8')):08x}",
+        "card": {
+            "header": {
+                "title": f"🚨 {gestora.upper()} foi noticiada!",
+                "subtitle": f"{len(noticias)} notícia(s) {_tipo_gestora(gestora)}",
+            },
+            "sections": [{"widgets": [_widget_noticia(n) for n in noticias]}],
+        },
+    }
+
+def montar_mensagens_digest(df: pd.DataFrame) -> list:
     """
-    Worker que formata e envia uma única notícia para o Google Chat.
-    Retorna o status do envio.
+    Agrupa as notícias por tipo (exclusivos / não-exclusivos) e por gestora em mensagens cardsV2.
+    Cada mensagem respeita E5_DIGEST_MAX_BYTES e E5_DIGEST_MAX_CARDS; gestoras com muitas
+    notícias são quebradas em mais de um card.
+    Retorna uma lista de tuplas (mensagem, urls_incluidas).
     """
-    url_webhook = CHAT_WEBHOOK_URL_SAURON
-    
-    if not url_webhook:
-        return {'url': noticia['url'], 'status_e5': 'FALHA', 'msg_e5_erro': 'WEBHOOK_NAO_CONFIGURADO'}
+    grupos = defaultdict(lambda: defaultdict(list))
+    for _, noticia in df.iterrows():
+        grupos[_tipo_gestora(noticia['gestora'])][noticia['gestora']].append(noticia)
 
-    if noticia['gestora'] in ['Xp Investimentos', 'Vinci', 'Tivio','Tarpon','Bnp', 'Oceana']:
-        tipo_getora = '(fundos exclusivos)'   
-        texto_mensagem = (
-            f"🚨 *Alerta de Notícias* 🚨\n\n"
-            f"A gestora: *{noticia['gestora'].upper()}* foi noticiada! _{tipo_getora}_\n\n"
-            f"_Descrição (gerada por IA)_ :{noticia['descricao']}\n\n"
-            f"*{noticia['titulo']}*\n\n"
-            f"Link: {noticia['url']}"
-        )
+    mensagens = []
+    for tipo in sorted(grupos):
+        cards, urls = [], []
+        texto = f"🚨 *Alerta de Notícias* 🚨 _{tipo}_"
+
+        def fechar():
+            if cards:
+                mensagens.append(({"text": texto, "cardsV2": list(cards)}, list(urls)))
+                cards.clear()
+                urls.clear()
+
+        for gestora, noticias in sorted(grupos[tipo].items()):
+            lote = []
+            for noticia in noticias:
+                candidato = _card_gestora(gestora, lote + [noticia])
+                tamanho = len(dumps({"text": texto, "cardsV2": cards + [candidato]}).encode('utf-8'))
+                if lote and tamanho > E5_DIGEST_MAX_BYTES:
+                    # O card atual encheu: fecha-o e começa outro para a mesma gestora
+                    cards.append(_card_gestora(gestora, lote))
+                    urls.extend(n['url'] for n in lote)
+                    fechar()
+                    lote = []
+                elif not lote and cards and tamanho > E5_DIGEST_MAX_BYTES:
+                    fechar()
+                lote.append(noticia)
+            cards.append(_card_gestora(gestora, lote))
+            urls.extend(n['url'] for n in lote)
+            if len(cards) >= E5_DIGEST_MAX_CARDS:
+                fechar()
+        fechar()
+    return mensagens
+
+def enfileirar_alertas(df_pendente: pd.DataFrame) -> int:
+    """
+    Grava no outbox os alertas pendentes (um por notícia ou agrupados em modo digest).
+    A dedup_key deriva das URLs, então reexecuções não geram mensagens duplicadas. Notícias que
+    já estão numa mensagem reagendada (429/5xx) ficam de fora: reagrupá-las com alertas novos
+    mudaria a dedup_key do digest e geraria um segundo envio.
+    """
+    ja_no_outbox = notificacoes.refs_pendentes(CANAL_E5)
+    if ja_no_outbox:
+        df_pendente = df_pendente[~df_pendente['url'].isin(ja_no_outbox)]
+    if df_pendente.empty:
+        return 0
+    if E5_MODO_DIGEST:
+        mensagens = montar_mensagens_digest(df_pendente)
+        print(f"Modo digest: {len(df_pendente)} notícias agrupadas em {len(mensagens)} mensagem(ns).")
     else:
-        tipo_getora = '(fundos não-exclusivos)'   
-        texto_mensagem = (
-            f"🚨 *Alerta de Notícias* 🚨\n\n"
-            f"A gestora: *{noticia['gestora'].upper()}* foi noticiada! _{tipo_getora}_\n\n"
-            f"_Descrição (gerada por IA)_ :{noticia['descricao']}\n\n"
-            f"*{noticia['titulo']}*\n\n"
-            f"Link: {noticia['url']}" )
-        
-    app_message = {"text": texto_mensagem}
-    message_headers = {"Content-Type": "application/json; charset=UTF-8"}
-    http_obj = Http()
-    
-    status_e5 = 'FALHA'
-    msg_e5_erro = None
-    
-    try:
-        response, content = http_obj.request(
-            uri=url_webhook,
-            method="POST",
-            headers=message_headers,
-            body=dumps(app_message),
-        )
-        
-        if response.status == 200:
-            print(f"✅ Notícia sobre '{noticia['gestora']}' enviada com sucesso!")
-            status_e5 = 'ENVIADO'
-        else:
-            error_content = content.decode('utf-8')
-            print(f"❌ Falha ao enviar '{noticia['gestora']}'. Status: {response.status}. Detalhe: {error_content}")
-            status_e5 = 'FALHA_CHAT'
-            msg_e5_erro = f"{response.status}: {error_content[:50]}"
-            
-    except Exception as e:
-        print(f"❌ Ocorreu um erro de conexão/HTTP ao enviar a notícia: {e}")
-        status_e5 = 'FALHA_HTTP'
-        msg_e5_erro = str(e)
-        
-    return {'url': noticia['url'], 'status_e5': status_e5, 'msg_e5_erro': msg_e5_erro}
+        mensagens = [(montar_mensagem_individual(row), [row['url']]) for _, row in df_pendente.iterrows()]
 
-# --- MAIN - FLUXO ORQUESTRADO ---
+    novas = 0
+    for mensagem, urls in mensagens:
+        chave = "e5:" + hashlib.sha1("\n".join(sorted(urls)).encode('utf-8')).hexdigest()
+        novas += notificacoes.enfileirar(CANAL_E5, mensagem, chave, refs=urls)
+    return novas
 
-def main():
-    start_time = time.time()
-    print("🚀 E5 - INICIANDO ENVIO DE ALERTAS PARA CHAT (CD) 🚀")
-    
-    # 1. Conexão e Carregamento de Dados
-    DB_ENGINE = get_db_engine()
-    df_pendente = load_ready_to_send_news(DB_ENGINE)
+def enviar_pendentes(engine, urls=None) -> list:
+    """
+    Enfileira e entrega os alertas das notícias prontas (todas, ou só as 'urls' informadas)
+    e grava o status E5. Com RESERVA_LOTE, a fila é processada em lotes reservados por este
+    worker (ver reservas.py). Retorna as URLs enviadas.
+    """
+    return reservas.processar_reservando(engine, 'E5', CONSULTA_FILA_E5,
+                                         lambda lote: _enviar_lote(engine, lote), urls)
+
+def _enviar_lote(engine, urls=None) -> list:
+    print(f"Buscando notícias prontas para envio (Alvo='S', E4=CONCLUIDO, E5=PENDENTE)...")
+    fila = setup_db.urls_da_fila(engine, CONSULTA_FILA_E5, urls)
     
-    total = len(df_pendente)
-    print(f"✅ {total} notícias prontas (alvo=S) pendentes de envio.")
+    total = len(fila)
+    print(f"✅ {total} notícias prontas (alvo=S) pendentes de envio (lidas em blocos de {setup_db.LEITURA_BLOCO}).")
 
     if total == 0:
         print("✅ Nenhuma notícia pronta para alerta. Encerrando E5.")
-        return
+        return []
         
-    # 2. Envio Paralelo
-    print(f"\n[ETAPA 2/3] Iniciando envio paralelo de alertas com {MAX_WORKERS_CHAT} workers...")
+    # 2. Enfileiramento no outbox e entrega (o outbox também reentrega pendências de execuções anteriores)
+    modo = "digest (cardsV2 agrupados)" if E5_MODO_DIGEST else "uma mensagem por notícia"
+    print(f"\n[ETAPA 2/3] Enfileirando alertas no outbox em modo {modo}...")
+    # Título/descrição só de um bloco por vez em memória; as mensagens ficam no outbox
+    novas = sum(enfileirar_alertas(load_ready_to_send_news(engine, bloco)) for bloco in setup_db.em_blocos(fila))
+    print(f"  -> {novas} mensagem(ns) nova(s) no outbox.")
     
-    # O Google Chat tem limites rigorosos, o paralelismo é pequeno e a pausa é mantida
+    # Com reservas, entrega só as mensagens das URLs deste lote (as dos outros lotes são de outros workers)
+    resultados_outbox = notificacoes.entregar_pendentes([CANAL_E5], refs=urls if reservas.RESERVA_LOTE else None)
     resultados_envio = []
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS_CHAT) as executor:
-        futures = {executor.submit(enviar_noticia_worker, row): row['url'] 
-                   for _, row in df_pendente.iterrows()}
-        
-        for i, future in enumerate(as_completed(futures), 1):
-            try:
-                result = future.result()
-                resultados_envio.append(result)
-                print(f"[Progresso: {i}/{total}] Envio concluído para: {result['url'][:50]}...")
-            except Exception as e:
-                print(f"AVISO: Thread de envio falhou: {e}")
-                
-            # Pausa para evitar rate limit no Google Chat
-            time.sleep(SLEEP_PER_SEND) 
-
-    print("Envio paralelo finalizado.")
+    for resultado in resultados_outbox:
+        status_e5, msg_e5_erro = _status_do_outbox(resultado)
+        # O status da mensagem vale para todas as notícias que ela carrega
+        resultados_envio.extend({'url': url, 'status_e5': status_e5, 'msg_e5_erro': msg_e5_erro}
+                                for url in resultado['refs'])
+    print(f"Entrega finalizada: {sum(1 for r in resultados_envio if r['status_e5'] == 'ENVIADO')} notícia(s) enviada(s).")
 
     # 3. Atualização do Banco de Dados
     if resultados_envio:
-        update_news_status_e5(DB_ENGINE, resultados_envio)
+        update_news_status_e5(engine, resultados_envio)
+    return [r['url'] for r in resultados_envio if r['status_e5'] == 'ENVIADO']
+
+# --- MAIN - FLUXO ORQUESTRADO ---
+
+def main():
+    start_time = time.time()
+    print("🚀 E5 - INICIANDO ENVIO DE ALERTAS PARA CHAT (CD) 🚀")
+    
+    # 1. Conexão e Carregamento de Dados
+    DB_ENGINE = get_db_engine()
+    setup_db.garantir_schema(DB_ENGINE)
+    enviar_pendentes(DB_ENGINE)
     
     # A lógica de limpeza do CSV foi removida, pois o status_e5 no DB marca o item como 'concluído'.
     
@@ -5,17 +5,19 @@
 import os
 import sys # Adicionado para sys.exit (boa prática em funções main)
 from time import sleep
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service 
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
 from datetime import datetime, date
-import requests
+import hashlib
+from urllib.parse import quote_plus, urljoin
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from dotenv import load_dotenv
 
+import lxml.html
+
+import http_pool # Sessão HTTP keep-alive compartilhada
+import armazenamento # Conexões SQLite com WAL e commits em lote
+import notificacoes # Outbox compartilhado de alertas (entrega com retentativa e dedup)
+
 # --- Banco de dados ---
 import sqlite3
 from typing import Optional
@@ -36,8 +38,17 @@ def setup_logging():
 load_dotenv() 
 
 PALAVRAS_CHAVE = ['Tivio', 'xp investimentos', 'vinci', 'tarpon', 'bnp', 'oceana']
-URL_BASE_CVM = "https://www.gov.br/cvm/pt-br/search?origem=form&SearchableText={}"
-CHAT_WEBHOOK_URL_MUNIN = os.getenv("CHAT_WEBHOOK_URL_MUNIN")
+# Ordenada por data (mais recente primeiro), para que os itens novos estejam sempre na primeira página
+URL_BASE_CVM = "https://www.gov.br/cvm/pt-br/search?origem=form&SearchableText={}&sort_on=Date&sort_order=reverse"
+MAX_WORKERS_CVM = int(os.getenv("MAX_WORKERS_CVM", 6)) # Palavras-chave consultadas em paralelo (HTTP)
+CVM_TIMEOUT = (5, 15)
+
+# XPath equivalente ao seletor CSS "ul.searchResults.noticias" (sem depender do pacote cssselect)
+XPATH_LISTA_RESULTADOS = (
+    "//ul[contains(concat(' ', normalize-space(@class), ' '), ' searchResults ')"
+    " and contains(concat(' ', normalize-space(@class), ' '), ' noticias ')]"
+)
+CANAL_MUNIN = 'MUNIN' # Webhook em CHAT_WEBHOOK_URL_MUNIN
 
 # PADRÃO CI/CD: Define o caminho do DB dentro da pasta de dados persistente
 DB_FILENAME = "cvm_sent.db"
@@ -52,10 +63,8 @@ def db_init(db_path: str = DB_PATH) -> Optional[sqlite3.Connection]:
     Cria (se não existir) e retorna a conexão com o banco SQLite.
     """
     try:
-        # Garante que a pasta 'data' exista antes de criar o arquivo DB
-        os.makedirs(os.path.dirname(db_path), exist_ok=True) 
-        
-        con = sqlite3.connect(db_path)
+        # Cria a pasta 'data' se preciso e aplica WAL/synchronous=NORMAL
+        con = armazenamento.conectar_sqlite(db_path)
         con.execute(
             """
             CREATE TABLE IF NOT EXISTS sent_notifications (
@@ -68,6 +77,17 @@ def db_init(db_path: str = DB_PATH) -> Optional[sqlite3.Connection]:
             )
             """
         )
+        # Estado por palavra-chave: fingerprint da lista de resultados + marca d'água (data mais recente já vista)
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_state (
+                gestora       TEXT PRIMARY KEY,
+                fingerprint   TEXT,
+                watermark     TEXT,
+                atualizado_em TEXT NOT NULL
+            )
+            """
+        )
         con.commit()
         return con
     except Exception as e:
@@ -86,6 +106,7 @@ def already_sent_today(con: sqlite3.Connection, sent_date: date, gestora: str, l
     return cur.fetchone() is not None
 
 def mark_sent(con: sqlite3.Connection, sent_date: date, gestora: str, link: str, title: str):
+    """Sem commit: o chamador agrupa as marcações numa transação (armazenamento.transacao)."""
     con.execute(
         """
         INSERT OR IGNORE INTO sent_notifications(sent_date, gestora, link, title, sent_at)
@@ -93,13 +114,137 @@ def mark_sent(con: sqlite3.Connection, sent_date: date, gestora: str, link: str,
         """,
         (iso(sent_date), gestora, link, title, datetime.utcnow().isoformat())
     )
-    con.commit()
+
+def load_search_state(con: sqlite3.Connection) -> dict:
+    """Retorna {gestora: (fingerprint, watermark: date | None)}."""
+    estado = {}
+    for gestora, fingerprint, watermark in con.execute("SELECT gestora, fingerprint, watermark FROM search_state"):
+        estado[gestora] = (fingerprint, date.fromisoformat(watermark) if watermark else None)
+    return estado
+
+def save_search_state(con: sqlite3.Connection, gestora: str, fingerprint: Optional[str], watermark: Optional[date]):
+    """Sem commit: o chamador agrupa as gravações numa transação (armazenamento.transacao)."""
+    con.execute(
+        """
+        INSERT INTO search_state(gestora, fingerprint, watermark, atualizado_em)
+        VALUES(?, ?, ?, ?)
+        ON CONFLICT(gestora) DO UPDATE SET
+            fingerprint = excluded.fingerprint, watermark = excluded.watermark, atualizado_em = excluded.atualizado_em
+        """,
+        (gestora, fingerprint, iso(watermark) if watermark else None, datetime.utcnow().isoformat())
+    )
 
 # ==================== FUNÇÕES DE EXTRAÇÃO E ALERTA ====================
 
+def _montar_noticia(palavra_chave, titulo, link, data_str):
+    """Normaliza um resultado da busca no dicionário usado pelo restante do robô."""
+    data_str = data_str.strip().replace("-", "").strip()
+    try:
+        data_obj = datetime.strptime(data_str, '%d/%m/%Y')
+    except ValueError:
+        logging.error(f"[{palavra_chave}] Erro ao converter a data: '{data_str}'")
+        data_obj = None
+
+    return {
+        "Gestora": palavra_chave,
+        "Título": titulo,
+        "Link": link,
+        "Data": data_obj.strftime('%d/%m/%Y') if data_obj else "",
+        "DataObj": data_obj
+    }
+
+def fingerprint_lista(html_lista: bytes) -> str:
+    """Hash do HTML da lista de resultados: igual ao da execução anterior => nada mudou para a palavra-chave."""
+    return hashlib.sha256(html_lista).hexdigest()
+
+def localiza_news_http(palavra_chave, session=None, fingerprint_anterior=None):
+    """
+    Busca os resultados de uma palavra-chave com um GET simples
+    (a página de busca do gov.br é renderizada no servidor).
+    Retorna (ok, noticias, fingerprint): ok=False indica que a página não pôde ser lida
+    (erro HTTP ou layout inesperado) e o fallback com Selenium deve ser usado.
+    Se o fingerprint da lista for igual a fingerprint_anterior, os itens não são lidos (noticias=None).
+    """
+    url = URL_BASE_CVM.format(quote_plus(palavra_chave))
+    session = session or http_pool.get_session()
+    try:
+        resp = session.get(url, timeout=CVM_TIMEOUT)
+        resp.raise_for_status()
+        doc = lxml.html.fromstring(resp.content, base_url=url)
+    except Exception as e:
+        logging.warning(f"[{palavra_chave}] Falha na busca HTTP ({type(e).__name__}): {e}")
+        return False, None, None
+
+    listas = doc.xpath(XPATH_LISTA_RESULTADOS)
+    if not listas:
+        # Sem a lista nem a mensagem de "nenhum resultado", o layout mudou ou a página exige JS
+        if doc.xpath("//*[contains(@class, 'searchResults')]") or 'nenhum resultado' in resp.text.lower():
+            logging.info(f"[{palavra_chave}] Nenhum resultado encontrado na página.")
+            return True, [], None
+        logging.warning(f"[{palavra_chave}] Lista de resultados não encontrada no HTML.")
+        return False, None, None
+
+    fingerprint = fingerprint_lista(lxml.html.tostring(listas[0]))
+    if fingerprint_anterior and fingerprint == fingerprint_anterior:
+        logging.info(f"[{palavra_chave}] Lista de resultados inalterada desde a última execução.")
+        return True, None, fingerprint
+
+    noticias = []
+    for item in listas[0].xpath("./li"):
+        links = item.xpath(".//span[contains(@class, 'titulo')]//a")
+        datas = item.xpath(".//span[contains(@class, 'data')]")
+        if not links:
+            logging.warning(f"[{palavra_chave}] Resultado sem título/link no HTML.")
+            return False, None, None
+        titulo = links[0].text_content().strip()
+        link = urljoin(url, (links[0].get("href") or "").strip())
+        data_str = datas[0].text_content() if datas else ""
+        noticias.append(_montar_noticia(palavra_chave, titulo, link, data_str))
+    if not noticias:
+        logging.info(f"[{palavra_chave}] Nenhum resultado encontrado na página.")
+    return True, noticias, fingerprint
+
+def buscar_palavras_http(palavras_chave, estado=None) -> dict:
+    """
+    Consulta todas as palavras-chave em paralelo pela sessão compartilhada.
+    Retorna {palavra: (ok, noticias, fingerprint)}.
+    """
+    session = http_pool.get_session()
+    estado = estado or {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS_CVM, len(palavras_chave)))) as executor:
+        resultados = executor.map(
+            lambda p: localiza_news_http(p, session, estado.get(p, (None, None))[0]), palavras_chave
+        )
+        return dict(zip(palavras_chave, resultados))
+
+def criar_driver():
+    """Inicia o Chrome headless usado apenas como fallback da busca HTTP."""
+    # Import tardio: o Selenium só é carregado quando a busca HTTP falha
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    service = Service()
+    options = webdriver.ChromeOptions()
+    
+    # --- CONFIGURAÇÕES MELHORADAS PARA AMBIENTE ACTIONS (CI/CD) ---
+    options.add_argument("--headless=new") # Modo headless moderno, mais robusto
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080") # Garante que a página seja renderizada em um tamanho padrão
+
+    # 🚨 User-Agent Falso: Imita um navegador real para evitar bloqueios 🚨
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+    return webdriver.Chrome(service=service, options=options)
+
 def localiza_news(driver, palavra_chave):
-    """Busca a notícia mais recente para uma palavra-chave no site da CVM."""
-    url = URL_BASE_CVM.format(palavra_chave)
+    """Busca os resultados de uma palavra-chave no site da CVM (fallback via Selenium). Retorna a lista de notícias."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    url = URL_BASE_CVM.format(quote_plus(palavra_chave))
     driver.get(url)
 
     wait = WebDriverWait(driver, 10)
@@ -116,56 +261,109 @@ def localiza_news(driver, palavra_chave):
         pass # Segue em frente
 
     try:
-        # Tenta encontrar o primeiro resultado na lista de notícias
-        primeiro_resultado = wait.until(EC.presence_of_element_located(
+        # Aguarda o primeiro resultado e então lê todos os itens da lista de notícias
+        wait.until(EC.presence_of_element_located(
              (By.CSS_SELECTOR, "ul.searchResults.noticias li:first-child")
            ))
 
-        titulo_el = primeiro_resultado.find_element(By.CSS_SELECTOR, "span.titulo a")
-        titulo = titulo_el.text.strip()
-        link = titulo_el.get_attribute("href").strip()
-
-        data_el = primeiro_resultado.find_element(By.CSS_SELECTOR, "span.data")
-        data_str = data_el.text.strip().replace("-", "").strip()
+        noticias = []
+        for resultado in driver.find_elements(By.CSS_SELECTOR, "ul.searchResults.noticias > li"):
+            titulo_el = resultado.find_element(By.CSS_SELECTOR, "span.titulo a")
+            titulo = titulo_el.text.strip()
+            link = titulo_el.get_attribute("href").strip()
 
-        try:
-            data_obj = datetime.strptime(data_str, '%d/%m/%Y')
-        except ValueError:
-            logging.error(f"[{palavra_chave}] Erro ao converter a data: '{data_str}'")
-            data_obj = None
-
-        return {
-            "Gestora": palavra_chave,
-            "Título": titulo,
-            "Link": link,
-            "Data": data_obj.strftime('%d/%m/%Y') if data_obj else "",
-            "DataObj": data_obj
-        }
+            data_el = resultado.find_element(By.CSS_SELECTOR, "span.data")
+            noticias.append(_montar_noticia(palavra_chave, titulo, link, data_el.text))
+        return noticias
 
     except TimeoutException:
         # Este é o cenário que está ocorrendo no Actions: elemento não encontrado
         logging.info(f"[{palavra_chave}] Nenhum resultado encontrado na página (Timeout).")
-        return None
+        return []
     except Exception as e:
         logging.error(f"[{palavra_chave}] Erro inesperado ao extrair dados: {e}", exc_info=True)
         return None
 
-def envia_alerta_munin(gestora, titulo, link, data):
-    """Envia uma mensagem de alerta para o Google Chat."""
-    if not CHAT_WEBHOOK_URL_MUNIN:
-        logging.error("A variável de ambiente CHAT_WEBHOOK_URL_MUNIN não está configurada. Alerta não enviado.")
-        return
-
+def envia_alerta_munin(gestora, titulo, link, data, canal=CANAL_MUNIN):
+    """Enfileira a mensagem de alerta no outbox (a entrega ao Google Chat é feita em lote no fim)."""
     mensagem = {
         "text": f"🚨 *Alerta CVM* 🚨\n\nA gestora *{gestora}* foi noticiada no site da CVM:\n\n*Data:* {data}\n*Título:* {titulo}\n*Link:* {link}"
     }
-    
-    try:
-        response = requests.post(CHAT_WEBHOOK_URL_MUNIN, json=mensagem, timeout=10)
-        response.raise_for_status()
-        logging.info(f"[{gestora}] Alerta enviado com sucesso!")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"[{gestora}] Falha ao enviar alerta para o Google Chat: {e}")
+    if notificacoes.enfileirar(canal, mensagem, f"e6:{data}:{gestora}:{link}", refs=[link]):
+        logging.info(f"[{gestora}] Alerta enfileirado no outbox.")
+
+class DriverSobDemanda:
+    """Chrome compartilhado criado só no primeiro fallback (e no máximo uma vez por execução)."""
+
+    def __init__(self):
+        self.driver = None
+        self.falhou = False
+
+    def obter(self):
+        from selenium.common.exceptions import WebDriverException
+        if self.driver is None and not self.falhou:
+            try:
+                self.driver = criar_driver()
+            except WebDriverException as e:
+                logging.critical(f"ERRO CRÍTICO: Não foi possível iniciar o WebDriver. Erro: {e}")
+                self.falhou = True
+        return self.driver
+
+    def fechar(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+
+def aplicar_fallback(resultados: dict, drivers: DriverSobDemanda):
+    """Fallback com Selenium apenas para as palavras cuja página não pôde ser lida via HTTP (altera 'resultados')."""
+    pendentes_selenium = [p for p, (ok, _, _) in resultados.items() if not ok]
+    if not pendentes_selenium:
+        return
+    logging.warning(f"Busca HTTP falhou para {pendentes_selenium}; usando Selenium como fallback.")
+    driver = drivers.obter()
+    if not driver:
+        return
+    for gestora in pendentes_selenium:
+        noticias = localiza_news(driver, gestora)
+        # Sem fingerprint: o fallback sempre reprocessa a lista
+        resultados[gestora] = (noticias is not None, noticias, None)
+        sleep(1)
+
+def processar_resultados(con, palavras_chave, resultados: dict, estado: dict, canal=CANAL_MUNIN, hoje: date = None):
+    """
+    Todos os resultados mais novos que a marca d'água, com deduplicação por (data, gestora, link).
+    Retorna (noticias_encontradas, notificacoes_enviadas).
+    """
+    hoje = hoje or datetime.now().date()
+    noticias_encontradas = 0
+    notificacoes_enviadas = 0
+    # Marcações e estado de todas as palavras-chave num único commit (o outbox já é idempotente pela dedup_key)
+    with armazenamento.transacao(con):
+        for gestora in palavras_chave:
+            ok, noticias, fingerprint = resultados.get(gestora, (False, None, None))
+            if not ok or noticias is None:
+                continue # Falha na leitura ou lista inalterada: o estado fica como está
+
+            # Na primeira execução de uma palavra-chave, apenas itens de hoje (não alerta o histórico)
+            watermark = estado.get(gestora, (None, None))[1] or hoje
+            novas = [n for n in noticias if n["DataObj"] and n["DataObj"].date() >= watermark]
+            if noticias and not novas:
+                logging.info(f"[{gestora}] Nenhuma notícia nova desde {watermark.strftime('%d/%m/%Y')} (mais recente: {noticias[0]['Data']}).")
+
+            for noticia in novas:
+                data_noticia = noticia["DataObj"].date()
+                if already_sent_today(con, data_noticia, gestora, noticia["Link"]):
+                    logging.info(f"[{gestora}] Notícia de {noticia['Data']} já notificada (evitando duplicata).")
+                else:
+                    logging.info(f"[{gestora}] Notícia nova encontrada ({noticia['Data']})! Enviando alerta.")
+                    envia_alerta_munin(noticia["Gestora"], noticia["Título"], noticia["Link"], noticia["Data"], canal)
+                    mark_sent(con, data_noticia, gestora, noticia["Link"], noticia["Título"])
+                    notificacoes_enviadas += 1
+                noticias_encontradas += 1
+
+            datas = [n["DataObj"].date() for n in noticias if n["DataObj"]]
+            save_search_state(con, gestora, fingerprint, max(datas + [watermark]))
+    return noticias_encontradas, notificacoes_enviadas
 
 def main():
     """Função principal que orquestra a execução do robô."""
@@ -176,62 +374,32 @@ def main():
     if not con:
         sys.exit(1) # Encerra se a inicialização do DB falhar
 
-    service = Service()
-    options = webdriver.ChromeOptions()
-    
-    # --- CONFIGURAÇÕES MELHORADAS PARA AMBIENTE ACTIONS (CI/CD) ---
-    options.add_argument("--headless=new") # Modo headless moderno, mais robusto
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1920,1080") # Garante que a página seja renderizada em um tamanho padrão
-
-    # 🚨 User-Agent Falso: Imita um navegador real para evitar bloqueios 🚨
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
-    
-    driver = None
-    try:
-        driver = webdriver.Chrome(service=service, options=options)
-    except WebDriverException as e:
-        logging.critical(f"ERRO CRÍTICO: Não foi possível iniciar o WebDriver. Erro: {e}")
-        # Se o driver não iniciar, encerra com erro
-        if con: con.close()
-        sys.exit(1)
-
-    hoje = datetime.now().date()
     noticias_encontradas = 0
     notificacoes_enviadas = 0
+    drivers = DriverSobDemanda()
 
     try:
-        for gestora in PALAVRAS_CHAVE:
-            logging.info(f"Buscando por: '{gestora}'...")
-            noticia = localiza_news(driver, gestora)
-
-            if noticia and noticia["DataObj"] and noticia["DataObj"].date() == hoje:
-                
-                if already_sent_today(con, hoje, gestora, noticia["Link"]):
-                    logging.info(f"[{gestora}] Notícia de hoje já notificada (evitando duplicata).")
-                else:
-                    logging.info(f"[{gestora}] Notícia encontrada para a data de hoje! Enviando alerta.")
-                    envia_alerta_munin(noticia["Gestora"], noticia["Título"], noticia["Link"], noticia["Data"])
-                    mark_sent(con, hoje, gestora, noticia["Link"], noticia["Título"])
-                    notificacoes_enviadas += 1
-                noticias_encontradas += 1
+        # 1. Busca HTTP de todas as palavras-chave em paralelo (um round-trip por palavra)
+        estado = load_search_state(con)
+        resultados = buscar_palavras_http(PALAVRAS_CHAVE, estado)
 
-            elif noticia:
-                logging.info(f"[{gestora}] Notícia encontrada, mas não é de hoje (Data: {noticia['Data']}).")
+        # 2. Fallback com Selenium apenas para as palavras cuja página não pôde ser lida via HTTP
+        aplicar_fallback(resultados, drivers)
 
-            sleep(1) 
+        # 3. Todos os resultados mais novos que a marca d'água, com deduplicação por (data, gestora, link)
+        noticias_encontradas, notificacoes_enviadas = processar_resultados(con, PALAVRAS_CHAVE, resultados, estado)
 
     finally:
-        if driver:
-            driver.quit()
+        drivers.fechar()
         if con:
             con.close()
+        # Entrega os alertas enfileirados (inclui pendências de execuções anteriores)
+        try:
+            notificacoes.entregar_pendentes([CANAL_MUNIN])
+        except Exception as e:
+            logging.error(f"Falha ao entregar os alertas do outbox: {e}")
         
-        logging.info(f"Busca finalizada. {noticias_encontradas} notícia(s) de hoje encontrada(s). {notificacoes_enviadas} notificação(ões) enviada(s) (sem duplicar).")
+        logging.info(f"Busca finalizada. {noticias_encontradas} notícia(s) nova(s) encontrada(s). {notificacoes_enviadas} notificação(ões) enviada(s) (sem duplicar).")
         logging.info("="*25 + " ROBÔ FINALIZADO " + "="*25)
 
 if __name__ == "__main__":
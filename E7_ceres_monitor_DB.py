@@ -6,6 +6,7 @@ import json
 import time
 import sqlite3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Optional
 
@@ -14,6 +15,10 @@ import requests
 from dotenv import load_dotenv 
 from groq import Groq # SDK Groq para chamadas mais robustas
 
+import notificacoes # Outbox compartilhado de alertas (entrega com retentativa e dedup)
+import metricas
+import armazenamento # Conexões SQLite com WAL e commits em lote
+
 # --- Configuração de Ambiente (CI/CD) -----------------------------------------
 load_dotenv() 
 
@@ -26,10 +31,29 @@ DB_PATH = os.path.join(DB_DIR, DB_FILENAME)
 
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "mixtral-8x7b-32768") # Modelo LLM
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-GOOGLE_CHAT_WEBHOOK_URL = os.environ.get("CHAT_WEBHOOK_URL_HALL")
+CANAL_HALL = 'HALL' # Webhook em CHAT_WEBHOOK_URL_HALL
 
 TIMEOUT = (10, 30) # Timeout para requisições
-API_SLEEP = float(os.environ.get("E7_API_SLEEP", 1.0)) # Pausa após chamada da Groq
+API_SLEEP = float(os.environ.get("E7_API_SLEEP", 1.0)) # Pausa após chamada da Groq (por worker)
+MAX_WORKERS_API = int(os.environ.get("E7_MAX_WORKERS_API", 2)) # Resumos simultâneos na Groq (limitador de rate limit)
+MAX_ENTRADAS = int(os.environ.get("E7_MAX_ENTRADAS", 20)) # Teto de notícias novas tratadas por execução
+
+# Templates padrão (Ceres). Outras entidades declaram os seus em monitores.yaml
+PROMPT_CERES = (
+    "Você é um assistente que resume notícias em português do Brasil.\n"
+    "Crie um resumo conciso (~400 caracteres, variação ±10%), claro e informativo, "
+    "sem hashtags, emojis ou opinião. Inclua apenas fatos e contexto essencial. Vale ressaltar "
+    "que vocÊ fará o resumo se a matéria for sobre a Entidades Fechada de prividência complementar: Ceres Previdência, aq notítcia tem que ser exclusivamente sobre ela"
+    "não for sobre ela. A cerês previdência é uma efpc localiza em brasília que tem como principal participante a embrapa. retorne \n\n"
+    "Título: {title}\n"
+    "Conteúdo:\n{text}\n\n"
+    "Resumo:"
+)
+MENSAGEM_CERES = (
+    "✳️✳️ A *Ceres* foi noticiada! ✳️✳️\n\n"
+    "*Resumo:* {summary}\n\n"
+    "*Link:* <{link}|Clique para ler>"
+)
 
 # --- Utilidades ---------------------------------------------------------------
 
@@ -44,10 +68,8 @@ def db_init(db_path: str = DB_PATH):
     Cria (se não existir) a conexão e a tabela do DB.
     Garante que o diretório do DB exista.
     """
-    # Garante que a pasta 'data' exista (padrão de montagem de volume)
-    os.makedirs(os.path.dirname(db_path), exist_ok=True) 
-
-    con = sqlite3.connect(db_path)
+    # Garante que a pasta 'data' exista (padrão de montagem de volume) e aplica WAL/synchronous=NORMAL
+    con = armazenamento.conectar_sqlite(db_path)
     con.execute(
         """
             CREATE TABLE IF NOT EXISTS sent_links (
@@ -59,47 +81,59 @@ def db_init(db_path: str = DB_PATH):
     con.commit()
     return con
 
-def already_sent(con: sqlite3.Connection, link: str) -> bool:
-    cur = con.execute("SELECT 1 FROM sent_links WHERE link = ?", (link,))
-    return cur.fetchone() is not None
-
-def mark_sent(con: sqlite3.Connection, link: str):
-    con.execute(
-         "INSERT OR IGNORE INTO sent_links(link, sent_at) VALUES(?, ?)",
-         (link, datetime.now(timezone.utc).isoformat())
+def unsent_links(con: sqlite3.Connection, links: list) -> set:
+    """Anti-join em lote: retorna os links ainda não enviados (uma consulta para o feed inteiro)."""
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS candidatos (link TEXT PRIMARY KEY)")
+    con.execute("DELETE FROM candidatos")
+    con.executemany("INSERT OR IGNORE INTO candidatos(link) VALUES(?)", [(l,) for l in links])
+    cur = con.execute(
+        """
+        SELECT c.link FROM candidatos c
+        WHERE NOT EXISTS (SELECT 1 FROM sent_links s WHERE s.link = c.link)
+        """
     )
-    con.commit()
+    return {row[0] for row in cur.fetchall()}
+
+def mark_sent(con: sqlite3.Connection, links: list):
+    """Marca todos os links como enviados numa única transação."""
+    agora = datetime.now(timezone.utc).isoformat()
+    with armazenamento.transacao(con):
+        con.executemany(
+             "INSERT OR IGNORE INTO sent_links(link, sent_at) VALUES(?, ?)",
+             [(link, agora) for link in links]
+        )
 
 def fetch_feed(url: str):
     return feedparser.parse(url)
 
-def pick_latest_unsent(feed, con):
-    entries = feed.entries
-    def sort_key(e):
-        return getattr(e, "published_parsed", None) or time.gmtime(0)
-    entries_sorted = sorted(entries, key=sort_key, reverse=True)
-    for e in entries_sorted:
-        link = getattr(e, "link", None)
-        if link and not already_sent(con, link):
-             return e
-    return None
+def _sort_key(e):
+    return getattr(e, "published_parsed", None) or time.gmtime(0)
 
-def groq_summarize(text: str, title: str = "") -> str:
+def pick_all_unsent(entries, con, limit: int = MAX_ENTRADAS) -> list:
+    """
+    Retorna as entradas ainda não enviadas (as 'limit' mais recentes), em ordem cronológica,
+    deduplicadas por link.
+    """
+    por_link = {}
+    for e in sorted(entries, key=_sort_key, reverse=True):
+        link = getattr(e, "link", None)
+        if link and link not in por_link:
+            por_link[link] = e
+    if not por_link:
+        return []
+    novos = unsent_links(con, list(por_link))
+    entries = [e for link, e in por_link.items() if link in novos][:limit]
+    return entries[::-1]
+
+def get_groq_client() -> Groq:
     if not GROQ_API_KEY:
      raise RuntimeError("GROQ_API_KEY não definido no .env")
+    return Groq(api_key=GROQ_API_KEY)
 
-    client = Groq(api_key=GROQ_API_KEY) 
-
-    prompt = (
-        "Você é um assistente que resume notícias em português do Brasil.\n"
-        "Crie um resumo conciso (~400 caracteres, variação ±10%), claro e informativo, "
-        "sem hashtags, emojis ou opinião. Inclua apenas fatos e contexto essencial. Vale ressaltar "
-        "que vocÊ fará o resumo se a matéria for sobre a Entidades Fechada de prividência complementar: Ceres Previdência, aq notítcia tem que ser exclusivamente sobre ela"
-        "não for sobre ela. A cerês previdência é uma efpc localiza em brasília que tem como principal participante a embrapa. retorne \n\n"
-        f"Título: {title}\n"
-        f"Conteúdo:\n{text}\n\n"
-        "Resumo:"
-    )
+def groq_summarize(text: str, title: str = "", client: Optional[Groq] = None, prompt_template: str = PROMPT_CERES) -> str:
+    client = client or get_groq_client()
+
+    prompt = prompt_template.format(title=title, text=text)
 
     messages = [
         {"role": "system", "content": "Você escreve resumos jornalísticos precisos em pt-BR."},
@@ -118,20 +152,29 @@ def groq_summarize(text: str, title: str = "") -> str:
         summary = summary[:520].rstrip() + "…"
     return summary
 
-def build_message(title: str, link: str, summary: str) -> str:
+def build_message(title: str, link: str, summary: str, template: str = MENSAGEM_CERES) -> str:
     """ Monta a mensagem final que será enviada ao Google Chat. """
-    return (
-        f"✳️✳️ A *Ceres* foi noticiada! ✳️✳️\n\n"
-        f"*Resumo:* {summary}\n\n"
-        f"*Link:* <{link}|Clique para ler>"
-    )
+    return template.format(title=title, link=link, summary=summary)
 
 
-def send_to_google_chat(webhook_url: str, text: str):
-    if not webhook_url:
-        raise RuntimeError("GOOGLE_CHAT_WEBHOOK_URL não definido no .env")
-    r = requests.post(webhook_url, json={"text": text}, timeout=TIMEOUT)
-    r.raise_for_status()
+def enqueue_google_chat(link: str, text: str, canal: str = CANAL_HALL, prefixo: str = "e7"):
+    """Enfileira a mensagem no outbox (dedup pelo link); a entrega é feita em lote por entregar_pendentes."""
+    notificacoes.enfileirar(canal, {"text": text}, f"{prefixo}:{link}", refs=[link])
+
+def summarize_entry(entry, client: Groq, prompt_template: str = PROMPT_CERES) -> str:
+    """Resumo de uma entrada do RSS; em caso de falha da API (ex: RateLimit), usa o summary bruto."""
+    title = getattr(entry, "title", "Sem título")
+    summary_source = getattr(entry, "summary", "") or getattr(entry, "description", "") or title
+    try:
+        resumo = groq_summarize(summary_source, title=title, client=client, prompt_template=prompt_template)
+        metricas.incrementar('chamadas_llm_total', etapa='E7', resultado='ok')
+    except Exception:
+        metricas.incrementar('chamadas_llm_total', etapa='E7', resultado='erro')
+        logging.exception(f"Falha no resumo via Groq ({title[:60]}). Usando resumo bruto.")
+        resumo = (summary_source or title)[:400].strip() + "…"
+    # Pausa de controle para evitar Rate Limit (cada worker espera após a sua chamada)
+    time.sleep(API_SLEEP)
+    return resumo
 
 
 # --- Principal ---------------------------------------------------------------
@@ -149,33 +192,30 @@ def main():
             logging.warning("Nenhuma entrada encontrada no RSS.")
             return
 
-        entry = pick_latest_unsent(feed, con)
-        if not entry:
+        entries = pick_all_unsent(feed.entries, con)
+        if not entries:
             logging.info("Nenhuma notícia nova para enviar.")
             return
 
-        title = getattr(entry, "title", "Sem título")
-        link = getattr(entry, "link", "")
-        summary_source = getattr(entry, "summary", "") or getattr(entry, "description", "") or title
-
-        logging.info("Gerando resumo com Groq…")
-        try:
-            resumo = groq_summarize(summary_source, title=title)
-        except Exception as e:
-            # Em caso de falha da API (ex: RateLimit), usa o summary bruto
-            logging.exception("Falha no resumo via Groq. Usando resumo bruto.")
-            resumo = (summary_source or title)[:400].strip() + "…"
+        # Um único cliente Groq reaproveitado por todos os workers; o pool limita as chamadas simultâneas
+        client = get_groq_client()
+        logging.info(f"Gerando {len(entries)} resumo(s) com Groq ({MAX_WORKERS_API} workers)…")
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS_API, len(entries)))) as executor:
+            resumos = list(executor.map(lambda e: summarize_entry(e, client), entries))
 
-        # Pausa de controle para evitar Rate Limit
-        time.sleep(API_SLEEP)
-        
-        texto = build_message(title, link, resumo)
+        # Enfileira em ordem cronológica e entrega tudo de uma vez
+        links = []
+        for entry, resumo in zip(entries, resumos):
+            link = getattr(entry, "link", "")
+            texto = build_message(getattr(entry, "title", "Sem título"), link, resumo)
+            enqueue_google_chat(link, texto)
+            links.append(link)
 
         logging.info("Enviando para Google Chat…")
-        send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, texto)
+        notificacoes.entregar_pendentes([CANAL_HALL])
 
-        mark_sent(con, link)
-        logging.info("Concluído. Link marcado como enviado.")
+        mark_sent(con, links)
+        logging.info(f"Concluído. {len(links)} link(s) marcado(s) como enviado(s).")
 
     except RuntimeError as e:
         # Erros críticos de configuração (Webhook, API Key)
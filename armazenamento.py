@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Camada única de acesso a banco de dados do pipeline.
+
+- obter_engine(url): uma engine SQLAlchemy por URL e por processo (o pool de conexões é reaproveitado
+  por todas as etapas, pelo outbox, pelas métricas...).
+- conectar_sqlite(caminho): conexão sqlite3 "crua" (E6, E7, índice do cache HTTP) com as mesmas pragmas.
+- transacao(con): agrupa várias escritas sqlite3 num único commit (em vez de um commit por linha).
+- escrever(engine, funcao): escrita transacional; em SQLite passa pelo escritor único da engine.
+- atualizar_em_lote(connection, ...): UPDATE de milhares de linhas num só comando (tabela temporária
+  + join; COPY no PostgreSQL), em vez de um UPDATE por linha.
+
+Toda conexão SQLite recebe, ao abrir: journal_mode=WAL (leitores não bloqueiam o escritor),
+synchronous=NORMAL (sem fsync a cada commit no WAL), mmap_size, temp_store=MEMORY e busy_timeout.
+Em SQLite, todas as escritas das etapas passam por uma única thread escritora por arquivo
+(EscritorUnico): as mutações enfileiradas por etapas/threads concorrentes (daemon, pré-extração
+da E3...) são aplicadas em lotes, uma transação e um fsync por lote, sem disputa pelo lock de
+escrita ('database is locked'). As leituras continuam no pool, cada uma no seu snapshot do WAL.
+Na saída do processo o WAL é consolidado no arquivo principal (checkpoint), porque os .db de
+'data/' são versionados pelo workflow e precisam estar completos sem os arquivos -wal/-shm.
+"""
+import io
+import os
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# --- CONFIGURAÇÕES ---
+load_dotenv()
+DB_URL = os.getenv("DB_URL", "sqlite:///./data/noticias_pipeline.db")
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "sim") # false volta ao journal padrão (DELETE)
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)) # Bytes mapeados em memória por conexão
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 30000)) # Espera por lock antes de 'database is locked'
+SQLITE_ESCRITOR_UNICO = os.getenv("SQLITE_ESCRITOR_UNICO", "true").lower() in ("1", "true", "sim") # false: cada thread escreve direto
+SQLITE_ESCRITOR_LOTE_MAX = int(os.getenv("SQLITE_ESCRITOR_LOTE_MAX", 64)) # Mutações por transação do escritor
+
+_lock = threading.Lock()
+_engines = {} # url -> Engine
+_verificadas = set() # URLs cuja conexão já foi testada (SELECT 1) neste processo
+_escritores = {} # url -> EscritorUnico
+
+# ---------------------- PRAGMAS ----------------------
+
+def aplicar_pragmas(con):
+    """Aplica as pragmas de desempenho numa conexão DBAPI sqlite3 recém-aberta."""
+    cursor = con.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+def _garantir_pasta_sqlite(url: str):
+    if url.startswith("sqlite:///") and ":memory:" not in url:
+        os.makedirs(os.path.dirname(url.replace("sqlite:///", "", 1)) or ".", exist_ok=True)
+
+# ---------------------- SQLALCHEMY ----------------------
+
+def obter_engine(url: str = None):
+    """Engine compartilhada da URL (padrão: DB_URL), criada uma vez por processo."""
+    url = url or DB_URL
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            if url.startswith("sqlite"):
+                _garantir_pasta_sqlite(url)
+                engine = create_engine(url, connect_args={'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000})
+                event.listen(engine, "connect", lambda con, _registro: aplicar_pragmas(con))
+            else:
+                engine = create_engine(url, pool_pre_ping=True)
+            _engines[url] = engine
+    return engine
+
+def get_db_engine(url: str = None):
+    """
+    Engine compartilhada com a conexão verificada (SELECT 1 só na primeira chamada por URL).
+    Levanta RuntimeError se o DB estiver inacessível, como as antigas get_db_engine() das etapas.
+    """
+    url = url or DB_URL
+    engine = obter_engine(url)
+    if url in _verificadas:
+        return engine
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except SQLAlchemyError as e:
+        print(f"🚨 ERRO CRÍTICO: Falha na conexão com o Banco de Dados. Erro: {e}")
+        raise RuntimeError("Falha na conexão com o DB.")
+    _verificadas.add(url)
+    return engine
+
+# ---------------------- SQLITE3 ----------------------
+
+def conectar_sqlite(caminho: str, **kwargs) -> sqlite3.Connection:
+    """Abre uma conexão sqlite3 com as pragmas do pipeline (cria a pasta do arquivo se preciso)."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    kwargs.setdefault('timeout', SQLITE_BUSY_TIMEOUT_MS / 1000)
+    con = sqlite3.connect(caminho, **kwargs)
+    aplicar_pragmas(con)
+    return con
+
+@contextmanager
+def transacao(con: sqlite3.Connection):
+    """Um único commit para todas as escritas do bloco (rollback se o bloco levantar exceção)."""
+    try:
+        yield con
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+# ---------------------- ESCRITOR ÚNICO (SQLITE) ----------------------
+
+class EscritorUnico:
+    """
+    Thread dona das escritas de uma engine SQLite. Cada mutação é uma função funcao(connection);
+    o que estiver na fila quando a thread fica livre vira um lote aplicado numa só transação.
+    Se uma mutação falha, o lote é desfeito e reaplicado item a item, para que só ela receba o erro.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.fila = queue.Queue()
+        self.thread = threading.Thread(target=self._executar, name=f"escritor-{engine.url.database}", daemon=True)
+        self.thread.start()
+
+    def submeter(self, funcao) -> Future:
+        futuro = Future()
+        self.fila.put((funcao, futuro))
+        return futuro
+
+    def parar(self):
+        """Aplica o que já está na fila e encerra a thread."""
+        self.fila.put(None)
+        self.thread.join()
+
+    def _executar(self):
+        while True:
+            lote = [self.fila.get()]
+            while lote[-1] is not None and len(lote) < SQLITE_ESCRITOR_LOTE_MAX:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            encerrar = lote[-1] is None
+            lote = [item for item in lote if item is not None]
+            if lote:
+                self._aplicar(lote)
+            if encerrar:
+                return
+
+    def _aplicar(self, lote: list):
+        try:
+            with self.engine.begin() as connection:
+                resultados = [funcao(connection) for funcao, _ in lote]
+        except Exception as e:
+            if len(lote) > 1:
+                for item in lote:
+                    self._aplicar([item])
+            else:
+                lote[0][1].set_exception(e)
+            return
+        for (_, futuro), resultado in zip(lote, resultados):
+            futuro.set_result(resultado)
+
+def _escritor_da_engine(engine):
+    if not SQLITE_ESCRITOR_UNICO or engine.dialect.name != 'sqlite':
+        return None
+    url = str(engine.url)
+    with _lock:
+        escritor = _escritores.get(url)
+        if escritor is None:
+            escritor = _escritores[url] = EscritorUnico(engine)
+    return escritor
+
+def escrever(engine, funcao):
+    """
+    Executa funcao(connection) numa transação de escrita e devolve o retorno (exceções são repassadas).
+    Em SQLite a mutação vai para o escritor único da engine e a chamada espera o commit do lote;
+    nos demais bancos (ou de dentro da própria thread escritora) roda direto num engine.begin().
+    """
+    escritor = _escritor_da_engine(engine)
+    if escritor is None or threading.current_thread() is escritor.thread:
+        with engine.begin() as connection:
+            return funcao(connection)
+    return escritor.submeter(funcao).result()
+
+# ---------------------- ATUALIZAÇÃO EM LOTE ----------------------
+
+DRIVERS_COM_COPY = ('psycopg2', 'psycopg')
+ESQUEMA_TEMPORARIO = {'sqlite': 'temp.', 'postgresql': 'pg_temp.'} # Nunca acerta uma tabela real por engano
+
+def _campo_csv(valor) -> str:
+    """Campo do COPY ... (FORMAT csv): NULL é o campo vazio sem aspas; o resto vai entre aspas."""
+    if valor is None or valor != valor: # None, NaN, NaT
+        return ''
+    if isinstance(valor, datetime):
+        valor = valor.isoformat(sep=' ')
+    return '"' + str(valor).replace('"', '""') + '"'
+
+def _copiar_postgres(connection, tabela: str, colunas: list, linhas: list):
+    """Carrega as linhas com COPY FROM STDIN pelo cursor DBAPI da própria conexão (mesma transação)."""
+    buffer = io.StringIO()
+    for linha in linhas:
+        buffer.write(','.join(_campo_csv(linha.get(c)) for c in colunas) + '\n')
+    comando = f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'): # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(comando, buffer)
+        else: # psycopg 3
+            with cursor.copy(comando) as copia:
+                copia.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+def atualizar_em_lote(connection, tabela: str, linhas: list, colunas, chave: str = 'url', expressoes: dict = None) -> int:
+    """
+    Atualiza muitas linhas de 'tabela' com um único UPDATE ... FROM (join numa tabela temporária).
+    - linhas: dicts com a chave e as 'colunas' (se a chave se repetir, vale a última linha);
+    - colunas: colunas de 'tabela' cujos valores novos vêm das linhas (viram 'v.<coluna>');
+    - expressoes: {coluna: SQL} para atribuições calculadas, podendo usar 'v.<coluna>' (valor novo)
+      e '<tabela>.<coluna>' (valor atual), ex.: CASE WHEN v.status = 'OK' THEN v.ts ELSE tabela.ts END.
+    A carga usa COPY no PostgreSQL (psycopg2/psycopg) e executemany nos demais. Roda dentro da
+    transação de 'connection' e retorna o número de linhas atualizadas.
+    """
+    linhas = list({linha[chave]: linha for linha in linhas}.values())
+    if not linhas:
+        return 0
+    colunas, expressoes = list(colunas), dict(expressoes or {})
+    todas = [chave] + colunas
+    dialeto = connection.dialect.name
+    temporaria = f"{ESQUEMA_TEMPORARIO.get(dialeto, '')}_lote_{tabela}"
+
+    connection.execute(text(f"DROP TABLE IF EXISTS {temporaria}"))
+    connection.execute(text(
+        f"CREATE TEMPORARY TABLE {temporaria} AS SELECT {', '.join(todas)} FROM {tabela} WHERE 1 = 0"
+    ))
+    if dialeto == 'postgresql' and connection.dialect.driver in DRIVERS_COM_COPY:
+        _copiar_postgres(connection, temporaria, todas, linhas)
+    else:
+        connection.execute(
+            text(f"INSERT INTO {temporaria} ({', '.join(todas)}) VALUES ({', '.join(':' + c for c in todas)})"),
+            [{c: linha.get(c) for c in todas} for linha in linhas]
+        )
+
+    atribuicoes = {c: f"v.{c}" for c in colunas}
+    atribuicoes.update(expressoes)
+    if dialeto == 'postgresql' or (dialeto == 'sqlite' and sqlite3.sqlite_version_info >= (3, 33, 0)):
+        comando = (f"UPDATE {tabela} SET {', '.join(f'{c} = {e}' for c, e in atribuicoes.items())} "
+                   f"FROM {temporaria} AS v WHERE {tabela}.{chave} = v.{chave}")
+    else:
+        # Sem UPDATE ... FROM: subconsultas correlacionadas na mesma tabela temporária
+        sets = ', '.join(f"{c} = (SELECT {e} FROM {temporaria} AS v WHERE v.{chave} = {tabela}.{chave})"
+                         for c, e in atribuicoes.items())
+        comando = f"UPDATE {tabela} SET {sets} WHERE {chave} IN (SELECT {chave} FROM {temporaria})"
+    atualizadas = connection.execute(text(comando)).rowcount
+    # Em caso de erro a transação é desfeita junto com a tabela temporária
+    connection.execute(text(f"DROP TABLE IF EXISTS {temporaria}"))
+    return atualizadas
+
+# ---------------------- ENCERRAMENTO ----------------------
+
+def fechar_tudo():
+    """Esvazia os escritores, consolida o WAL (checkpoint) e fecha as conexões de todas as engines do processo."""
+    with _lock:
+        escritores = list(_escritores.values())
+        _escritores.clear()
+    for escritor in escritores:
+        escritor.parar()
+    with _lock:
+        engines = list(_engines.items())
+        _engines.clear()
+        _verificadas.clear()
+    for url, engine in engines:
+        try:
+            if url.startswith("sqlite") and SQLITE_WAL:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            engine.dispose()
+        except Exception as e:
+            logging.warning(f"Falha ao encerrar a engine de {url}: {e}")
+
+atexit.register(fechar_tudo)
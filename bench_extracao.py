@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extração da E3: templates por portal (extratores.py) x newspaper.
+
+Uso:
+    python bench_extracao.py <pasta_com_paginas> [repeticoes]
+
+Para cada <nome>.html da pasta:
+  - <nome>.url (opcional) contém a URL original; sem ele, o nome do arquivo até '__'
+    é usado como domínio (ex.: 'valor.globo.com__materia.html');
+  - <nome>.txt (opcional) é o texto de referência, usado para medir a qualidade (F1 de palavras).
+"""
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from newspaper import Article
+
+import extratores
+from E3_noticia_DB import NEWSPAPER_CONFIG
+
+def _url_da_pagina(pasta: str, nome: str) -> str:
+    caminho_url = os.path.join(pasta, f"{nome}.url")
+    if os.path.exists(caminho_url):
+        with open(caminho_url, encoding='utf-8') as f:
+            return f.read().strip()
+    return f"https://{nome.split('__')[0]}/"
+
+def _palavras(texto: str) -> Counter:
+    return Counter(re.findall(r'\w+', (texto or '').lower()))
+
+def f1_palavras(extraido: str, referencia: str) -> float:
+    """F1 de sobreposição de palavras (bag of words) entre o texto extraído e a referência."""
+    a, b = _palavras(extraido), _palavras(referencia)
+    comuns = sum((a & b).values())
+    if not comuns:
+        return 0.0
+    precisao = comuns / sum(a.values())
+    revocacao = comuns / sum(b.values())
+    return 2 * precisao * revocacao / (precisao + revocacao)
+
+def extrair_newspaper(url: str, html: str) -> str:
+    article = Article(url, config=NEWSPAPER_CONFIG)
+    article.download(input_html=html)
+    article.parse()
+    return (article.text or '').strip()
+
+def medir(funcao, url: str, html: str, repeticoes: int):
+    t0 = time.perf_counter()
+    for _ in range(repeticoes):
+        texto = funcao(url, html)
+    return texto, (time.perf_counter() - t0) / repeticoes * 1000
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    pasta = sys.argv[1]
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    nomes = sorted(f[:-5] for f in os.listdir(pasta) if f.endswith('.html'))
+    print(f"{'página':40} {'tpl ms':>8} {'np ms':>8} {'tpl chars':>10} {'np chars':>9} {'F1 tpl':>7} {'F1 np':>7}")
+    totais = {'tpl': 0.0, 'np': 0.0}
+    for nome in nomes:
+        with open(os.path.join(pasta, f"{nome}.html"), encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        url = _url_da_pagina(pasta, nome)
+        referencia = None
+        caminho_txt = os.path.join(pasta, f"{nome}.txt")
+        if os.path.exists(caminho_txt):
+            with open(caminho_txt, encoding='utf-8') as f:
+                referencia = f.read()
+
+        texto_tpl, ms_tpl = medir(extratores.extrair_por_template, url, html, repeticoes)
+        texto_np, ms_np = medir(extrair_newspaper, url, html, repeticoes)
+        totais['tpl'] += ms_tpl
+        totais['np'] += ms_np
+
+        # Sem referência, o F1 compara cada extrator com o outro
+        f1_tpl = f1_palavras(texto_tpl, referencia if referencia is not None else texto_np)
+        f1_np = f1_palavras(texto_np, referencia) if referencia is not None else float('nan')
+        print(f"{nome[:40]:40} {ms_tpl:8.1f} {ms_np:8.1f} {len(texto_tpl or ''):10d} {len(texto_np):9d} {f1_tpl:7.2f} {f1_np:7.2f}")
+
+    if nomes:
+        print(f"\nMédia por página: template {totais['tpl'] / len(nomes):.1f} ms | newspaper {totais['np'] / len(nomes):.1f} ms")
+
+if __name__ == "__main__":
+    main()
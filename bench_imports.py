@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do tempo de importação (partida a frio) do orquestrador e de cada etapa.
+
+Uso:
+    python bench_imports.py [repeticoes] [modulo ...]
+
+Cada import roda num interpretador novo (sem cache de módulos do processo), 'repeticoes'
+vezes (padrão 5); o relatório mostra a mediana e os pacotes mais pesados segundo
+'python -X importtime'. Sem módulos, mede o orquestrador e todas as etapas.
+"""
+import os
+import re
+import sys
+import statistics
+import subprocess
+
+MODULOS_PADRAO = [
+    'executar_tudo',
+    'E1_extracao_DB', 'E2_interesse_DB', 'E3_noticia_DB', 'E4_alvo_DB', 'E5_alerta_DB',
+    'monitores', 'E6_cvm_monitor_DB', 'E7_ceres_monitor_DB',
+]
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+_LINHA_IMPORTTIME = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def medir_import(modulo: str) -> float:
+    """Segundos para importar 'modulo' num interpretador novo."""
+    codigo = f"import time; t = time.perf_counter(); import {modulo}; print(time.perf_counter() - t)"
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=DIRETORIO, capture_output=True, text=True, check=True)
+    return float(saida.stdout.strip().splitlines()[-1])
+
+def pacotes_mais_pesados(modulo: str, quantidade: int = 5) -> list:
+    """Imports diretos de 'modulo' com maior tempo acumulado (-X importtime), em ms."""
+    saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {modulo}"],
+                           cwd=DIRETORIO, capture_output=True, text=True, check=True)
+    # No -X importtime os filhos aparecem antes do pai, um nível (2 espaços) mais indentados
+    filhos = []
+    for linha in saida.stderr.splitlines():
+        casamento = _LINHA_IMPORTTIME.match(linha)
+        if not casamento:
+            continue
+        indentacao, nome = len(casamento.group(3)), casamento.group(4)
+        if indentacao == 1:
+            if nome == modulo:
+                break
+            filhos = []
+        elif indentacao == 3:
+            filhos.append((nome, int(casamento.group(2)) / 1000))
+    return sorted(filhos, key=lambda p: p[1], reverse=True)[:quantidade]
+
+def main():
+    args = sys.argv[1:]
+    repeticoes = int(args.pop(0)) if args and args[0].isdigit() else 5
+    modulos = args or MODULOS_PADRAO
+
+    print(f"{'módulo':22} {'mediana':>9} {'mín':>9}   pacotes mais pesados (ms acumulados)")
+    for modulo in modulos:
+        try:
+            tempos = [medir_import(modulo) for _ in range(repeticoes)]
+            pesados = pacotes_mais_pesados(modulo)
+        except subprocess.CalledProcessError as e:
+            erro = (e.stderr or '').strip().splitlines()
+            print(f"{modulo:22} FALHOU: {erro[-1] if erro else e}")
+            continue
+        detalhe = ', '.join(f"{nome} {ms:.0f}" for nome, ms in pesados)
+        print(f"{modulo:22} {statistics.median(tempos):8.3f}s {min(tempos):8.3f}s   {detalhe}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo daemon (streaming) do pipeline: alternativa de longa duração ao cron horário.
+
+Uso:
+    python daemon.py
+
+A E1 consulta os feeds continuamente (DAEMON_INTERVALO_E1) e coloca as URLs inseridas
+numa fila em memória; E2, E3, E4 e E5 rodam cada uma na sua thread, consumindo micro-lotes
+da fila de entrada e publicando na fila da etapa seguinte as URLs que avançaram.
+As filas são limitadas (DAEMON_TAMANHO_FILA): uma etapa lenta segura as anteriores.
+
+O DB continua sendo o estado durável: as filas só dizem *quais* linhas olhar; cada etapa
+recarrega essas linhas com o seu próprio filtro de pendência. Por isso uma fila perdida
+(reinício, queda) não perde trabalho: no início e a cada DAEMON_VARREDURA segundos cada
+etapa faz uma varredura completa do DB, que também recolhe as retentativas vencidas da E3.
+
+Deve rodar num host persistente (VM/agente Jenkins), sem o cron horário apontando para o
+mesmo DB ao mesmo tempo. SIGINT/SIGTERM encerram as threads ao fim do lote em andamento.
+"""
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+
+from dotenv import load_dotenv
+from groq import Groq
+
+import setup_db
+import armazenamento
+import metricas
+import E1_extracao_DB as E1
+import E2_interesse_DB as E2
+import E3_noticia_DB as E3
+import E4_alvo_DB as E4
+import E5_alerta_DB as E5
+import monitores
+
+# --- CONFIGURAÇÕES DO DAEMON ---
+load_dotenv()
+DAEMON_INTERVALO_E1 = float(os.getenv("DAEMON_INTERVALO_E1", 120)) # Segundos entre consultas aos feeds
+DAEMON_TAMANHO_FILA = int(os.getenv("DAEMON_TAMANHO_FILA", 200)) # URLs por fila entre etapas (backpressure)
+DAEMON_LOTE = int(os.getenv("DAEMON_LOTE", 20)) # Máximo de URLs por micro-lote de uma etapa
+DAEMON_ESPERA_LOTE = float(os.getenv("DAEMON_ESPERA_LOTE", 5)) # Segundos acumulando um micro-lote após o 1º item
+DAEMON_VARREDURA = float(os.getenv("DAEMON_VARREDURA", 900)) # Varredura completa do DB por etapa (recuperação)
+DAEMON_INTERVALO_MONITORES = float(os.getenv("DAEMON_INTERVALO_MONITORES", 900)) # E6/E7...; 0 desliga
+DAEMON_MAX_LINKS_VISTOS = int(os.getenv("DAEMON_MAX_LINKS_VISTOS", 20000)) # Memória de links de feed já tratados
+DAEMON_INTERVALO_METRICAS = float(os.getenv("DAEMON_INTERVALO_METRICAS", 60)) # Backlog + textfile do Prometheus
+
+parar = threading.Event()
+
+# ---------------------- FILAS ----------------------
+
+def _colocar(fila: queue.Queue, urls):
+    """put() bloqueante (backpressure), mas que desiste ao receber o pedido de parada."""
+    for url in urls:
+        while not parar.is_set():
+            try:
+                fila.put(url, timeout=1)
+                break
+            except queue.Full:
+                continue
+
+def _coletar_lote(fila: queue.Queue) -> list:
+    """Espera o 1º item por até 1s e acumula outros por até DAEMON_ESPERA_LOTE (ou DAEMON_LOTE itens)."""
+    try:
+        lote = [fila.get(timeout=1)]
+    except queue.Empty:
+        return []
+    limite = time.monotonic() + DAEMON_ESPERA_LOTE
+    while len(lote) < DAEMON_LOTE:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            lote.append(fila.get(timeout=restante))
+        except queue.Empty:
+            break
+    return list(dict.fromkeys(lote))
+
+# ---------------------- THREADS ----------------------
+
+def produtor_e1(engine, fila_saida: queue.Queue):
+    """E1 em loop: só links inéditos dos feeds passam pela resolução/extração."""
+    urls_historicas = E1.get_urls_historicas_db(engine)
+    links_vistos = set()
+    while not parar.is_set():
+        inicio = time.monotonic()
+        novas = []
+        try:
+            if len(links_vistos) > DAEMON_MAX_LINKS_VISTOS:
+                links_vistos.clear() # O histórico de URLs finais continua filtrando duplicatas
+            novas = E1.coletar_novas_noticias(engine, urls_historicas, links_vistos)
+        except Exception:
+            logging.exception("[E1] Falha no ciclo de coleta.")
+        finally:
+            E1.fechar_drivers()
+        if novas:
+            logging.info(f"[E1] {len(novas)} notícia(s) nova(s) em {time.monotonic() - inicio:.1f}s.")
+            _colocar(fila_saida, novas)
+        parar.wait(max(0.0, DAEMON_INTERVALO_E1 - (time.monotonic() - inicio)))
+
+def consumidor(nome: str, fila_entrada: queue.Queue, processar, fila_saida: queue.Queue = None):
+    """
+    Loop de uma etapa: processa micro-lotes da fila de entrada e publica na fila de saída
+    as URLs que avançaram. A primeira passada (e uma a cada DAEMON_VARREDURA) é uma
+    varredura completa do DB (urls=None).
+    """
+    ultima_varredura = None
+    while not parar.is_set():
+        if ultima_varredura is None or time.monotonic() - ultima_varredura >= DAEMON_VARREDURA:
+            urls = None
+            ultima_varredura = time.monotonic()
+        else:
+            urls = _coletar_lote(fila_entrada)
+            if not urls:
+                continue
+        inicio = time.monotonic()
+        try:
+            avancaram = processar(urls)
+        except Exception:
+            logging.exception(f"[{nome}] Falha ao processar o lote (as linhas seguem pendentes no DB).")
+            continue
+        metricas.observar('etapa_duracao_segundos', time.monotonic() - inicio, etapa=nome)
+        origem = "varredura" if urls is None else f"lote de {len(urls)}"
+        logging.info(f"[{nome}] {origem}: {len(avancaram)} avançaram em {time.monotonic() - inicio:.1f}s.")
+        if fila_saida is not None and avancaram:
+            _colocar(fila_saida, avancaram)
+
+def loop_monitores():
+    while not parar.is_set():
+        inicio = time.monotonic()
+        try:
+            monitores.main()
+        except Exception:
+            logging.exception("[MONITORES] Falha na execução.")
+        parar.wait(max(0.0, DAEMON_INTERVALO_MONITORES - (time.monotonic() - inicio)))
+
+def loop_metricas(engine):
+    """Contadores são cumulativos desde o início do daemon; o backlog é medido a cada exportação."""
+    while not parar.wait(DAEMON_INTERVALO_METRICAS):
+        try:
+            metricas.coletar_backlog(engine)
+            metricas.exportar_textfile()
+        except Exception:
+            logging.exception("[METRICAS] Falha ao exportar as métricas.")
+
+# ---------------------- MAIN ----------------------
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(threadName)s | %(message)s')
+    if not E2.GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY não encontrado no .env")
+
+    # Uma engine para todas as etapas (WAL + busy_timeout: as threads escrevem no mesmo SQLite)
+    engine = armazenamento.obter_engine(setup_db.DB_URL)
+    setup_db.garantir_schema(engine)
+    client = Groq(api_key=E2.GROQ_API_KEY) # Reaproveitado por E2 e E4
+
+    fila_e2, fila_e3, fila_e4, fila_e5 = (queue.Queue(maxsize=DAEMON_TAMANHO_FILA) for _ in range(4))
+    threads = [
+        threading.Thread(target=produtor_e1, args=(engine, fila_e2), name='E1'),
+        threading.Thread(target=consumidor, name='E2',
+                         args=('E2', fila_e2, lambda urls: E2.classificar_pendentes(engine, client, urls), fila_e3)),
+        threading.Thread(target=consumidor, name='E3',
+                         args=('E3', fila_e3, lambda urls: E3.extrair_pendentes(engine, urls), fila_e4)),
+        threading.Thread(target=consumidor, name='E4',
+                         args=('E4', fila_e4, lambda urls: E4.classificar_alvo_pendentes(engine, client, urls), fila_e5)),
+        threading.Thread(target=consumidor, name='E5',
+                         args=('E5', fila_e5, lambda urls: E5.enviar_pendentes(engine, urls))),
+    ]
+    if DAEMON_INTERVALO_MONITORES > 0:
+        threads.append(threading.Thread(target=loop_monitores, name='MONITORES'))
+    if DAEMON_INTERVALO_METRICAS > 0:
+        threads.append(threading.Thread(target=loop_metricas, args=(engine,), name='METRICAS'))
+
+    def encerrar(signum, _frame):
+        logging.info(f"Sinal {signum} recebido: encerrando ao fim dos lotes em andamento...")
+        parar.set()
+    signal.signal(signal.SIGINT, encerrar)
+    signal.signal(signal.SIGTERM, encerrar)
+
+    logging.info(f"🚀 Daemon iniciado: E1 a cada {DAEMON_INTERVALO_E1:.0f}s, filas de {DAEMON_TAMANHO_FILA}, "
+                 f"lotes de até {DAEMON_LOTE}, varredura a cada {DAEMON_VARREDURA:.0f}s.")
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(timeout=1)
+    logging.info("🏁 Daemon encerrado.")
+
+if __name__ == "__main__":
+    main()
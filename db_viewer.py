@@ -1,8 +1,10 @@
 import os
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, inspect
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
+import textos_frios
+import armazenamento
 
 # --- Configuração de Ambiente e Caminhos ---
 load_dotenv()
@@ -23,7 +25,7 @@ TABLE_CERES = "sent_links"
 def get_db_engine(db_url: str):
     """Cria a engine do SQLAlchemy para o DB especificado."""
     try:
-        engine = create_engine(db_url)
+        engine = armazenamento.obter_engine(db_url)
         # Testar a conexão
         with engine.connect() as connection:
             connection.execute(text("SELECT 1"))
@@ -49,6 +51,10 @@ def view_table(engine, table_name: str):
             print("Status: VAZIA.")
             return
 
+        # Textos grandes da tabela principal ficam comprimidos na tabela fria
+        if table_name == TABLE_MAIN and inspect(engine).has_table(textos_frios.TEXTOS_TABLE_NAME):
+            df = textos_frios.anexar_textos(engine, df)
+
         # Limpa o campo 'texto' para visualização no console (mostra apenas os primeiros 50 caracteres)
         if 'texto' in df.columns:
             df['texto'] = df['texto'].str.slice(0, 50) + (df['texto'].apply(lambda x: '...' if isinstance(x, str) and len(x) > 50 else ''))
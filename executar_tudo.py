@@ -1,67 +1,204 @@
 # Script de Orquestração Principal para o Jenkins
+#
+# Uso:
+#     python executar_tudo.py                              (todas as etapas)
+#     python executar_tudo.py --stages E2,E3               (só as etapas pedidas)
+#     python executar_tudo.py --stages MONITORES --monitores e6
+#     python executar_tudo.py --listar
+#
+# As etapas (E1_extracao_DB, E2_interesse_DB... monitores) são importadas só quando rodam:
+# selenium, newspaper, groq etc. não pesam na partida de uma execução que não precisa deles
+# (ver bench_imports.py).
 
-# Ajustando importações para os nomes padronizados no DB
-import E1_extracao_DB as E1
-import E2_interesse_DB as E2
-import E3_noticia_DB as E3
-import E4_alvo_DB as E4
-import E5_alerta_DB as E5
-import E6_cvm_monitor_DB as CVM
-import E7_ceres_monitor_DB as CERES
+import notificacoes
+import metricas # Métricas da execução: textfile do Prometheus + tabela 'runs'
+import setup_db
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+import argparse
+import importlib
 import logging
+import os
 import sys
 import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Configuração simples de logging para o orquestrador
-logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(threadName)s | %(message)s')
 logger = logging.getLogger(__name__)
 
-logger.info("=============================================")
-logger.info("===> INICIANDO O PIPELINE DE ORQUESTRAÇÃO <===")
-logger.info("=============================================")
-
-try:
-    # --- FLUXO PRINCIPAL (SAURION) ---
-    
-    logger.info("\n--- 1/7: Executando E1: Extração e Ingestão de Links ---")
-    E1.main()
-    logger.info("--- E1 CONCLUÍDA. ---")
-
-    logger.info("\n--- 2/7: Executando E2: Classificação de Interesse (LLM) ---")
-    E2.main()
-    logger.info("--- E2 CONCLUÍDA. ---")
-
-    logger.info("\n--- 3/7: Executando E3: Extração do Texto Principal (Newspaper) ---")
-    E3.main()
-    logger.info("--- E3 CONCLUÍDA. ---")
-
-    logger.info("\n--- 4/7: Executando E4: Classificação de Alvo (LLM) ---")
-    E4.main()
-    logger.info("--- E4 CONCLUÍDA. ---")
-
-    logger.info("\n--- 5/7: Executando E5: Envio de Alertas (CD) ---")
-    E5.main()
-    logger.info("--- E5 CONCLUÍDA. ---")
-
-    logger.info("\n==> FLUXO SAURION (E1-E5) FINALIZADO COM SUCESSO! <==")
-    
-    # --- FLUXOS INDEPENDENTES ---
-
-    logger.info("\n--- 6/7: Executando E6: Monitoramento CVM (MUNIN) ---")
-    CVM.main()
-    logger.info("--- E6 CONCLUÍDA. ---")
-
-    logger.info("\n--- 7/7: Executando E7: Monitoramento Ceres (HALL) ---")
-    #CERES.main()
-    logger.info("--- E7 CONCLUÍDA. ---")
-    
+MAX_ETAPAS_PARALELAS = int(os.getenv("MAX_ETAPAS_PARALELAS", 3))
+
+# --- DAG DE ETAPAS ---
+# nome -> (descrição, função, dependências). Ramos sem dependência entre si rodam em paralelo:
+# o fluxo SAURION (E1 -> E5) é uma cadeia; os monitores (E6/E7) não dependem dele.
+# A função é 'modulo:atributo' (importada só quando a etapa roda) ou um callable.
+ETAPAS = {
+    'E1': ("Extração e Ingestão de Links", 'E1_extracao_DB:main', []),
+    'E2': ("Classificação de Interesse (LLM)", 'E2_interesse_DB:main', ['E1']),
+    'E3': ("Extração do Texto Principal (Newspaper)", 'E3_noticia_DB:main', ['E2']),
+    'E4': ("Classificação de Alvo (LLM)", 'E4_alvo_DB:main', ['E3']),
+    'E5': ("Envio de Alertas (CD)", 'E5_alerta_DB:main', ['E4']),
+    'MONITORES': ("Monitores de Entidades (E6 CVM/MUNIN, E7 Ceres/HALL...)", 'monitores:main', []),
+}
+
+def resolver_funcao(funcao):
+    """Importa o módulo de 'modulo:atributo' (só neste momento) e devolve o callable."""
+    if callable(funcao):
+        return funcao
+    modulo, atributo = funcao.split(':')
+    return getattr(importlib.import_module(modulo), atributo)
+
+def selecionar_etapas(etapas: dict, nomes) -> dict:
+    """
+    Restringe o DAG às etapas pedidas (na ordem do DAG). Dependências fora da seleção são
+    consideradas já satisfeitas (cada etapa trabalha sobre o que está pendente no DB).
+    """
+    if not nomes:
+        return dict(etapas)
+    pedidas = {n.strip().upper() for n in nomes if n.strip()}
+    desconhecidas = pedidas - set(etapas)
+    if desconhecidas:
+        raise ValueError(f"Etapas desconhecidas: {sorted(desconhecidas)} (disponíveis: {list(etapas)})")
+    return {
+        nome: (descricao, funcao, [d for d in deps if d in pedidas])
+        for nome, (descricao, funcao, deps) in etapas.items() if nome in pedidas
+    }
+
+def validar_dag(etapas: dict):
+    """Garante que as dependências existem e que não há ciclos."""
+    for nome, (_, _, deps) in etapas.items():
+        faltando = [d for d in deps if d not in etapas]
+        if faltando:
+            raise ValueError(f"Etapa '{nome}' depende de etapas inexistentes: {faltando}")
+    visitando, concluidas = set(), set()
+    def visitar(nome):
+        if nome in concluidas:
+            return
+        if nome in visitando:
+            raise ValueError(f"Ciclo de dependências envolvendo a etapa '{nome}'.")
+        visitando.add(nome)
+        for dep in etapas[nome][2]:
+            visitar(dep)
+        visitando.discard(nome)
+        concluidas.add(nome)
+    for nome in etapas:
+        visitar(nome)
+
+def _executar_etapa(nome: str, descricao: str, funcao):
+    logger.info(f"--- Iniciando {nome}: {descricao} ---")
+    inicio = time.perf_counter()
+    try:
+        resolver_funcao(funcao)()
+    except (Exception, SystemExit) as e:
+        # Um sys.exit() dentro da etapa também é falha da etapa, não do orquestrador
+        logger.exception(f"Erro na etapa {nome}:")
+        duracao = time.perf_counter() - inicio
+        metricas.observar('etapa_duracao_segundos', duracao, etapa=nome)
+        return 'FALHA', duracao, f"{type(e).__name__}: {e}"
+    duracao = time.perf_counter() - inicio
+    metricas.observar('etapa_duracao_segundos', duracao, etapa=nome)
+    return 'SUCESSO', duracao, None
+
+def executar_dag(etapas: dict, max_paralelas: int = MAX_ETAPAS_PARALELAS) -> dict:
+    """
+    Executa as etapas respeitando as dependências, com ramos independentes em paralelo.
+    Uma falha pula apenas as etapas que dependem (direta ou indiretamente) dela.
+    Retorna {nome: {'status': SUCESSO|FALHA|PULADA, 'duracao': s, 'erro': str|None}}.
+    """
+    validar_dag(etapas)
+    resultados = {}
+    pendentes = dict(etapas)
+    em_execucao = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_paralelas), thread_name_prefix='etapa') as executor:
+        while pendentes or em_execucao:
+            # Pula etapas cujas dependências falharam (ou foram puladas)
+            for nome, (_, _, deps) in list(pendentes.items()):
+                bloqueio = next((d for d in deps if resultados.get(d, {}).get('status') in ('FALHA', 'PULADA')), None)
+                if bloqueio:
+                    resultados[nome] = {'status': 'PULADA', 'duracao': 0.0, 'erro': f"dependência {bloqueio} não concluída"}
+                    logger.warning(f"--- {nome} PULADA (dependência {bloqueio} não concluída). ---")
+                    del pendentes[nome]
+            # Dispara as etapas prontas
+            for nome, (descricao, funcao, deps) in list(pendentes.items()):
+                if all(resultados.get(d, {}).get('status') == 'SUCESSO' for d in deps):
+                    em_execucao[executor.submit(_executar_etapa, nome, descricao, funcao)] = nome
+                    del pendentes[nome]
+            if not em_execucao:
+                continue
+            prontas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in prontas:
+                nome = em_execucao.pop(futuro)
+                status, duracao, erro = futuro.result()
+                resultados[nome] = {'status': status, 'duracao': duracao, 'erro': erro}
+                if status == 'SUCESSO':
+                    logger.info(f"--- {nome} CONCLUÍDA em {duracao:.1f}s. ---")
+                else:
+                    logger.error(f"--- {nome} FALHOU após {duracao:.1f}s: {erro} ---")
+    return resultados
+
+def relatorio(resultados: dict, total: float):
+    logger.info("\n================ RESUMO DAS ETAPAS ================")
+    for nome, r in resultados.items():
+        detalhe = f" | {r['erro']}" if r['erro'] else ""
+        logger.info(f"{nome:10} {r['status']:8} {r['duracao']:8.1f}s{detalhe}")
+    logger.info(f"{'TOTAL':10} {'':8} {total:8.1f}s (parede)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Orquestrador do pipeline (DAG de etapas).")
+    parser.add_argument('--stages', '--etapas', dest='etapas',
+                        help=f"Etapas a executar, separadas por vírgula (padrão: todas). Disponíveis: {','.join(ETAPAS)}")
+    parser.add_argument('--monitores', help="Monitores do monitores.yaml para a etapa MONITORES, separados por vírgula.")
+    parser.add_argument('--listar', action='store_true', help="Lista as etapas e dependências e sai.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.listar:
+        for nome, (descricao, _, deps) in ETAPAS.items():
+            print(f"{nome:10} {descricao}" + (f"  (depende de {', '.join(deps)})" if deps else ""))
+        return
+
+    etapas = selecionar_etapas(ETAPAS, args.etapas.split(',') if args.etapas else None)
+    if args.monitores and 'MONITORES' in etapas:
+        nomes_monitores = [n.strip() for n in args.monitores.split(',') if n.strip()]
+        descricao, funcao, deps = etapas['MONITORES']
+        etapas['MONITORES'] = (descricao, lambda: resolver_funcao(funcao)(nomes_monitores), deps)
+
+    logger.info("=============================================")
+    logger.info("===> INICIANDO O PIPELINE DE ORQUESTRAÇÃO <===")
+    logger.info("=============================================")
+
+    inicio = time.perf_counter()
+    inicio_execucao = datetime.now()
+    logger.info(f"Etapas selecionadas: {', '.join(etapas)}")
+    resultados = executar_dag(etapas)
+
+    # Varredura final do outbox: reentrega mensagens reagendadas de qualquer etapa (roda mesmo com falhas)
+    logger.info("\n--- Entregando pendências do outbox de notificações ---")
+    try:
+        notificacoes.entregar_pendentes()
+    except Exception as e:
+        logger.error(f"Falha na varredura final do outbox: {e}")
+
+    relatorio(resultados, time.perf_counter() - inicio)
+
+    # Métricas: backlog por status, linha em 'runs' e textfile do Prometheus (falha aqui não derruba o pipeline)
+    try:
+        engine = armazenamento.obter_engine(setup_db.DB_URL)
+        setup_db.garantir_schema(engine)
+        metricas.registrar_execucao(engine, inicio_execucao, resultados)
+    except Exception as e:
+        logger.error(f"Falha ao registrar as métricas da execução: {e}")
+
+    falhas = [nome for nome, r in resultados.items() if r['status'] != 'SUCESSO']
+    if falhas:
+        logger.error(f"\nEtapas com falha ou puladas: {', '.join(falhas)}")
+        sys.exit(1) # Código de saída 1 para indicar falha no Jenkins
+
     logger.info("\n=============================================")
     logger.info("===> ORQUESTRAÇÃO COMPLETA: SUCESSO TOTAL! <===")
     logger.info("=============================================")
-    
-except Exception as e:
-    logger.error(f"\nOcorreu um ERRO CRÍTICO em uma das etapas: {e}")
-    logger.error("A execução foi interrompida.")
-    sys.exit(1) # Código de saída 1 para indicar falha no Jenkins
 
-    
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import re
+from typing import Optional
+
+import lxml.html
+
+import http_pool
+
+# --- CONFIGURAÇÕES ---
+MIN_CHARS_TEMPLATE = 300 # Abaixo disso o template é considerado falho e o newspaper assume
+
+# Boilerplate comum a quase todos os portais (removido antes de ler o corpo)
+REMOVER_PADRAO = [
+    '//script', '//style', '//noscript', '//iframe', '//figure', '//aside',
+    '//*[contains(@class, "newsletter")]',
+    '//*[contains(@class, "publicidade") or contains(@class, "advert") or contains(@class, " ads")]',
+    '//*[contains(@class, "related") or contains(@class, "relacionad") or contains(@class, "leia-tambem")]',
+    '//*[contains(@class, "share") or contains(@class, "social")]',
+]
+# Parágrafos que começam com estas frases são chamadas internas, não texto da matéria
+FRASES_LIXO_PADRAO = ('leia mais', 'leia também', 'veja também', 'publicidade', 'assine', 'siga o', 'clique aqui')
+
+# ---------------------- REGISTRO DE TEMPLATES POR DOMÍNIO ----------------------
+# Cada domínio declara:
+#   'corpo'      -> XPaths candidatos do contêiner do texto (o primeiro com texto suficiente vence)
+#   'remover'    -> XPaths extras de boilerplate dentro da página
+#   'frases_lixo'-> prefixos extras de parágrafos a descartar
+#   'reescrever' -> (regex, substituição) aplicada à URL antes do download (versão impressão/AMP)
+TEMPLATES = {
+    'valor.globo.com': {
+        'corpo': ['//div[contains(@class, "protected-content")]', '//article'],
+        'remover': ['//*[contains(@class, "content-ads")]', '//*[contains(@class, "block__advertising")]'],
+    },
+    'oglobo.globo.com': {
+        'corpo': ['//div[contains(@class, "protected-content")]', '//article'],
+    },
+    'g1.globo.com': {
+        'corpo': ['//div[contains(@class, "mc-article-body")]', '//article'],
+    },
+    'infomoney.com.br': {
+        'corpo': ['//div[@data-ds-component="article"]', '//div[contains(@class, "im-article")]', '//article'],
+        'frases_lixo': ('conheça', 'baixe'),
+    },
+    'exame.com': {
+        'corpo': ['//div[@id="news-body"]', '//article'],
+    },
+    'estadao.com.br': {
+        'corpo': ['//div[contains(@class, "news-body")]', '//article'],
+        'frases_lixo': ('assine o estadão',),
+    },
+    'folha.uol.com.br': {
+        'corpo': ['//div[contains(@class, "c-news__body")]', '//article'],
+        'frases_lixo': ('folha mercado',),
+    },
+    'braziljournal.com': {
+        'corpo': ['//div[contains(@class, "post-content-text")]', '//article'],
+    },
+    'neofeed.com.br': {
+        'corpo': ['//div[contains(@class, "single-content")]', '//article'],
+    },
+    'moneytimes.com.br': {
+        'corpo': ['//div[contains(@class, "single_block_news_text")]', '//article'],
+    },
+    'investnews.com.br': {
+        'corpo': ['//div[contains(@class, "post-content")]', '//article'],
+    },
+    'seudinheiro.com': {
+        'corpo': ['//div[contains(@class, "newSingle_content")]', '//article'],
+    },
+    'cnnbrasil.com.br': {
+        'corpo': ['//div[contains(@class, "single-content")]', '//article'],
+        'reescrever': (r'^(https://www\.cnnbrasil\.com\.br/.+?)/?$', r'\1/amp/'),
+    },
+}
+
+# ---------------------- FUNÇÕES ----------------------
+
+def template_para(url: str) -> Optional[dict]:
+    """Retorna o template do domínio da URL (inclui subdomínios, ex.: www.), ou None."""
+    host = http_pool.host_de(url)
+    for dominio, template in TEMPLATES.items():
+        if host == dominio or host.endswith('.' + dominio):
+            return template
+    return None
+
+def url_de_download(url: str) -> str:
+    """Aplica a reescrita de URL (impressão/AMP) do template, se houver."""
+    template = template_para(url)
+    if template and template.get('reescrever'):
+        padrao, substituicao = template['reescrever']
+        return re.sub(padrao, substituicao, url)
+    return url
+
+def _limpar(paragrafo: str) -> str:
+    return re.sub(r'\s+', ' ', paragrafo).strip()
+
+def extrair_por_template(url: str, html: str) -> Optional[str]:
+    """
+    Extrai o corpo da notícia com uma única passada de lxml usando o template do domínio.
+    Retorna None para domínios desconhecidos ou quando o resultado é curto demais
+    (o chamador então recorre ao newspaper).
+    """
+    template = template_para(url)
+    if template is None or not html:
+        return None
+    try:
+        doc = lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return None
+
+    for xpath in REMOVER_PADRAO + template.get('remover', []):
+        for el in doc.xpath(xpath):
+            if el.getparent() is not None:
+                el.drop_tree()
+
+    frases_lixo = FRASES_LIXO_PADRAO + tuple(template.get('frases_lixo', ()))
+    for xpath in template['corpo']:
+        for conteiner in doc.xpath(xpath):
+            paragrafos = []
+            for p in conteiner.xpath('.//p | .//h2 | .//li[not(.//p)][not(ancestor::nav)]'):
+                linha = _limpar(p.text_content())
+                if linha and not linha.lower().startswith(frases_lixo):
+                    paragrafos.append(linha)
+            texto = '\n\n'.join(paragrafos)
+            if len(texto) >= MIN_CHARS_TEMPLATE:
+                return texto
+    return None
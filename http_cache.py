@@ -0,0 +1,160 @@
+import os
+import atexit
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from dotenv import load_dotenv
+
+import http_pool
+import armazenamento # Conexão SQLite com WAL (commits do índice sem fsync a cada acesso)
+
+# --- CONFIGURAÇÕES DO CACHE (PADRÃO CI/CD) ---
+load_dotenv()
+DB_DIR = os.environ.get("DATA_DIR", "./data")
+CACHE_DIR = os.path.join(DB_DIR, "http_cache")
+CACHE_INDEX_PATH = os.path.join(CACHE_DIR, "index.db")
+CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", 6 * 3600)) # Segundos até uma página ser considerada velha
+CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 200 * 1024 * 1024)) # Teto do total comprimido em disco
+
+# Parâmetros de rastreamento que não mudam o conteúdo da página
+PARAMS_RASTREAMENTO = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'ocid')
+
+_lock = threading.Lock()
+_con = None
+
+# ---------------------- CHAVE CANÔNICA ----------------------
+
+def canonizar_url(url: str) -> str:
+    """Normaliza a URL (esquema/host em minúsculas, sem fragmento nem parâmetros de rastreamento)."""
+    partes = urlsplit(str(url).strip())
+    query = [
+        (k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if not k.lower().startswith(PARAMS_RASTREAMENTO)
+    ]
+    path = partes.path or '/'
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), path, urlencode(sorted(query)), ''))
+
+def chave_de(url: str) -> str:
+    """Chave de conteúdo: SHA-256 da URL canônica (também é o nome do arquivo em disco)."""
+    return hashlib.sha256(canonizar_url(url).encode('utf-8')).hexdigest()
+
+def _caminho(chave: str) -> str:
+    return os.path.join(CACHE_DIR, chave[:2], f"{chave}.html.z")
+
+# ---------------------- ÍNDICE (SQLITE) ----------------------
+
+def _get_con() -> sqlite3.Connection:
+    """Conexão única com o índice do cache (protegida por _lock)."""
+    global _con
+    if _con is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        con = armazenamento.conectar_sqlite(CACHE_INDEX_PATH, check_same_thread=False)
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave       TEXT PRIMARY KEY,
+                url         TEXT NOT NULL,
+                tamanho     INTEGER NOT NULL,
+                criado_em   REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+            """
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS ix_respostas_acessado ON respostas(acessado_em)")
+        con.commit()
+        _con = con
+    return _con
+
+def fechar():
+    """Fecha o índice (ao fechar a última conexão o SQLite consolida o WAL no arquivo principal)."""
+    global _con
+    with _lock:
+        if _con is not None:
+            _con.close()
+            _con = None
+
+atexit.register(fechar)
+
+def _remover(con: sqlite3.Connection, chave: str):
+    con.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+    try:
+        os.remove(_caminho(chave))
+    except FileNotFoundError:
+        pass
+
+# ---------------------- API PÚBLICA ----------------------
+
+def obter(url: str, ttl: float = CACHE_TTL) -> Optional[str]:
+    """Retorna o HTML em cache para a URL, ou None se ausente/expirado."""
+    chave = chave_de(url)
+    agora = time.time()
+    with _lock:
+        con = _get_con()
+        row = con.execute("SELECT criado_em FROM respostas WHERE chave = ?", (chave,)).fetchone()
+        if row is None:
+            return None
+        if agora - row[0] > ttl:
+            _remover(con, chave)
+            con.commit()
+            return None
+        try:
+            with open(_caminho(chave), 'rb') as f:
+                dados = f.read()
+        except FileNotFoundError:
+            _remover(con, chave)
+            con.commit()
+            return None
+        con.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+        con.commit()
+    return zlib.decompress(dados).decode('utf-8')
+
+def guardar(url: str, html: str):
+    """Grava o HTML comprimido em disco e aplica a poda por tamanho total (LRU)."""
+    chave = chave_de(url)
+    dados = zlib.compress(html.encode('utf-8'), 6)
+    caminho = _caminho(chave)
+    agora = time.time()
+    with _lock:
+        con = _get_con()
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = f"{caminho}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(dados)
+        os.replace(tmp, caminho)
+        con.execute(
+            "INSERT OR REPLACE INTO respostas(chave, url, tamanho, criado_em, acessado_em) VALUES(?, ?, ?, ?, ?)",
+            (chave, canonizar_url(url), len(dados), agora, agora)
+        )
+        _podar(con, agora)
+        con.commit()
+
+def _podar(con: sqlite3.Connection, agora: float):
+    """Remove entradas expiradas e, se o total passar de CACHE_MAX_BYTES, as menos acessadas."""
+    for (chave,) in con.execute("SELECT chave FROM respostas WHERE criado_em < ?", (agora - CACHE_TTL,)).fetchall():
+        _remover(con, chave)
+    total = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+    if total <= CACHE_MAX_BYTES:
+        return
+    for chave, tamanho in con.execute("SELECT chave, tamanho FROM respostas ORDER BY acessado_em").fetchall():
+        _remover(con, chave)
+        total -= tamanho
+        if total <= CACHE_MAX_BYTES * 0.9:
+            break
+
+def baixar_com_cache(url: str, baixar=http_pool.baixar_html) -> str:
+    """Retorna o HTML da URL usando o cache; em caso de ausência, baixa e guarda."""
+    html = obter(url)
+    if html is not None:
+        return html
+    html = baixar(url)
+    if html:
+        try:
+            guardar(url, html)
+        except OSError as e:
+            print(f"AVISO: Falha ao gravar no cache HTTP ({type(e).__name__}) — {url[:90]}")
+    return html
@@ -0,0 +1,141 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict, deque, defaultdict
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+# --- CONFIGURAÇÕES DE HTTP (PADRÃO CI/CD) ---
+load_dotenv()
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
+HTTP_TIMEOUT = (5, 10) # (conexão, leitura)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32)) # Conexões keep-alive mantidas por host
+MAX_POR_HOST = int(os.getenv("MAX_POR_HOST", 2)) # Downloads simultâneos no mesmo domínio
+INTERVALO_POR_HOST = float(os.getenv("INTERVALO_POR_HOST", 0.5)) # Intervalo mínimo entre inícios no mesmo domínio
+
+_session = None
+_session_lock = threading.Lock()
+
+# ---------------------- SESSÃO COMPARTILHADA ----------------------
+
+def get_session() -> requests.Session:
+    """
+    Retorna a sessão HTTP compartilhada do processo (criada sob demanda).
+    O pool de conexões é reaproveitado entre threads, evitando um handshake TCP/TLS por URL.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'User-Agent': USER_AGENT,
+                    'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
+                })
+                _session = session
+    return _session
+
+def host_de(url: str) -> str:
+    """Domínio (hostname em minúsculas) usado como chave de agendamento."""
+    try:
+        return (urlparse(url).hostname or "").lower()
+    except Exception:
+        return ""
+
+def baixar_html(url: str, timeout=HTTP_TIMEOUT) -> str:
+    """Baixa uma página pela sessão compartilhada e retorna o HTML decodificado."""
+    resp = get_session().get(url, timeout=timeout, allow_redirects=True)
+    resp.raise_for_status()
+    # Sem charset no cabeçalho o requests assume ISO-8859-1; nesse caso confiamos na detecção
+    if not resp.encoding or resp.encoding.lower() == 'iso-8859-1':
+        resp.encoding = resp.apparent_encoding
+    return resp.text
+
+# ---------------------- AGENDAMENTO POR HOST ----------------------
+
+class AgendadorPorHost:
+    """
+    Distribui URLs em round-robin entre domínios.
+    Cada domínio respeita um limite de downloads simultâneos e um intervalo mínimo
+    entre inícios, substituindo a pausa fixa por URL.
+    """
+
+    def __init__(self, urls, max_por_host: int = MAX_POR_HOST, intervalo: float = INTERVALO_POR_HOST):
+        self.max_por_host = max(1, max_por_host)
+        self.intervalo = max(0.0, intervalo)
+        self._filas = OrderedDict()
+        for url in urls:
+            self._filas.setdefault(host_de(url), deque()).append(url)
+        self._ativos = defaultdict(int)
+        self._ultimo_inicio = {}
+        self._cond = threading.Condition()
+
+    def proximo(self):
+        """Bloqueia até algum domínio estar liberado e retorna a próxima URL (ou None se acabou)."""
+        with self._cond:
+            while True:
+                if not self._filas:
+                    return None
+                agora = time.monotonic()
+                espera = None
+                for host in list(self._filas):
+                    # Rotaciona o domínio para o fim, garantindo o round-robin
+                    self._filas.move_to_end(host)
+                    if self._ativos[host] >= self.max_por_host:
+                        continue
+                    restante = self._ultimo_inicio.get(host, float('-inf')) + self.intervalo - agora
+                    if restante > 0:
+                        espera = restante if espera is None else min(espera, restante)
+                        continue
+                    fila = self._filas[host]
+                    url = fila.popleft()
+                    if not fila:
+                        del self._filas[host]
+                    self._ativos[host] += 1
+                    self._ultimo_inicio[host] = agora
+                    return url
+                # Nenhum domínio liberado: espera um download terminar ou o intervalo vencer
+                self._cond.wait(timeout=espera)
+
+    def concluir(self, url: str):
+        """Libera a vaga do domínio da URL processada."""
+        with self._cond:
+            host = host_de(url)
+            self._ativos[host] = max(0, self._ativos[host] - 1)
+            self._cond.notify_all()
+
+def executar_por_host(urls, worker, max_workers: int, max_por_host: int = MAX_POR_HOST, intervalo: float = INTERVALO_POR_HOST):
+    """
+    Executa worker(url) para cada URL com até max_workers threads, respeitando o agendador por host.
+    Gera tuplas (url, resultado, erro) na ordem de conclusão.
+    """
+    agendador = AgendadorPorHost(urls, max_por_host=max_por_host, intervalo=intervalo)
+    resultados = queue.Queue()
+    total = len(urls)
+
+    def loop():
+        while True:
+            url = agendador.proximo()
+            if url is None:
+                return
+            try:
+                resultados.put((url, worker(url), None))
+            except Exception as e:
+                resultados.put((url, None, e))
+            finally:
+                agendador.concluir(url)
+
+    n_threads = max(1, min(max_workers, total or 1))
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for _ in range(n_threads):
+            executor.submit(loop)
+        for _ in range(total):
+            yield resultados.get()
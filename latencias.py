@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Relatório de latência ponta a ponta por notícia, a partir dos timestamps gravados por cada etapa.
+
+Uso:
+    python latencias.py [--dias 7] [--csv saida.csv]
+
+Para cada gestora (e no total) mostra p50/p95 em minutos dos intervalos:
+    publicação -> ingestão      (publicado_em -> timestamp_e1)
+    ingestão -> classificação   (timestamp_e1 -> timestamp_e2)
+    classificação -> alerta     (timestamp_e2 -> timestamp_e5, só notícias alertadas)
+    ingestão -> alerta          (timestamp_e1 -> timestamp_e5)
+Notícias anteriores aos timestamps por etapa simplesmente não entram nos intervalos que não têm.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+import armazenamento
+import setup_db
+
+load_dotenv()
+
+# nome -> (coluna inicial, coluna final)
+INTERVALOS = {
+    'publicacao->ingestao': ('publicado_em', 'timestamp_e1'),
+    'ingestao->classificacao': ('timestamp_e1', 'timestamp_e2'),
+    'classificacao->alerta': ('timestamp_e2', 'timestamp_e5'),
+    'ingestao->alerta': ('timestamp_e1', 'timestamp_e5'),
+}
+
+def carregar_timestamps(engine, desde: datetime) -> pd.DataFrame:
+    colunas = sorted({c for par in INTERVALOS.values() for c in par})
+    query = f"""
+    SELECT gestora, {', '.join(colunas)}
+    FROM {setup_db.TABLE_NAME}
+    WHERE timestamp_e1 >= :desde
+    """
+    df = pd.read_sql(text(query), engine, params={'desde': desde})
+    for coluna in colunas:
+        df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+    return df
+
+def calcular_latencias(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uma linha por (gestora, intervalo) com n, p50 e p95 em minutos; a gestora 'TOTAL' agrega todas.
+    Intervalos negativos (relógio do feed adiantado) são descartados.
+    """
+    linhas = []
+    grupos = [('TOTAL', df)] + list(df.groupby(df['gestora'].fillna('(sem gestora)')))
+    for gestora, grupo in grupos:
+        for nome, (inicio, fim) in INTERVALOS.items():
+            minutos = (grupo[fim] - grupo[inicio]).dt.total_seconds().div(60).dropna()
+            minutos = minutos[minutos >= 0]
+            if minutos.empty:
+                continue
+            linhas.append({
+                'gestora': gestora, 'intervalo': nome, 'n': len(minutos),
+                'p50_min': round(minutos.quantile(0.50), 1), 'p95_min': round(minutos.quantile(0.95), 1),
+            })
+    return pd.DataFrame(linhas, columns=['gestora', 'intervalo', 'n', 'p50_min', 'p95_min'])
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p95 de latência entre etapas, por gestora.")
+    parser.add_argument('--dias', type=float, default=7, help="Janela de notícias ingeridas (padrão: 7 dias).")
+    parser.add_argument('--csv', help="Grava o relatório também em CSV.")
+    args = parser.parse_args()
+
+    engine = armazenamento.obter_engine(setup_db.DB_URL)
+    setup_db.garantir_schema(engine)
+    df = carregar_timestamps(engine, datetime.now() - timedelta(days=args.dias))
+    relatorio = calcular_latencias(df)
+    if relatorio.empty:
+        print(f"Nenhuma notícia com timestamps por etapa nos últimos {args.dias:g} dia(s).")
+        return
+
+    print(f"📊 Latência por etapa ({len(df)} notícias ingeridas nos últimos {args.dias:g} dia(s), em minutos)\n")
+    celulas = relatorio.assign(valor=relatorio.apply(lambda r: f"{r['p50_min']} / {r['p95_min']} (n={r['n']})", axis=1))
+    tabela = celulas.pivot(index='gestora', columns='intervalo', values='valor')
+    tabela = tabela.reindex(columns=[i for i in INTERVALOS if i in tabela.columns]).fillna('-')
+    print("p50 / p95 (n):")
+    with pd.option_context('display.width', 250, 'display.max_columns', None):
+        print(tabela.to_string())
+    if args.csv:
+        relatorio.to_csv(args.csv, index=False)
+        print(f"\n✅ Relatório gravado em {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas do pipeline: contadores, histogramas e gauges em memória, compartilhados pelas etapas.
+
+As etapas só registram (incrementar/observar/definir); quem exporta é o orquestrador:
+    - textfile do Prometheus (METRICAS_TEXTFILE, lido pelo collector textfile do node_exporter);
+    - uma linha na tabela 'runs' por execução (histórico de vazão e backlog no próprio DB).
+
+Uso avulso (backlog atual, sem rodar o pipeline):
+    python metricas.py
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+import armazenamento
+import setup_db
+
+# --- CONFIGURAÇÕES ---
+load_dotenv()
+DB_DIR = os.environ.get("DATA_DIR", "./data")
+METRICAS_TEXTFILE = os.getenv("METRICAS_TEXTFILE", os.path.join(DB_DIR, "metricas.prom")) # Vazio desliga o textfile
+PREFIXO = "pipeline_"
+
+# Limites (em segundos) dos histogramas de duração
+BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+# Descrições (# HELP) das métricas conhecidas
+DESCRICOES = {
+    'feeds_baixados_total': "Feeds RSS baixados pela E1, por resultado.",
+    'links_resolvidos_total': "Links dos feeds resolvidos pela E1, por método (direto/selenium/falha).",
+    'descartes_total': "Páginas descartadas pela E1, por motivo.",
+    'chamadas_llm_total': "Chamadas ao LLM, por etapa e resultado.",
+    'linhas_atualizadas_total': "Linhas gravadas no DB, por etapa.",
+    'etapa_duracao_segundos': "Duração das etapas (ou dos lotes, no modo daemon).",
+    'backlog': "Linhas de 'noticias' por etapa e status.",
+    'etapa_sucesso': "1 se a etapa terminou com sucesso na última execução.",
+    'ultima_execucao_timestamp': "Fim da última execução (epoch).",
+}
+
+_lock = threading.Lock()
+_contadores = {} # (nome, rótulos) -> valor
+_gauges = {} # (nome, rótulos) -> valor
+_histogramas = {} # (nome, rótulos) -> [contagens por bucket..., soma, total]
+
+def _chave(nome: str, rotulos: dict) -> tuple:
+    return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+# ---------------------- REGISTRO ----------------------
+
+def incrementar(nome: str, valor: float = 1, **rotulos):
+    chave = _chave(nome, rotulos)
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+def definir(nome: str, valor: float, **rotulos):
+    with _lock:
+        _gauges[_chave(nome, rotulos)] = valor
+
+def observar(nome: str, valor: float, **rotulos):
+    chave = _chave(nome, rotulos)
+    with _lock:
+        h = _histogramas.setdefault(chave, [0] * len(BUCKETS) + [0.0, 0])
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                h[i] += 1
+        h[-2] += valor
+        h[-1] += 1
+
+@contextmanager
+def cronometro(nome: str, **rotulos):
+    """Observa a duração do bloco no histograma 'nome' (mesmo se o bloco levantar exceção)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nome, time.perf_counter() - inicio, **rotulos)
+
+def coletar_backlog(engine):
+    """Atualiza o gauge 'backlog' com a contagem de linhas por status de cada etapa (E2 a E5)."""
+    with engine.connect() as connection:
+        for etapa in ('e2', 'e3', 'e4', 'e5'):
+            linhas = connection.execute(text(
+                f"SELECT COALESCE(status_{etapa}, 'PENDENTE'), COUNT(*) FROM {setup_db.TABLE_NAME} "
+                f"GROUP BY COALESCE(status_{etapa}, 'PENDENTE')"
+            ))
+            for status, total in linhas:
+                definir('backlog', total, etapa=etapa.upper(), status=status)
+
+def resumo() -> dict:
+    """Contadores e gauges como dicionário simples (gravado na coluna 'metricas' de 'runs')."""
+    def plano(chave):
+        nome, rotulos = chave
+        return nome + ('{' + ','.join(f"{k}={v}" for k, v in rotulos) + '}' if rotulos else '')
+    with _lock:
+        dados = {plano(c): v for c, v in _contadores.items()}
+        dados.update({plano(c): v for c, v in _gauges.items()})
+    return dict(sorted(dados.items()))
+
+# ---------------------- EXPORTAÇÃO ----------------------
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def _rotulos(rotulos, extra=()) -> str:
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+def formatar_prometheus() -> str:
+    """Texto no formato de exposição do Prometheus (0.0.4)."""
+    with _lock:
+        series = [('counter', _contadores), ('gauge', _gauges), ('histogram', _histogramas)]
+        series = [(tipo, sorted(dados.items())) for tipo, dados in series]
+    linhas = []
+    for tipo, itens in series:
+        nomes_vistos = set()
+        for (nome, rotulos), valor in itens:
+            completo = PREFIXO + nome
+            if nome not in nomes_vistos:
+                nomes_vistos.add(nome)
+                linhas.append(f"# HELP {completo} {DESCRICOES.get(nome, nome)}")
+                linhas.append(f"# TYPE {completo} {tipo}")
+            if tipo != 'histogram':
+                linhas.append(f"{completo}{_rotulos(rotulos)} {valor}")
+                continue
+            for limite, contagem in zip(BUCKETS, valor):
+                linhas.append(f"{completo}_bucket{_rotulos(rotulos, [('le', str(limite))])} {contagem}")
+            linhas.append(f"{completo}_bucket{_rotulos(rotulos, [('le', '+Inf')])} {valor[-1]}")
+            linhas.append(f"{completo}_sum{_rotulos(rotulos)} {valor[-2]}")
+            linhas.append(f"{completo}_count{_rotulos(rotulos)} {valor[-1]}")
+    return '\n'.join(linhas) + '\n'
+
+def exportar_textfile(caminho: str = METRICAS_TEXTFILE):
+    """Grava o textfile de forma atômica (o node_exporter nunca lê um arquivo pela metade)."""
+    if not caminho:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(formatar_prometheus())
+    os.replace(temporario, caminho)
+
+def registrar_execucao(engine, inicio: datetime, resultados: dict, modo: str = 'cron'):
+    """
+    Fecha a execução: gauges finais, uma linha em 'runs' e o textfile.
+    'resultados' é o dicionário do orquestrador ({etapa: {'status', 'duracao', 'erro'}}).
+    """
+    fim = datetime.now()
+    for etapa, r in resultados.items():
+        definir('etapa_sucesso', 1 if r['status'] == 'SUCESSO' else 0, etapa=etapa)
+    definir('ultima_execucao_timestamp', round(fim.timestamp(), 3))
+    try:
+        coletar_backlog(engine)
+    except Exception as e:
+        print(f"AVISO: Não foi possível medir o backlog: {e}")
+
+    status = 'SUCESSO' if all(r['status'] == 'SUCESSO' for r in resultados.values()) else 'FALHA'
+    linha = setup_db.runs_table.insert().values(
+        modo=modo, inicio=inicio, fim=fim, duracao=(fim - inicio).total_seconds(), status=status,
+        etapas=json.dumps(resultados, ensure_ascii=False),
+        metricas=json.dumps(resumo(), ensure_ascii=False),
+    )
+    armazenamento.escrever(engine, lambda connection: connection.execute(linha))
+    exportar_textfile()
+
+if __name__ == "__main__":
+    engine = armazenamento.obter_engine(setup_db.DB_URL)
+    setup_db.garantir_schema(engine)
+    coletar_backlog(engine)
+    print(formatar_prometheus(), end='')
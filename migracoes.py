@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migrações versionadas do schema de 'noticias' (aplicadas por setup_db.garantir_schema).
+
+Uso:
+    python migracoes.py              (aplica as pendentes e lista as versões)
+    python migracoes.py --explicar   (EXPLAIN QUERY PLAN das filas E2-E5; sai com 1 se alguma fizer full scan)
+
+Cada migração roda uma única vez por banco, numa transação, e fica registrada em 'schema_migracoes'.
+Para mudar o schema, acrescente uma nova entrada em MIGRACOES (nunca edite uma já publicada).
+
+Os índices das filas são parciais (SQLite/PostgreSQL): o WHERE do índice repete os termos
+constantes do WHERE do loader da etapa, então o índice só contém as linhas pendentes daquela
+etapa e não cresce com o histórico. Ao mudar o filtro de um loader, crie uma migração que
+recrie o índice correspondente e confira com --explicar.
+"""
+import re
+import sys
+import threading
+from datetime import datetime
+
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import IntegrityError
+
+import setup_db
+
+TABLE_NAME = setup_db.TABLE_NAME
+DIALETOS_INDICE_PARCIAL = ('sqlite', 'postgresql')
+
+_lock = threading.Lock()
+_aplicadas_no_processo = set() # URLs já migradas neste processo (evita reconsultar a cada etapa)
+
+def _criar_indice(connection, nome: str, colunas: str, where: str = None):
+    """CREATE INDEX idempotente; em dialetos sem índice parcial o WHERE é omitido (índice completo)."""
+    parcial = f" WHERE {where}" if where and connection.dialect.name in DIALETOS_INDICE_PARCIAL else ""
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {TABLE_NAME} ({colunas}){parcial}"))
+
+# ---------------------- MIGRAÇÕES ----------------------
+
+def _m001_indices_das_filas(connection):
+    # E2: WHERE status_e2 = 'PENDENTE'
+    _criar_indice(connection, 'ix_noticias_fila_e2', 'status_e2', "status_e2 = 'PENDENTE'")
+    # E3: pendentes/falhas com interesse e sem texto; a agenda de retentativa é a coluna indexada
+    _criar_indice(connection, 'ix_noticias_fila_e3', 'e3_next_attempt_at',
+                  "(status_e3 IS NULL OR status_e3 IN ('PENDENTE', 'FALHA')) AND interesse = 'S' AND texto IS NULL")
+    # E4: texto extraído e alvo ainda não classificado
+    _criar_indice(connection, 'ix_noticias_fila_e4', 'url',
+                  "interesse = 'S' AND status_e3 = 'CONCLUIDO' AND (status_e4 IS NULL OR status_e4 = 'PENDENTE')")
+    # E5: alvo confirmado e alerta ainda não enviado
+    _criar_indice(connection, 'ix_noticias_fila_e5', 'url',
+                  "alvo = 'S' AND status_e4 = 'CONCLUIDO' AND (status_e5 IS NULL OR status_e5 = 'PENDENTE')")
+    # O índice completo da E3 (status_e3, e3_next_attempt_at) é substituído pelo parcial
+    connection.execute(text("DROP INDEX IF EXISTS ix_noticias_e3_fila"))
+
+def _m002_indice_reservas(connection):
+    # reservas.py: leitura do lote recém-reservado e liberação por token
+    _criar_indice(connection, 'ix_noticias_reserva', 'claimed_by', "claimed_by IS NOT NULL")
+
+def _m003_falhas_antigas_da_e3(connection):
+    # Antes da agenda de retentativas a E3 gravava status_e3 = 'CONCLUIDO' mesmo quando a extração
+    # falhava (a fila antiga olhava só para texto IS NULL). Sem texto, inline ou na tabela fria,
+    # essas linhas voltam como FALHA com a contagem de tentativas zerada.
+    connection.execute(text(f"""
+        UPDATE {TABLE_NAME}
+        SET status_e3 = 'FALHA', e3_attempts = 0, e3_next_attempt_at = NULL
+        WHERE status_e3 = 'CONCLUIDO'
+          AND (texto IS NULL OR texto = '')
+          AND NOT EXISTS (
+                SELECT 1 FROM {setup_db.TEXTOS_TABLE_NAME} t
+                WHERE t.url = {TABLE_NAME}.url AND t.campo = 'texto')
+    """))
+
+def _m004_fila_e3_sem_texto_inline(connection):
+    # A fila da E3 deixou de olhar 'texto IS NULL' (o texto mora só em noticias_textos e a coluna
+    # inline é sempre NULL); o índice parcial passa a ter só os termos de status e interesse
+    connection.execute(text("DROP INDEX IF EXISTS ix_noticias_fila_e3"))
+    _criar_indice(connection, 'ix_noticias_fila_e3', 'e3_next_attempt_at',
+                  "(status_e3 IS NULL OR status_e3 IN ('PENDENTE', 'FALHA')) AND interesse = 'S'")
+
+# (versão, descrição, função(connection)) — em ordem crescente de versão
+MIGRACOES = [
+    (1, "Índices parciais das filas E2-E5 (substitui ix_noticias_e3_fila)", _m001_indices_das_filas),
+    (2, "Índice das reservas por worker (claimed_by)", _m002_indice_reservas),
+    (3, "E3: extrações 'CONCLUIDO' sem texto voltam à fila como FALHA", _m003_falhas_antigas_da_e3),
+    (4, "Índice da fila da E3 sem o termo 'texto IS NULL'", _m004_fila_e3_sem_texto_inline),
+]
+
+# ---------------------- EXECUÇÃO ----------------------
+
+def versoes_aplicadas(connection) -> set:
+    return {linha[0] for linha in connection.execute(text("SELECT versao FROM schema_migracoes"))}
+
+def aplicar_migracoes(engine) -> list:
+    """Aplica as migrações pendentes (cada uma na sua transação). Retorna as versões aplicadas agora."""
+    chave = str(engine.url)
+    with _lock:
+        if chave in _aplicadas_no_processo:
+            return []
+        setup_db.schema_migracoes_table.create(engine, checkfirst=True)
+        with engine.connect() as connection:
+            aplicadas = versoes_aplicadas(connection)
+        novas = []
+        for versao, descricao, funcao in MIGRACOES:
+            if versao in aplicadas:
+                continue
+            try:
+                with engine.begin() as connection:
+                    funcao(connection)
+                    connection.execute(setup_db.schema_migracoes_table.insert().values(
+                        versao=versao, descricao=descricao, aplicada_em=datetime.now()))
+            except IntegrityError:
+                continue # Outro processo aplicou a mesma versão ao mesmo tempo (as migrações são idempotentes)
+            print(f"🔧 Migração {versao:03d} aplicada: {descricao}")
+            novas.append(versao)
+        _aplicadas_no_processo.add(chave)
+        return novas
+
+# ---------------------- VERIFICAÇÃO DOS PLANOS ----------------------
+
+_SCAN_SEM_INDICE = re.compile(r'^SCAN (\S+)$')
+
+def consultas_das_filas() -> dict:
+    """Consultas reais dos loaders (E2-E5), completa e em lote (modo daemon): {nome: (sql, urls, params)}."""
+    import E2_interesse_DB as E2
+    import E3_noticia_DB as E3
+    import E4_alvo_DB as E4
+    import E5_alerta_DB as E5
+    consultas = {}
+    for etapa, sql, params in (
+        ('E2', E2.CONSULTA_FILA_E2, {}),
+        ('E3', E3.CONSULTA_FILA_E3, {'agora': datetime.now()}),
+        ('E4', E4.CONSULTA_FILA_E4, {}),
+        ('E5', E5.CONSULTA_FILA_E5, {}),
+    ):
+        consultas[etapa] = (sql, None, params)
+        consultas[f"{etapa} (lote)"] = (sql, ['https://exemplo/'], params)
+    return consultas
+
+def verificar_planos(engine) -> dict:
+    """
+    Roda EXPLAIN QUERY PLAN em cada consulta de fila (SQLite).
+    Retorna {nome: (usa_indice, [linhas do plano])}; usa_indice é False se houver 'SCAN <tabela>' sem índice.
+    """
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError(f"EXPLAIN QUERY PLAN só é verificado em SQLite (dialeto atual: {engine.dialect.name}).")
+    resultado = {}
+    with engine.connect() as connection:
+        for nome, (sql, urls, params) in consultas_das_filas().items():
+            consulta, parametros = setup_db.consulta_pendentes(f"EXPLAIN QUERY PLAN {sql}", urls, params)
+            plano = [linha[3] for linha in connection.execute(consulta, parametros)]
+            resultado[nome] = (not any(_SCAN_SEM_INDICE.match(p) for p in plano), plano)
+    return resultado
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    import armazenamento
+    engine = armazenamento.obter_engine(setup_db.DB_URL)
+    setup_db.garantir_schema(engine)
+
+    with engine.connect() as connection:
+        aplicadas = versoes_aplicadas(connection)
+    for versao, descricao, _ in MIGRACOES:
+        print(f"{'✅' if versao in aplicadas else '⏳'} {versao:03d} {descricao}")
+    indices = [i['name'] for i in inspect(engine).get_indexes(TABLE_NAME)]
+    print(f"Índices em '{TABLE_NAME}': {', '.join(sorted(indices))}")
+
+    if '--explicar' in argv:
+        falhas = 0
+        for nome, (usa_indice, plano) in verificar_planos(engine).items():
+            falhas += not usa_indice
+            print(f"\n{'✅' if usa_indice else '🚨 FULL SCAN'} {nome}")
+            for linha in plano:
+                print(f"    {linha}")
+        if falhas:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
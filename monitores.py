@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executor único dos monitores de entidades declarados em monitores.yaml.
+
+Uso:
+    python monitores.py [nome ...]    (sem nomes: todos os monitores ativos)
+
+Todos os feeds (RSS) e buscas na CVM de todos os monitores são feitos numa única leva
+concorrente pela sessão HTTP compartilhada; os resumos passam por um único cliente Groq
+e um único pool limitado; o Chrome (fallback da CVM) sobe no máximo uma vez por execução.
+Os módulos de cada tipo (E6 para 'cvm', E7 para 'rss') só são importados se algum monitor
+daquele tipo roda: '--monitores e6' não carrega o groq da E7.
+"""
+import os
+import sys
+import logging
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import feedparser
+import yaml
+from dotenv import load_dotenv
+
+import http_pool # Sessão HTTP keep-alive compartilhada
+import notificacoes # Outbox compartilhado de alertas (entrega com retentativa e dedup)
+
+# --- CONFIGURAÇÕES (PADRÃO CI/CD) ---
+load_dotenv()
+DB_DIR = os.environ.get("DATA_DIR", "./data")
+MONITORES_PATH = os.getenv("MONITORES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitores.yaml"))
+MAX_WORKERS_MONITORES = int(os.getenv("MAX_WORKERS_MONITORES", 8)) # Feeds/buscas simultâneos entre todos os monitores
+FEED_TIMEOUT = (5, 20)
+
+# Campos obrigatórios por tipo de monitor
+CAMPOS_OBRIGATORIOS = {
+    'rss': ('nome', 'canal', 'dedup', 'feeds'),
+    'cvm': ('nome', 'canal', 'dedup', 'palavras_chave'),
+}
+
+# Módulo que implementa cada tipo (importado só quando o tipo roda, como as etapas do executar_tudo.py)
+MODULOS_POR_TIPO = {
+    'cvm': 'E6_cvm_monitor_DB',
+    'rss': 'E7_ceres_monitor_DB',
+}
+
+def modulo_do_tipo(tipo: str):
+    return importlib.import_module(MODULOS_POR_TIPO[tipo])
+
+# ---------------------- REGISTRO ----------------------
+
+def carregar_monitores(caminho: str = MONITORES_PATH, nomes=None) -> list:
+    """Lê e valida o registro. Retorna os monitores ativos (ou os pedidos em 'nomes', mesmo inativos)."""
+    with open(caminho, encoding='utf-8') as f:
+        registro = yaml.safe_load(f) or {}
+
+    monitores = []
+    vistos = set()
+    for monitor in registro.get('monitores') or []:
+        tipo = monitor.get('tipo')
+        if tipo not in CAMPOS_OBRIGATORIOS:
+            raise ValueError(f"Monitor '{monitor.get('nome')}': tipo '{tipo}' desconhecido (use {list(CAMPOS_OBRIGATORIOS)}).")
+        faltando = [c for c in CAMPOS_OBRIGATORIOS[tipo] if not monitor.get(c)]
+        if faltando:
+            raise ValueError(f"Monitor '{monitor.get('nome')}': campos obrigatórios ausentes {faltando}.")
+        if monitor['nome'] in vistos:
+            raise ValueError(f"Monitor '{monitor['nome']}' declarado mais de uma vez.")
+        vistos.add(monitor['nome'])
+        monitor['canal'] = str(monitor['canal']).upper()
+        monitores.append(monitor)
+
+    if nomes:
+        desconhecidos = set(nomes) - vistos
+        if desconhecidos:
+            raise ValueError(f"Monitores não encontrados em {caminho}: {sorted(desconhecidos)}")
+        return [m for m in monitores if m['nome'] in nomes]
+    return [m for m in monitores if m.get('ativo', True)]
+
+def caminho_dedup(monitor: dict) -> str:
+    return os.path.join(DB_DIR, monitor['dedup'])
+
+# ---------------------- COLETA (UMA LEVA CONCORRENTE) ----------------------
+
+def baixar_feed(url: str):
+    """Baixa o feed pela sessão compartilhada e o interpreta. Retorna as entradas ([] em caso de falha)."""
+    try:
+        resp = http_pool.get_session().get(url, timeout=FEED_TIMEOUT)
+        resp.raise_for_status()
+    except Exception as e:
+        logging.error(f"Falha ao baixar o feed {url[:80]} ({type(e).__name__}): {e}")
+        return []
+    return feedparser.parse(resp.content).entries
+
+def coletar(monitores: list, estados: dict) -> tuple:
+    """
+    Baixa todos os feeds (sem repetir URLs) e faz todas as buscas na CVM num único pool.
+    Retorna ({url_feed: entradas}, {nome_monitor_cvm: resultados}).
+    """
+    feeds = list(dict.fromkeys(url for m in monitores if m['tipo'] == 'rss' for url in m['feeds']))
+    cvm = [m for m in monitores if m['tipo'] == 'cvm']
+    E6 = modulo_do_tipo('cvm') if cvm else None
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS_MONITORES)) as executor:
+        futuros_feeds = {url: executor.submit(baixar_feed, url) for url in feeds}
+        futuros_cvm = {
+            m['nome']: executor.submit(E6.buscar_palavras_http, m['palavras_chave'], estados[m['nome']])
+            for m in cvm
+        }
+        entradas_por_feed = {url: f.result() for url, f in futuros_feeds.items()}
+        resultados_cvm = {nome: f.result() for nome, f in futuros_cvm.items()}
+    return entradas_por_feed, resultados_cvm
+
+# ---------------------- PROCESSAMENTO ----------------------
+
+def processar_cvm(monitores: list, conexoes: dict, estados: dict, resultados_cvm: dict):
+    """Fallback (um único Chrome para todos os monitores) e alertas de cada monitor da CVM."""
+    if not monitores:
+        return
+    E6 = modulo_do_tipo('cvm')
+    drivers = E6.DriverSobDemanda()
+    try:
+        for monitor in monitores:
+            nome = monitor['nome']
+            try:
+                E6.aplicar_fallback(resultados_cvm[nome], drivers)
+                encontradas, enviadas = E6.processar_resultados(
+                    conexoes[nome], monitor['palavras_chave'], resultados_cvm[nome], estados[nome], monitor['canal']
+                )
+                logging.info(f"[{nome}] {encontradas} notícia(s) nova(s), {enviadas} alerta(s) enfileirado(s).")
+            except Exception:
+                logging.exception(f"[{nome}] Falha ao processar o monitor.")
+    finally:
+        drivers.fechar()
+
+def processar_rss(monitores: list, conexoes: dict, entradas_por_feed: dict):
+    """Anti-join por monitor, resumos num único pool/cliente Groq e marcação em lote."""
+    if not monitores:
+        return
+    E7 = modulo_do_tipo('rss')
+    tarefas = [] # (monitor, entrada)
+    for monitor in monitores:
+        entradas = [e for url in monitor['feeds'] for e in entradas_por_feed.get(url, [])]
+        novas = E7.pick_all_unsent(entradas, conexoes[monitor['nome']])
+        logging.info(f"[{monitor['nome']}] {len(entradas)} entrada(s) no(s) feed(s), {len(novas)} nova(s).")
+        tarefas.extend((monitor, e) for e in novas)
+    if not tarefas:
+        return
+
+    try:
+        client = E7.get_groq_client()
+    except RuntimeError as e:
+        logging.error(f"Erro Crítico de Configuração: {e}")
+        return
+
+    logging.info(f"Gerando {len(tarefas)} resumo(s) com Groq ({E7.MAX_WORKERS_API} workers)…")
+    with ThreadPoolExecutor(max_workers=max(1, min(E7.MAX_WORKERS_API, len(tarefas)))) as executor:
+        resumos = list(executor.map(
+            lambda t: E7.summarize_entry(t[1], client, t[0].get('prompt') or E7.PROMPT_CERES), tarefas
+        ))
+
+    enviados = {}
+    for (monitor, entry), resumo in zip(tarefas, resumos):
+        link = getattr(entry, "link", "")
+        texto = E7.build_message(getattr(entry, "title", "Sem título"), link, resumo,
+                                 monitor.get('mensagem') or E7.MENSAGEM_CERES)
+        E7.enqueue_google_chat(link, texto, monitor['canal'], monitor['nome'])
+        enviados.setdefault(monitor['nome'], []).append(link)
+    for nome, links in enviados.items():
+        E7.mark_sent(conexoes[nome], links)
+
+def executar(monitores: list):
+    """Executa os monitores informados numa única passada e entrega o outbox dos seus canais."""
+    if not monitores:
+        logging.info("Nenhum monitor ativo.")
+        return
+
+    conexoes, estados = {}, {}
+    try:
+        for monitor in monitores:
+            modulo = modulo_do_tipo(monitor['tipo'])
+            if monitor['tipo'] == 'cvm':
+                con = modulo.db_init(caminho_dedup(monitor))
+                if con is None:
+                    raise RuntimeError(f"[{monitor['nome']}] Não foi possível abrir {caminho_dedup(monitor)}.")
+                conexoes[monitor['nome']] = con
+                estados[monitor['nome']] = modulo.load_search_state(con)
+            else:
+                conexoes[monitor['nome']] = modulo.db_init(caminho_dedup(monitor))
+
+        logging.info(f"Coletando {len(monitores)} monitor(es) em paralelo…")
+        entradas_por_feed, resultados_cvm = coletar(monitores, estados)
+
+        processar_cvm([m for m in monitores if m['tipo'] == 'cvm'], conexoes, estados, resultados_cvm)
+        processar_rss([m for m in monitores if m['tipo'] == 'rss'], conexoes, entradas_por_feed)
+    finally:
+        for con in conexoes.values():
+            con.close()
+        # Entrega os alertas enfileirados (inclui pendências de execuções anteriores)
+        try:
+            notificacoes.entregar_pendentes(sorted({m['canal'] for m in monitores}))
+        except Exception as e:
+            logging.error(f"Falha ao entregar os alertas do outbox: {e}")
+
+def main(nomes=None):
+    executar(carregar_monitores(nomes=nomes))
+
+if __name__ == "__main__":
+    modulo_do_tipo('cvm').setup_logging()
+    main(sys.argv[1:] or None)
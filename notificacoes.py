@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import (text, Column, String, Integer, DateTime, Text,
+                        MetaData, Table, Index)
+
+import http_pool
+import armazenamento # Engine compartilhada (pool + pragmas do SQLite)
+
+# --- CONFIGURAÇÕES DO OUTBOX (PADRÃO CI/CD) ---
+load_dotenv()
+DB_DIR = os.environ.get("DATA_DIR", "./data")
+# O outbox padrão é local ao nó. Com vários workers da E5 em máquinas diferentes (RESERVA_LOTE > 0),
+# aponte OUTBOX_DB_URL para o DB compartilhado (ex.: o mesmo DB_URL): a dedup e as mensagens
+# reagendadas precisam ser vistas por todos os workers.
+OUTBOX_DB_URL = os.getenv("OUTBOX_DB_URL", f"sqlite:///{DB_DIR}/outbox.db")
+TABLE_NAME = "outbox"
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", 10))
+OUTBOX_INTERVALO = float(os.getenv("OUTBOX_INTERVALO", 1.0)) # Intervalo mínimo entre POSTs no mesmo webhook
+OUTBOX_MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 30)) # Segundos até a 1ª retentativa (dobra a cada falha)
+OUTBOX_MAX_ESPERA = float(os.getenv("OUTBOX_MAX_ESPERA", 60)) # Retry-After maior que isso é reagendado para a próxima execução
+
+# Canais: o nome é gravado no outbox e a URL vem do ambiente (CHAT_WEBHOOK_URL_<CANAL>),
+# para que o segredo do webhook nunca vá parar no DB commitado. Monitores de monitores.yaml
+# podem declarar canais novos; a varredura geral (canais=None) usa os que têm pendências.
+CANAIS = ('SAURON', 'MUNIN', 'HALL')
+
+metadata = MetaData()
+outbox_table = Table(
+    TABLE_NAME,
+    metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('dedup_key', String, nullable=False, unique=True),
+    Column('canal', String(20), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('refs', Text, nullable=True), # JSON: referências da etapa (ex.: URLs da E5)
+    Column('status', String(20), nullable=False, default='PENDENTE'), # PENDENTE | ENVIADO | FALHA
+    Column('tentativas', Integer, nullable=False, default=0),
+    Column('proxima_tentativa_em', DateTime, nullable=True),
+    Column('criado_em', DateTime, nullable=False),
+    Column('enviado_em', DateTime, nullable=True),
+    Column('ultimo_erro', String, nullable=True),
+    Index('ix_outbox_fila', 'status', 'canal', 'proxima_tentativa_em'),
+)
+
+_engine = None
+
+# ---------------------- DB ----------------------
+
+def get_outbox_engine():
+    """Engine do outbox (criada uma vez por processo, com a tabela garantida)."""
+    global _engine
+    if _engine is None:
+        engine = armazenamento.obter_engine(OUTBOX_DB_URL)
+        metadata.create_all(engine)
+        _engine = engine
+    return _engine
+
+def webhook_do_canal(canal: str):
+    return os.getenv(f"CHAT_WEBHOOK_URL_{canal}")
+
+def enfileirar(canal: str, payload: dict, dedup_key: str, refs=None) -> bool:
+    """
+    Grava a mensagem no outbox. A dedup_key torna a operação idempotente:
+    reenfileirar a mesma mensagem (ex.: etapa reexecutada) não gera envio duplicado.
+    Retorna True se a mensagem foi inserida agora.
+    """
+    def inserir(connection):
+        resultado = connection.execute(
+            text(f"""
+            INSERT INTO {TABLE_NAME}(dedup_key, canal, payload, refs, status, tentativas, criado_em)
+            VALUES(:dedup_key, :canal, :payload, :refs, 'PENDENTE', 0, :agora)
+            ON CONFLICT(dedup_key) DO NOTHING
+            """),
+            {'dedup_key': dedup_key, 'canal': canal, 'payload': json.dumps(payload, ensure_ascii=False),
+             'refs': json.dumps(refs or [], ensure_ascii=False), 'agora': datetime.now()}
+        )
+        return resultado.rowcount == 1
+    return armazenamento.escrever(get_outbox_engine(), inserir)
+
+def refs_pendentes(canal: str) -> set:
+    """
+    Referências (ex.: URLs da E5) já carregadas por mensagens ainda não entregues do canal.
+    A etapa não deve reenfileirá-las: a mensagem reagendada já as leva na próxima entrega.
+    """
+    with get_outbox_engine().connect() as connection:
+        linhas = connection.execute(
+            text(f"SELECT refs FROM {TABLE_NAME} WHERE status = 'PENDENTE' AND canal = :canal"),
+            {'canal': canal}
+        )
+        return {ref for (refs,) in linhas for ref in json.loads(refs or '[]')}
+
+# ---------------------- ENTREGA ----------------------
+
+def _message_id(dedup_key: str) -> str:
+    """ID de mensagem definido pelo cliente: o Chat recusa (409) um segundo envio com o mesmo ID."""
+    return "client-" + hashlib.sha1(dedup_key.encode('utf-8')).hexdigest()[:40]
+
+def _retry_after(resp) -> float:
+    valor = resp.headers.get('Retry-After')
+    if not valor:
+        return OUTBOX_BACKOFF_BASE
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        # Retry-After também pode vir como data HTTP
+        quando = parsedate_to_datetime(valor)
+        return max(0.0, (quando - datetime.now(quando.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return OUTBOX_BACKOFF_BASE
+
+def _agendar_falha(linha: dict, erro: str, espera: float = None) -> dict:
+    """Reagenda com backoff exponencial ou encerra como FALHA ao atingir o limite de tentativas."""
+    tentativas = linha['tentativas'] + 1
+    if tentativas >= OUTBOX_MAX_TENTATIVAS:
+        return {'status': 'FALHA', 'tentativas': tentativas, 'proxima_tentativa_em': None, 'ultimo_erro': erro}
+    if espera is None:
+        espera = OUTBOX_BACKOFF_BASE * (2 ** (tentativas - 1))
+    return {'status': 'PENDENTE', 'tentativas': tentativas,
+            'proxima_tentativa_em': datetime.now() + timedelta(seconds=espera), 'ultimo_erro': erro}
+
+def _entregar_canal(canal: str, linhas: list) -> list:
+    """Entrega sequencialmente as mensagens de um webhook, respeitando 429/Retry-After."""
+    url_webhook = webhook_do_canal(canal)
+    if not url_webhook:
+        logging.error(f"[outbox] CHAT_WEBHOOK_URL_{canal} não configurada; {len(linhas)} mensagem(ns) seguem pendentes.")
+        return [dict(linha, status='PENDENTE', ultimo_erro='WEBHOOK_NAO_CONFIGURADO') for linha in linhas]
+
+    session = http_pool.get_session()
+    atualizacoes = []
+    ultimo_post = 0.0
+    for i, linha in enumerate(linhas):
+        esperas_429 = 0
+        while True:
+            espera = ultimo_post + OUTBOX_INTERVALO - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            ultimo_post = time.monotonic()
+            try:
+                resp = session.post(
+                    url_webhook,
+                    params={'messageId': _message_id(linha['dedup_key'])},
+                    data=linha['payload'].encode('utf-8'),
+                    headers={"Content-Type": "application/json; charset=UTF-8"},
+                    timeout=CHAT_TIMEOUT,
+                )
+            except Exception as e:
+                novo = _agendar_falha(linha, f"HTTP: {type(e).__name__}: {str(e)[:80]}")
+                break
+            if resp.status_code == 429:
+                retry = _retry_after(resp)
+                if retry <= OUTBOX_MAX_ESPERA and esperas_429 < 3:
+                    esperas_429 += 1
+                    logging.warning(f"[outbox:{canal}] 429 recebido; aguardando {retry:.1f}s (Retry-After).")
+                    time.sleep(retry)
+                    continue
+                # Janela longa (ou 429 persistente): reagenda esta e as demais mensagens do canal
+                novo = _agendar_falha(linha, "429: rate limit", espera=retry)
+                atualizacoes.append(dict(linha, **novo))
+                for restante in linhas[i + 1:]:
+                    atualizacoes.append(dict(restante, status='PENDENTE', proxima_tentativa_em=novo['proxima_tentativa_em'],
+                                             ultimo_erro="429: rate limit"))
+                return atualizacoes
+            if resp.status_code == 200 or resp.status_code == 409:
+                # 409 = o messageId já existe: a mensagem foi entregue numa tentativa anterior
+                novo = {'status': 'ENVIADO', 'tentativas': linha['tentativas'] + 1,
+                        'proxima_tentativa_em': None, 'ultimo_erro': None, 'enviado_em': datetime.now()}
+            elif resp.status_code >= 500:
+                novo = _agendar_falha(linha, f"{resp.status_code}: {resp.text[:50]}")
+            else:
+                # Outros 4xx não melhoram com retentativa (payload inválido, webhook revogado...)
+                novo = {'status': 'FALHA', 'tentativas': linha['tentativas'] + 1,
+                        'proxima_tentativa_em': None, 'ultimo_erro': f"{resp.status_code}: {resp.text[:50]}"}
+            break
+        atualizacoes.append(dict(linha, **novo))
+    return atualizacoes
+
+def entregar_pendentes(canais=None, refs=None) -> list:
+    """
+    Entrega todas as mensagens pendentes e vencidas do outbox (um worker por webhook).
+    Com 'refs', só as mensagens que carregam alguma dessas referências (ex.: as URLs reservadas
+    por este worker da E5); as demais ficam para quem as reservou.
+    Retorna uma lista de dicts {'dedup_key', 'canal', 'refs', 'status', 'ultimo_erro'} das mensagens tratadas.
+    """
+    engine = get_outbox_engine()
+    if not canais:
+        with engine.connect() as connection:
+            canais = [r[0] for r in connection.execute(
+                text(f"SELECT DISTINCT canal FROM {TABLE_NAME} WHERE status = 'PENDENTE'")
+            )]
+    canais = list(canais)
+    query = text(f"""
+        SELECT id, dedup_key, canal, payload, refs, tentativas
+        FROM {TABLE_NAME}
+        WHERE status = 'PENDENTE' AND canal = :canal
+          AND (proxima_tentativa_em IS NULL OR proxima_tentativa_em <= :agora)
+        ORDER BY id
+    """)
+    refs = None if refs is None else set(refs)
+    por_canal = {}
+    with engine.connect() as connection:
+        for canal in canais:
+            linhas = [dict(r) for r in connection.execute(query, {'canal': canal, 'agora': datetime.now()}).mappings()]
+            if refs is not None:
+                linhas = [linha for linha in linhas if refs.intersection(json.loads(linha['refs'] or '[]'))]
+            if linhas:
+                por_canal[canal] = linhas
+    if not por_canal:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(por_canal)) as executor:
+        atualizacoes = [a for lote in executor.map(_entregar_canal, por_canal, por_canal.values()) for a in lote]
+
+    armazenamento.escrever(engine, lambda connection: connection.execute(
+        text(f"""
+        UPDATE {TABLE_NAME}
+        SET status = :status, tentativas = :tentativas, proxima_tentativa_em = :proxima_tentativa_em,
+            ultimo_erro = :ultimo_erro, enviado_em = :enviado_em
+        WHERE id = :id
+        """),
+        [{'id': a['id'], 'status': a['status'], 'tentativas': a['tentativas'],
+          'proxima_tentativa_em': a.get('proxima_tentativa_em'), 'ultimo_erro': a.get('ultimo_erro'),
+          'enviado_em': a.get('enviado_em')} for a in atualizacoes]
+    ))
+    enviados = sum(1 for a in atualizacoes if a['status'] == 'ENVIADO')
+    logging.info(f"[outbox] {enviados}/{len(atualizacoes)} mensagem(ns) entregue(s) em {len(por_canal)} canal(is).")
+    return [{'dedup_key': a['dedup_key'], 'canal': a['canal'], 'refs': json.loads(a['refs'] or '[]'),
+             'status': a['status'], 'ultimo_erro': a.get('ultimo_erro')} for a in atualizacoes]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+    entregar_pendentes()
@@ -0,0 +1,98 @@
+import re
+import unicodedata
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Gestoras cujos fundos são exclusivos (definem o tipo do alerta na E5 e a prioridade no pipeline)
+GESTORAS_EXCLUSIVAS = ['Xp Investimentos', 'Vinci', 'Tivio', 'Tarpon', 'Bnp', 'Oceana']
+
+# Termos de reguladores/ações legais no título ou subtítulo (comparados sem acento e em minúsculas)
+PALAVRAS_REGULADOR = (
+    'cvm', 'banco central', 'bacen', 'anbima', 'susep', 'previc', 'policia federal', 'ministerio publico',
+    'processo administrativo', 'sancionador', 'multa', 'inquerito', 'investigacao', 'fraude', 'liquidacao',
+)
+_REGEX_REGULADOR = re.compile(r'\b(' + '|'.join(re.escape(p) for p in PALAVRAS_REGULADOR) + r')\b')
+
+def _normalizar(texto) -> str:
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+def menciona_regulador(*textos) -> bool:
+    return any(_REGEX_REGULADOR.search(_normalizar(t)) for t in textos if t)
+
+def eh_prioritaria(gestora, titulo, subtitulo=None) -> bool:
+    """Notícia de gestora de fundos exclusivos ou com termos de regulador: vale adiantar o trabalho."""
+    return gestora in GESTORAS_EXCLUSIVAS or menciona_regulador(titulo, subtitulo)
+
+# ---------------------- PONTUAÇÃO (ORDEM DAS FILAS DE LLM) ----------------------
+
+# Veículos cujas notícias costumam virar alerta (domínio da URL final, sem 'www.')
+FONTES_PRIORITARIAS = (
+    'valor.globo.com', 'pipelinevalor.globo.com', 'infomoney.com.br', 'exame.com', 'braziljournal.com',
+    'neofeed.com.br', 'bloomberglinea.com.br', 'estadao.com.br', 'folha.uol.com.br', 'oglobo.globo.com',
+)
+PESO_GESTORA = 100
+PESO_REGULADOR = 50
+PESO_RECENCIA = 30 # Notícia recém-publicada; cai pela metade a cada MEIA_VIDA_HORAS
+PESO_CLASSIFICACAO = 10 # Por nível do rótulo da E2 (L0-L5), quando já existe (fila da E4)
+PESO_FONTE = 10
+MEIA_VIDA_HORAS = 24
+
+# Colunas de 'noticias' usadas na pontuação (leves: nada de texto)
+COLUNAS_PONTUACAO = ('url', 'gestora', 'titulo', 'subtitulo', 'classificacao', 'publicado_em', 'timestamp_e1')
+
+def _datahora(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(str(valor))
+    except ValueError:
+        return None
+
+def _dominio(url) -> str:
+    dominio = urlparse(str(url or '')).netloc.lower()
+    return dominio[4:] if dominio.startswith('www.') else dominio
+
+def pontuacao(linha: dict, agora: datetime = None) -> float:
+    """Prioridade de uma linha da fila: gestora exclusiva, regulador, recência, rótulo da E2 e fonte."""
+    pontos = 0.0
+    if linha.get('gestora') in GESTORAS_EXCLUSIVAS:
+        pontos += PESO_GESTORA
+    if menciona_regulador(linha.get('titulo'), linha.get('subtitulo')):
+        pontos += PESO_REGULADOR
+    publicada = _datahora(linha.get('publicado_em')) or _datahora(linha.get('timestamp_e1'))
+    if publicada is not None:
+        idade_horas = max(0.0, ((agora or datetime.now()) - publicada).total_seconds() / 3600)
+        pontos += PESO_RECENCIA * 0.5 ** (idade_horas / MEIA_VIDA_HORAS)
+    nivel = re.match(r'L(\d)', str(linha.get('classificacao') or ''))
+    if nivel:
+        pontos += PESO_CLASSIFICACAO * int(nivel.group(1))
+    if _dominio(linha.get('url')) in FONTES_PRIORITARIAS:
+        pontos += PESO_FONTE
+    return pontos
+
+def ordenar(linhas: list, agora: datetime = None) -> list:
+    """Linhas da fila da maior para a menor pontuação (empates mantêm a ordem do DB)."""
+    agora = agora or datetime.now()
+    return sorted(linhas, key=lambda linha: pontuacao(linha, agora), reverse=True)
+
+def urls_por_prioridade(linhas, agora: datetime = None) -> list:
+    """
+    URLs das 'linhas' (qualquer iterável, ex.: setup_db.iterar_fila) da maior para a menor pontuação,
+    com a mesma regra de desempate de ordenar. Cada linha é pontuada e descartada: só (pontuação, url)
+    fica em memória, não o título/subtítulo do backlog inteiro.
+    """
+    agora = agora or datetime.now()
+    pontuadas = [(-pontuacao(linha, agora), n, linha['url']) for n, linha in enumerate(linhas)]
+    pontuadas.sort()
+    return [url for _, _, url in pontuadas]
+
+def ordem_sql(alias: str = 'n') -> tuple:
+    """
+    Pré-ordenação no SQL da janela de candidatas das reservas (reservas.py): gestoras exclusivas
+    primeiro, depois as mais recentes. Só escolhe quem entra na janela; a ordem dentro dela
+    (e o lote reservado) vem de pontuacao. Retorna (sql, params).
+    """
+    sql = (f"CASE WHEN {alias}.gestora IN :gestoras_prioritarias THEN 0 ELSE 1 END, "
+           f"COALESCE({alias}.publicado_em, {alias}.timestamp_e1) DESC")
+    return sql, {'gestoras_prioritarias': list(GESTORAS_EXCLUSIVAS)}
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reserva (lease) de linhas de 'noticias' por worker, para rodar vários workers da mesma etapa
+(em máquinas diferentes) sobre o mesmo DB sem repetir chamadas ao LLM nem alertas.
+
+Com RESERVA_LOTE > 0, cada etapa processa a fila em lotes: reserva até RESERVA_LOTE linhas
+pendentes (claimed_by = '<etapa>@<worker>#<lote>', lease_expires_at = agora + RESERVA_LEASE_SEGUNDOS),
+processa só essas e repete até não conseguir reservar mais nada. Cada reserva lê uma janela de
+RESERVA_JANELA_FATOR × RESERVA_LOTE candidatas livres (pré-ordenadas no SQL por prioridade.ordem_sql),
+pontua a janela com prioridade.pontuacao (a mesma regra do nó único: gestora, regulador, recência,
+rótulo da E2 e fonte) e reserva as RESERVA_LOTE melhores.
+Uma linha está livre para a etapa se nunca foi reservada, se o lease venceu ou se a reserva é
+de outra etapa (as filas são disjuntas).
+
+- PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED da janela e UPDATE das escolhidas na mesma transação;
+- SQLite (e demais): as duas etapas numa transação do escritor único; o UPDATE confere de novo
+  que a linha continua livre.
+
+Linhas que falharam no lote continuam reservadas até o fim da execução (assim o mesmo laço não as
+reserva de novo) e então são liberadas: a partir daí vale a agenda de retentativas da própria etapa
+(ex.: e3_next_attempt_at), não o lease. Com RESERVA_LOTE=0 (padrão)
+nada muda: a etapa processa a fila inteira de uma vez, como num nó único.
+
+A E5 entrega só as mensagens do outbox das URLs do próprio lote. Com workers em nós diferentes,
+OUTBOX_DB_URL deve apontar para o DB compartilhado (o padrão é um SQLite local ao nó).
+"""
+import os
+import time
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import text, bindparam
+
+import armazenamento
+import prioridade
+import setup_db
+
+# --- CONFIGURAÇÕES ---
+load_dotenv()
+TABLE_NAME = setup_db.TABLE_NAME
+RESERVA_LOTE = int(os.getenv("RESERVA_LOTE", 0)) # Linhas por reserva; 0 desliga as reservas
+RESERVA_LEASE_SEGUNDOS = int(os.getenv("RESERVA_LEASE_SEGUNDOS", 1800)) # Mesmo limite do job do workflow
+RESERVA_JANELA_FATOR = int(os.getenv("RESERVA_JANELA_FATOR", 5)) # Candidatas pontuadas por reserva = fator × lote
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Linha livre para a etapa (ver docstring do módulo); '{a}' é o prefixo do alias da tabela
+_LIVRE = ("({a}claimed_by IS NULL OR {a}lease_expires_at IS NULL "
+          "OR {a}lease_expires_at < :agora_reserva OR {a}claimed_by NOT LIKE :prefixo_etapa)")
+
+def _consulta_candidatas(dialeto: str, consulta: str, com_urls: bool) -> str:
+    fila = f"{consulta} AND url IN :urls" if com_urls else consulta
+    ordem, _ = prioridade.ordem_sql('n')
+    colunas = ', '.join(f"n.{coluna}" for coluna in prioridade.COLUNAS_PONTUACAO)
+    candidatas = f"""
+        SELECT {colunas} FROM {TABLE_NAME} n
+        WHERE n.url IN (SELECT fila.url FROM ({fila}) AS fila)
+          AND {_LIVRE.format(a='n.')}
+        ORDER BY {ordem}
+        LIMIT :janela
+    """
+    if dialeto == 'postgresql':
+        return f"{candidatas} FOR UPDATE OF n SKIP LOCKED"
+    return candidatas
+
+def reservar(engine, etapa: str, consulta: str, params: dict = None, urls=None, limite: int = None) -> tuple:
+    """
+    Reserva até 'limite' linhas da fila da etapa ('consulta' é o CONSULTA_FILA_Ex da etapa, que
+    termina no WHERE), opcionalmente restritas às 'urls'. Retorna (token, [urls reservadas]).
+    """
+    if urls is not None and not urls:
+        return None, []
+    agora = datetime.now()
+    limite = limite or RESERVA_LOTE
+    token = f"{etapa}@{WORKER_ID}#{uuid.uuid4().hex[:8]}"
+    parametros = dict(params or {})
+    parametros.update(prioridade.ordem_sql('n')[1])
+    parametros.update({'agora_reserva': agora, 'prefixo_etapa': f"{etapa}@%",
+                       'janela': limite * max(1, RESERVA_JANELA_FATOR)})
+    if urls is not None:
+        parametros['urls'] = list(urls)
+
+    def executar(connection):
+        comando = text(_consulta_candidatas(connection.dialect.name, consulta, urls is not None))
+        comando = comando.bindparams(bindparam('gestoras_prioritarias', expanding=True))
+        if urls is not None:
+            comando = comando.bindparams(bindparam('urls', expanding=True))
+        candidatas = [dict(linha) for linha in connection.execute(comando, parametros).mappings()]
+        escolhidas = [linha['url'] for linha in prioridade.ordenar(candidatas, agora)[:limite]]
+        if not escolhidas:
+            return []
+        connection.execute(
+            text(f"""
+            UPDATE {TABLE_NAME} SET claimed_by = :token, lease_expires_at = :expira
+            WHERE url IN :escolhidas AND {_LIVRE.format(a='')}
+            """).bindparams(bindparam('escolhidas', expanding=True)),
+            {'token': token, 'expira': agora + timedelta(seconds=RESERVA_LEASE_SEGUNDOS), 'escolhidas': escolhidas,
+             'agora_reserva': agora, 'prefixo_etapa': f"{etapa}@%"}
+        )
+        return [linha[0] for linha in connection.execute(
+            text(f"SELECT url FROM {TABLE_NAME} WHERE claimed_by = :token"), {'token': token})]
+
+    return token, armazenamento.escrever(engine, executar)
+
+def liberar(engine, token: str):
+    """Devolve à fila as linhas ainda reservadas pelo lote 'token' (ex.: o lote falhou no meio)."""
+    armazenamento.escrever(engine, lambda connection: connection.execute(
+        text(f"UPDATE {TABLE_NAME} SET claimed_by = NULL, lease_expires_at = NULL WHERE claimed_by = :token"),
+        {'token': token}
+    ))
+
+def processar_reservando(engine, etapa: str, consulta: str, processar, urls=None, params: dict = None,
+                         prazo: float = None) -> list:
+    """
+    Sem RESERVA_LOTE: processar(urls) uma vez. Com RESERVA_LOTE: reserva lotes da fila da etapa e
+    chama processar(lote) até a fila (visível para este worker) acabar ou o 'prazo' (instante de
+    time.monotonic(), orçamento da execução inteira) passar.
+    Retorna a concatenação das listas devolvidas por 'processar'.
+    Ao final (ou em caso de erro) os lotes são liberados: o que falhou volta à fila da etapa.
+    """
+    if not RESERVA_LOTE:
+        return processar(urls)
+    avancaram = []
+    tokens = []
+    try:
+        while True:
+            if prazo is not None and time.monotonic() >= prazo:
+                print(f"⏱️ {etapa}: orçamento da execução esgotado; nenhum lote novo será reservado.")
+                return avancaram
+            token, lote = reservar(engine, etapa, consulta, params, urls)
+            if not lote:
+                return avancaram
+            tokens.append(token)
+            print(f"🔒 {etapa}: {len(lote)} linha(s) reservada(s) por {WORKER_ID} (lease de {RESERVA_LEASE_SEGUNDOS}s).")
+            avancaram.extend(processar(lote))
+    finally:
+        for token in tokens:
+            liberar(engine, token)
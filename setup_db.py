@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text, Column, String, DateTime, Boolean, UniqueConstraint, MetaData, Table
+from sqlalchemy import text, bindparam, inspect, Column, String, Integer, Float, DateTime, Boolean, LargeBinary, UniqueConstraint, MetaData, Table
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
@@ -8,6 +8,156 @@ from datetime import datetime
 load_dotenv()
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/noticias_pipeline.db")
 TABLE_NAME = "noticias"
+TEXTOS_TABLE_NAME = "noticias_textos"
+LEITURA_BLOCO = int(os.getenv("LEITURA_BLOCO", 200)) # Linhas materializadas por vez nas etapas (memória constante)
+
+# Definição do Schema da Tabela 'noticias' (compartilhada pelas etapas via garantir_schema)
+metadata = MetaData()
+
+noticias_table = Table(
+    TABLE_NAME, 
+    metadata,
+    
+    # COLUNAS ESSENCIAIS DA E1:
+    Column('gestora', String(50), nullable=True),
+    Column('titulo', String, nullable=True),
+    Column('subtitulo', String, nullable=True),
+    
+    # CHAVE PRIMÁRIA/ÚNICA: Crucial para evitar duplicidade
+    Column('url', String, primary_key=True), 
+    
+    # COLUNAS PARA PREENCHIMENTO POSTERIOR (E2, E3, etc.):
+    Column('alvo', String(50), nullable=True),
+    Column('classificacao', String(5), nullable=True), 
+    Column('interesse', String(1), nullable=True), 
+    Column('resposta_modelo', String, nullable=True),
+    Column('texto', String, nullable=True),
+    Column('descricao', String, nullable=True),
+    Column('justificativa_alvo', String, nullable=True),
+    
+    # COLUNAS DE STATUS E RASTREAMENTO:
+    Column('status_e2', String(20), default='PENDENTE'),
+    Column('status_e3', String(20), default='PENDENTE'),
+    Column('status_e4', String(20), default='PENDENTE'), 
+    Column('status_e5', String(20), default='PENDENTE'), 
+    Column('msg_e5_erro', String, nullable=True),
+    Column('timestamp_e1', DateTime, default=datetime.now), # Callable: avaliado a cada INSERT, não no import
+    
+    # CONCLUSÃO DE CADA ETAPA (latência ponta a ponta, ver latencias.py):
+    Column('publicado_em', DateTime, nullable=True), # Data de publicação informada pelo feed
+    Column('timestamp_e2', DateTime, nullable=True), # Classificação de interesse gravada
+    Column('timestamp_e3', DateTime, nullable=True), # Texto extraído (status_e3='CONCLUIDO')
+    Column('timestamp_e4', DateTime, nullable=True), # Classificação de alvo gravada
+    Column('timestamp_e5', DateTime, nullable=True), # Alerta entregue (status_e5='ENVIADO')
+    
+    # AGENDA DE RETENTATIVAS DA E3 (backoff exponencial):
+    Column('e3_attempts', Integer, default=0),
+    Column('e3_next_attempt_at', DateTime, nullable=True),
+    
+    # RESERVA POR WORKER (vários workers no mesmo DB, ver reservas.py):
+    Column('claimed_by', String, nullable=True), # '<etapa>@<worker>#<lote>'
+    Column('lease_expires_at', DateTime, nullable=True),
+    
+    # Adiciona a restrição de unicidade na URL 
+    UniqueConstraint('url', name='uix_url'),
+    
+    # Índices das filas de cada etapa: migrações versionadas (migracoes.py)
+)
+
+# Armazenamento frio: textos grandes ficam fora da linha de 'noticias', comprimidos (ver textos_frios.py)
+noticias_textos_table = Table(
+    TEXTOS_TABLE_NAME,
+    metadata,
+    Column('url', String, primary_key=True),
+    Column('campo', String(30), primary_key=True), # texto | resposta_modelo | justificativa_alvo
+    Column('codec', String(10), nullable=False), # zlib | zstd
+    Column('dados', LargeBinary, nullable=False),
+)
+
+# Histórico de execuções do orquestrador (uma linha por execução, ver metricas.py)
+runs_table = Table(
+    'runs',
+    metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('modo', String(20), nullable=False), # cron | daemon
+    Column('inicio', DateTime, nullable=False),
+    Column('fim', DateTime, nullable=False),
+    Column('duracao', Float, nullable=False), # Segundos (parede)
+    Column('status', String(20), nullable=False), # SUCESSO | FALHA
+    Column('etapas', String, nullable=True), # JSON: {etapa: {status, duracao, erro}}
+    Column('metricas', String, nullable=True), # JSON: contadores e gauges da execução
+)
+
+# Versões de schema já aplicadas neste banco (ver migracoes.py)
+schema_migracoes_table = Table(
+    'schema_migracoes',
+    metadata,
+    Column('versao', Integer, primary_key=True),
+    Column('descricao', String, nullable=False),
+    Column('aplicada_em', DateTime, nullable=False),
+)
+
+def garantir_schema(engine):
+    """
+    Cria a tabela 'noticias' se não existir, adiciona colunas novas em bancos antigos
+    e aplica as migrações versionadas pendentes (índices das filas).
+    Usada pelas etapas no início da execução, já que o pipeline não roda o setup_db.py.
+    """
+    metadata.create_all(engine)
+    existentes = {c['name'] for c in inspect(engine).get_columns(TABLE_NAME)}
+    faltantes = [c for c in noticias_table.columns if c.name not in existentes]
+    if faltantes:
+        with engine.begin() as connection:
+            for coluna in faltantes:
+                tipo = coluna.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {coluna.name} {tipo}"))
+        print(f"🔧 Schema atualizado: colunas adicionadas em '{TABLE_NAME}': {[c.name for c in faltantes]}")
+    import migracoes
+    migracoes.aplicar_migracoes(engine)
+
+def consulta_pendentes(query: str, urls=None, params=None):
+    """
+    Monta a consulta de fila de uma etapa, opcionalmente restrita a um lote de URLs
+    (modo daemon: a fila em memória diz quais linhas olhar; o DB continua decidindo o que está pendente).
+    A consulta recebida deve terminar na cláusula WHERE. Retorna (TextClause, params).
+    """
+    params = dict(params or {})
+    if urls is None:
+        return text(query), params
+    params['urls'] = list(urls)
+    return text(f"{query} AND url IN :urls").bindparams(bindparam('urls', expanding=True)), params
+
+def iterar_fila(engine, query: str, urls=None, params=None, colunas=('url',)):
+    """
+    Linhas (dicts) da fila de uma etapa só com as 'colunas' leves pedidas de 'noticias'
+    (ex.: as da pontuação de prioridade), sem as colunas pesadas da consulta de fila.
+    Entregues uma a uma, lidas do cursor em levas de LEITURA_BLOCO: quem consome decide o que guardar.
+    """
+    consulta, params = consulta_pendentes(
+        f"SELECT {', '.join(colunas)} FROM {TABLE_NAME} WHERE url IN (SELECT fila.url FROM ({query}) AS fila)",
+        urls, params
+    )
+    with engine.connect() as connection:
+        resultado = connection.execution_options(yield_per=LEITURA_BLOCO).execute(consulta, params)
+        for linha in resultado.mappings():
+            yield dict(linha)
+
+def linhas_da_fila(engine, query: str, urls=None, params=None, colunas=('url',)) -> list:
+    """Mesmo que iterar_fila, materializado numa lista."""
+    return list(iterar_fila(engine, query, urls, params, colunas))
+
+def urls_da_fila(engine, query: str, urls=None, params=None) -> list:
+    """
+    Só as URLs da fila de uma etapa (a consulta de fila sem as demais colunas).
+    As etapas leem o conteúdo depois, bloco a bloco (em_blocos), em vez de materializar o backlog inteiro.
+    """
+    return [linha['url'] for linha in iterar_fila(engine, query, urls, params)]
+
+def em_blocos(itens: list, tamanho: int = None):
+    """Fatia 'itens' em listas de até 'tamanho' (padrão LEITURA_BLOCO) elementos."""
+    tamanho = tamanho or LEITURA_BLOCO
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
 
 def setup_database():
     """
@@ -15,44 +165,15 @@ def setup_database():
     """
     print(f"Iniciando setup do banco de dados em: {DB_URL}")
     try:
-        engine = create_engine(DB_URL)
-        metadata = MetaData()
-        
-        # Definição do Schema da Tabela 'noticias'
-        noticias_table = Table(
-            TABLE_NAME, 
-            metadata,
-            
-            # COLUNAS ESSENCIAIS DA E1:
-            Column('gestora', String(50), nullable=True),
-            Column('titulo', String, nullable=True),
-            Column('subtitulo', String, nullable=True),
-            
-            # CHAVE PRIMÁRIA/ÚNICA: Crucial para evitar duplicidade
-            Column('url', String, primary_key=True), 
-            
-            # COLUNAS PARA PREENCHIMENTO POSTERIOR (E2, E3, etc.):
-            Column('alvo', String(50), nullable=True),
-            Column('classificacao', String(5), nullable=True), 
-            Column('interesse', String(1), nullable=True), 
-            Column('resposta_modelo', String, nullable=True),
-            Column('texto', String, nullable=True),
-            Column('descricao', String, nullable=True),
-            Column('justificativa_alvo', String, nullable=True),
-            
-            # COLUNAS DE STATUS E RASTREAMENTO:
-            Column('status_e2', String(20), default='PENDENTE'),
-            Column('status_e3', String(20), default='PENDENTE'),
-            Column('status_e4', String(20), default='PENDENTE'), 
-            Column('status_e5', String(20), default='PENDENTE'), 
-            Column('msg_e5_erro', String, nullable=True),
-            Column('timestamp_e1', DateTime, default=datetime.now()),
-            
-            # Adiciona a restrição de unicidade na URL 
-            UniqueConstraint('url', name='uix_url')
-        )
+        import armazenamento
+        engine = armazenamento.obter_engine(DB_URL)
+        garantir_schema(engine)
         
-        metadata.create_all(engine)
+        # Bancos antigos: move textos grandes inline para a tabela fria comprimida
+        import textos_frios
+        migradas = textos_frios.migrar_textos_inline(engine)
+        if migradas:
+            print(f"🔧 {migradas} notícias tiveram textos movidos para '{TEXTOS_TABLE_NAME}'.")
         
         print(f"✅ Setup concluído. Tabela '{TABLE_NAME}' criada/verificada com sucesso.")
         print("💡 Lembre-se de montar o volume no Jenkins para persistir o arquivo DB.")
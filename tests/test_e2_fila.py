@@ -0,0 +1,47 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+import armazenamento
+import setup_db
+import E2_interesse_DB as E2
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(setup_db, 'LEITURA_BLOCO', 2)
+    monkeypatch.setattr(E2, 'SLEEP_PER_CALL', 0)
+    monkeypatch.setattr(E2, 'MAX_WORKERS_API', 1)
+    monkeypatch.setattr(E2, 'E2_PREFETCH_E3', False)
+    engine = armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+    setup_db.garantir_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [
+            # Mesma data de coleta: a gestora exclusiva vai para o primeiro bloco e as demais seguem a ordem do DB
+            {'url': f"https://a/{i}", 'gestora': 'Vinci' if i == 3 else 'gestora a', 'titulo': f"Título {i}",
+             'subtitulo': 'Subtítulo', 'status_e2': 'PENDENTE', 'timestamp_e1': datetime(2026, 1, 1)}
+            for i in range(4)
+        ])
+    return engine
+
+
+def test_bloco_e_relido_antes_do_llm(engine):
+    classificadas = []
+
+    def create(messages, **kwargs):
+        classificadas.append(messages[-1]['content'])
+        if len(classificadas) == 1:
+            # Outro worker classifica uma notícia do segundo bloco enquanto este ainda está no primeiro
+            with engine.begin() as connection:
+                connection.execute(text("UPDATE noticias SET status_e2 = 'CONCLUIDO' WHERE url = 'https://a/2'"))
+        conteudo = '{"classificacao": "L1", "interesse": "N", "justificativa": "teste"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))])
+
+    cliente = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    E2._classificar_lote(engine, cliente)
+
+    assert len(classificadas) == 3
+    assert 'Título 3' in classificadas[0]
+    assert not any('Título 2' in prompt for prompt in classificadas)
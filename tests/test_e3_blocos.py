@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import text
+
+import armazenamento
+import setup_db
+import E3_noticia_DB as E3
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+    setup_db.garantir_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [
+            {'url': f"https://a/{i}", 'interesse': 'S', 'status_e2': 'CONCLUIDO', 'status_e3': 'PENDENTE', 'e3_attempts': 0}
+            for i in range(5)
+        ])
+    return engine
+
+
+def test_extracao_em_blocos_grava_cada_bloco(engine, monkeypatch):
+    monkeypatch.setattr(setup_db, 'LEITURA_BLOCO', 2)
+    blocos = []
+
+    def extrair(urls):
+        blocos.append(list(urls))
+        for url in urls:
+            ok = int(url.rsplit('/', 1)[1]) % 2 == 0
+            yield {'url': url, 'texto': f"Texto de {url}" if ok else None, 'status_e3': 'CONCLUIDO' if ok else 'FALHA'}
+
+    monkeypatch.setattr(E3, 'extrair_em_pipeline', extrair)
+    concluidas = E3._extrair_lote(engine)
+
+    assert [len(bloco) for bloco in blocos] == [2, 2, 1]
+    assert sorted(concluidas) == ['https://a/0', 'https://a/2', 'https://a/4']
+    with engine.connect() as connection:
+        status = dict(connection.execute(text("SELECT url, status_e3 FROM noticias")).all())
+    assert status == {'https://a/0': 'CONCLUIDO', 'https://a/1': 'FALHA', 'https://a/2': 'CONCLUIDO',
+                      'https://a/3': 'FALHA', 'https://a/4': 'CONCLUIDO'}
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import text
+
+import armazenamento
+import setup_db
+import textos_frios
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+
+
+def _status_e3(engine) -> dict:
+    with engine.connect() as connection:
+        return {url: (status, tentativas) for url, status, tentativas in connection.execute(
+            text("SELECT url, status_e3, e3_attempts FROM noticias"))}
+
+
+def test_m003_devolve_a_fila_as_extracoes_concluidas_sem_texto(engine):
+    # Banco antigo: tabelas criadas, mas nenhuma migração aplicada ainda
+    setup_db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [
+            {'url': 'https://a/sem-texto', 'status_e3': 'CONCLUIDO', 'e3_attempts': 1, 'texto': None},
+            {'url': 'https://a/inline', 'status_e3': 'CONCLUIDO', 'e3_attempts': 1, 'texto': 'Texto inline'},
+            {'url': 'https://a/fria', 'status_e3': 'CONCLUIDO', 'e3_attempts': 1, 'texto': None},
+            {'url': 'https://a/pendente', 'status_e3': 'PENDENTE', 'e3_attempts': 0, 'texto': None},
+        ])
+        textos_frios.gravar_textos(connection, [{'url': 'https://a/fria', 'texto': 'Texto frio'}], 'texto')
+
+    setup_db.garantir_schema(engine)
+
+    assert _status_e3(engine) == {
+        'https://a/sem-texto': ('FALHA', 0),
+        'https://a/inline': ('CONCLUIDO', 1),
+        'https://a/fria': ('CONCLUIDO', 1),
+        'https://a/pendente': ('PENDENTE', 0),
+    }
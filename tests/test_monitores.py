@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def _modulos_carregados(codigo: str) -> set:
+    """Roda 'codigo' num interpretador novo e devolve os módulos importados ao final."""
+    saida = subprocess.run([sys.executable, '-c', f"{codigo}\nimport sys\nprint(' '.join(sys.modules))"],
+                           cwd=RAIZ, capture_output=True, text=True, check=True)
+    return set(saida.stdout.split())
+
+
+def test_import_do_executor_nao_carrega_os_monitores():
+    carregados = _modulos_carregados("import monitores")
+    assert not carregados & {'E6_cvm_monitor_DB', 'E7_ceres_monitor_DB', 'groq'}
+
+
+def test_monitor_cvm_nao_carrega_a_e7():
+    carregados = _modulos_carregados(
+        "import monitores\n"
+        "monitores.processar_rss([], {}, {})\n"
+        "monitores.modulo_do_tipo('cvm')"
+    )
+    assert 'E6_cvm_monitor_DB' in carregados
+    assert not carregados & {'E7_ceres_monitor_DB', 'groq'}
@@ -0,0 +1,57 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+import armazenamento
+import reservas
+import setup_db
+import E2_interesse_DB as E2
+
+
+class ClienteLento:
+    """Cliente Groq falso: cada chamada demora 'atraso' segundos e classifica como interesse='N'."""
+
+    def __init__(self, atraso: float):
+        self.chamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.atraso = atraso
+
+    def _create(self, **kwargs):
+        self.chamadas += 1
+        time.sleep(self.atraso)
+        conteudo = '{"classificacao": "L1", "interesse": "N", "justificativa": "teste"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))])
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(reservas, 'RESERVA_LOTE', 2)
+    monkeypatch.setattr(E2, 'SLEEP_PER_CALL', 0)
+    monkeypatch.setattr(E2, 'MAX_WORKERS_API', 1)
+    monkeypatch.setattr(E2, 'E2_PREFETCH_E3', False)
+    engine = armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+    setup_db.garantir_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [
+            {'url': f"https://a/{i}", 'gestora': 'gestora a', 'titulo': f"Título {i}", 'subtitulo': 'Subtítulo',
+             'status_e2': 'PENDENTE'}
+            for i in range(6)
+        ])
+    return engine
+
+
+def test_orcamento_vale_para_a_execucao_inteira_com_reservas(engine, monkeypatch):
+    monkeypatch.setattr(E2, 'E2_ORCAMENTO_SEGUNDOS', 0.05)
+    cliente = ClienteLento(atraso=0.1)
+
+    E2.classificar_pendentes(engine, cliente)
+
+    # O orçamento acaba durante o primeiro lote: nenhum lote novo é reservado depois dele
+    assert 1 <= cliente.chamadas <= reservas.RESERVA_LOTE
+    with engine.connect() as connection:
+        pendentes = connection.execute(text("SELECT COUNT(*) FROM noticias WHERE status_e2 = 'PENDENTE'")).scalar()
+        reservadas = connection.execute(text("SELECT COUNT(*) FROM noticias WHERE claimed_by IS NOT NULL")).scalar()
+    assert pendentes == 6 - cliente.chamadas
+    assert reservadas == 0
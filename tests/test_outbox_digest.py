@@ -0,0 +1,59 @@
+import json
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import notificacoes
+import E5_alerta_DB as e5
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    """Outbox isolado num SQLite temporário, com o webhook do canal da E5 sem configuração."""
+    monkeypatch.setattr(notificacoes, 'OUTBOX_DB_URL', f"sqlite:///{tmp_path}/outbox.db")
+    monkeypatch.setattr(notificacoes, '_engine', None)
+    monkeypatch.delenv(f"CHAT_WEBHOOK_URL_{e5.CANAL_E5}", raising=False)
+    monkeypatch.setattr(e5, 'E5_MODO_DIGEST', True)
+    return notificacoes.get_outbox_engine()
+
+
+def _noticias(*urls):
+    return pd.DataFrame([{'url': url, 'gestora': 'gestora a', 'titulo': f"Título {url}", 'descricao': 'Resumo'}
+                         for url in urls])
+
+
+def _mensagens_pendentes(engine):
+    with engine.connect() as connection:
+        return [json.loads(refs) for (refs,) in connection.execute(
+            text("SELECT refs FROM outbox WHERE status = 'PENDENTE' ORDER BY id"))]
+
+
+def test_digest_reagendado_nao_e_reenfileirado_com_alertas_novos(outbox):
+    assert e5.enfileirar_alertas(_noticias('https://a/1', 'https://a/2')) == 1
+
+    # Sem webhook configurado a entrega é reagendada, como num 429/5xx: as URLs voltam a PENDENTE
+    resultados = notificacoes.entregar_pendentes([e5.CANAL_E5])
+    assert [e5._status_do_outbox(r)[0] for r in resultados] == ['PENDENTE']
+
+    # Próxima execução: as mesmas notícias continuam na fila da E5, agora com uma nova
+    assert e5.enfileirar_alertas(_noticias('https://a/1', 'https://a/2', 'https://a/3')) == 1
+
+    mensagens = _mensagens_pendentes(outbox)
+    assert sorted(mensagens) == [['https://a/1', 'https://a/2'], ['https://a/3']]
+
+
+def test_digest_reagendado_sem_alertas_novos_nao_gera_mensagem(outbox):
+    e5.enfileirar_alertas(_noticias('https://a/1', 'https://a/2'))
+    notificacoes.entregar_pendentes([e5.CANAL_E5])
+
+    assert e5.enfileirar_alertas(_noticias('https://a/2', 'https://a/1')) == 0
+    assert len(_mensagens_pendentes(outbox)) == 1
+
+
+def test_entrega_com_refs_trata_so_as_mensagens_do_lote(outbox, monkeypatch):
+    monkeypatch.setattr(e5, 'E5_MODO_DIGEST', False)
+    e5.enfileirar_alertas(_noticias('https://a/1', 'https://a/2'))
+
+    resultados = notificacoes.entregar_pendentes([e5.CANAL_E5], refs=['https://a/2'])
+    assert [r['refs'] for r in resultados] == [['https://a/2']]
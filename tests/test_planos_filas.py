@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import event
+
+import armazenamento
+import migracoes
+import reservas
+import setup_db
+import E4_alvo_DB as E4
+
+# Mesmas consultas que migracoes.py --explicar confere: {nome: (sql, urls, params)}
+CONSULTAS = migracoes.consultas_das_filas()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+    setup_db.garantir_schema(engine)
+    return engine
+
+
+def _planos(engine, executar) -> list:
+    """Roda executar() capturando os comandos enviados ao SQLite e devolve o EXPLAIN QUERY PLAN de cada um."""
+    comandos = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capturar)
+    try:
+        executar()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capturar)
+    assert comandos
+    conexao = engine.raw_connection()
+    try:
+        return [[linha[3] for linha in conexao.cursor().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+                for sql, params in comandos]
+    finally:
+        conexao.close()
+
+
+def _full_scans(planos) -> list:
+    return [linha for plano in planos for linha in plano if migracoes._SCAN_SEM_INDICE.match(linha)]
+
+
+def test_consultas_de_fila_usam_indices(engine):
+    planos = migracoes.verificar_planos(engine)
+    assert set(planos) == set(CONSULTAS)
+    assert {nome: plano for nome, (usa_indice, plano) in planos.items() if not usa_indice} == {}
+
+
+@pytest.mark.parametrize('nome', sorted(CONSULTAS))
+def test_linhas_da_fila_usa_indices(engine, nome):
+    sql, urls, params = CONSULTAS[nome]
+    planos = _planos(engine, lambda: setup_db.linhas_da_fila(engine, sql, urls, params, colunas=('url', 'gestora')))
+    assert _full_scans(planos) == []
+
+
+@pytest.mark.parametrize('nome', sorted(CONSULTAS))
+def test_reserva_usa_indices(engine, nome):
+    sql, urls, params = CONSULTAS[nome]
+    etapa = nome.split()[0]
+    planos = _planos(engine, lambda: reservas.reservar(engine, etapa, sql, params, urls, limite=10))
+    assert _full_scans(planos) == []
+
+
+def test_reserva_com_candidatas_usa_indices(engine):
+    # Com uma linha na fila da E2 a reserva chega ao UPDATE das escolhidas e à leitura por token
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [{'url': 'https://a/1', 'status_e2': 'PENDENTE'}])
+    sql, urls, params = CONSULTAS['E2']
+    planos = _planos(engine, lambda: reservas.reservar(engine, 'E2', sql, params, urls, limite=10))
+    assert len(planos) == 3
+    assert _full_scans(planos) == []
+
+
+def test_exists_da_e4_busca_textos_pela_chave(engine):
+    planos = _planos(engine, lambda: setup_db.linhas_da_fila(engine, E4.CONSULTA_FILA_E4))
+    linhas = [linha for plano in planos for linha in plano]
+    assert _full_scans(planos) == []
+    assert any(linha.startswith('SEARCH t USING') for linha in linhas), linhas
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import prioridade
+
+AGORA = datetime(2026, 10, 19, 12, 0)
+
+
+def _linha(**campos):
+    linha = {'url': 'https://exemplo.invalido/noticia', 'gestora': 'gestora qualquer', 'titulo': 'Título',
+             'subtitulo': 'Subtítulo', 'classificacao': None, 'publicado_em': None, 'timestamp_e1': None}
+    linha.update(campos)
+    return linha
+
+
+@pytest.mark.parametrize('campos, peso', [
+    ({'gestora': prioridade.GESTORAS_EXCLUSIVAS[0]}, prioridade.PESO_GESTORA),
+    ({'titulo': 'CVM abre processo contra gestora'}, prioridade.PESO_REGULADOR),
+    ({'subtitulo': 'Inquérito da Polícia Federal'}, prioridade.PESO_REGULADOR), # Sem acento e sem caixa
+    ({'classificacao': 'L3'}, 3 * prioridade.PESO_CLASSIFICACAO),
+    ({'url': 'https://www.infomoney.com.br/mercados/noticia'}, prioridade.PESO_FONTE),
+])
+def test_pesos(campos, peso):
+    assert prioridade.pontuacao(_linha(**campos), AGORA) == pytest.approx(peso)
+
+
+def test_regulador_so_conta_palavra_inteira():
+    assert prioridade.pontuacao(_linha(titulo='Multinacional anuncia resultado'), AGORA) == 0
+
+
+def test_recencia_cai_pela_metade_a_cada_meia_vida():
+    meia_vida = timedelta(hours=prioridade.MEIA_VIDA_HORAS)
+    assert prioridade.pontuacao(_linha(publicado_em=AGORA), AGORA) == pytest.approx(prioridade.PESO_RECENCIA)
+    assert prioridade.pontuacao(_linha(publicado_em=AGORA - meia_vida), AGORA) == pytest.approx(prioridade.PESO_RECENCIA / 2)
+    assert prioridade.pontuacao(_linha(publicado_em=AGORA - 2 * meia_vida), AGORA) == pytest.approx(prioridade.PESO_RECENCIA / 4)
+    # Data no futuro (fuso/relógio do feed) conta como recém-publicada, não acima do peso
+    assert prioridade.pontuacao(_linha(publicado_em=AGORA + meia_vida), AGORA) == pytest.approx(prioridade.PESO_RECENCIA)
+
+
+def test_recencia_usa_timestamp_e1_sem_publicado_em():
+    meia_vida = timedelta(hours=prioridade.MEIA_VIDA_HORAS)
+    coletada = _linha(timestamp_e1=str(AGORA - meia_vida)) # Como o SQLite devolve a coluna
+    assert prioridade.pontuacao(coletada, AGORA) == pytest.approx(prioridade.PESO_RECENCIA / 2)
+    # publicado_em tem precedência sobre a data de coleta
+    publicada = _linha(publicado_em=AGORA, timestamp_e1=AGORA - 10 * meia_vida)
+    assert prioridade.pontuacao(publicada, AGORA) == pytest.approx(prioridade.PESO_RECENCIA)
+    assert prioridade.pontuacao(_linha(timestamp_e1='data inválida'), AGORA) == 0
+
+
+def test_empates_mantem_a_ordem_do_db():
+    linhas = [_linha(url=f"https://a/{i}") for i in range(4)]
+    linhas.insert(2, _linha(url='https://a/exclusiva', gestora=prioridade.GESTORAS_EXCLUSIVAS[0]))
+    esperado = ['https://a/exclusiva', 'https://a/0', 'https://a/1', 'https://a/2', 'https://a/3']
+    assert [linha['url'] for linha in prioridade.ordenar(linhas, AGORA)] == esperado
+    assert prioridade.urls_por_prioridade(iter(linhas), AGORA) == esperado
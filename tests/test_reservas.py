@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import armazenamento
+import reservas
+import setup_db
+import E2_interesse_DB as E2
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(reservas, 'RESERVA_LOTE', 2)
+    engine = armazenamento.obter_engine(f"sqlite:///{tmp_path}/noticias_pipeline.db")
+    setup_db.garantir_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [
+            {'url': f"https://a/{i}", 'gestora': 'gestora a', 'titulo': f"Título {i}", 'status_e2': 'PENDENTE'}
+            for i in range(3)
+        ])
+    return engine
+
+
+def _reservadas(engine) -> list:
+    with engine.connect() as connection:
+        return [linha[0] for linha in connection.execute(
+            text("SELECT url FROM noticias WHERE claimed_by IS NOT NULL OR lease_expires_at IS NOT NULL"))]
+
+
+def test_linhas_que_falharam_sao_liberadas_ao_fim_da_execucao(engine):
+    lotes = []
+
+    def processar(lote):
+        # Só a primeira URL de cada lote avança; as demais "falham" e continuam pendentes na E2
+        lotes.append(sorted(lote))
+        armazenamento.escrever(engine, lambda connection: connection.execute(
+            text("UPDATE noticias SET status_e2 = 'CONCLUIDO' WHERE url = :url"), {'url': sorted(lote)[0]}))
+        return sorted(lote)[:1]
+
+    avancaram = reservas.processar_reservando(engine, 'E2', E2.CONSULTA_FILA_E2, processar)
+
+    # Cada linha é tentada uma única vez na execução, e nenhuma fica presa ao lease depois dela
+    assert sorted(url for lote in lotes for url in lote) == [f"https://a/{i}" for i in range(3)]
+    assert len(avancaram) == len(lotes) == 2
+    assert _reservadas(engine) == []
+
+
+def test_lote_e_liberado_quando_o_processamento_falha(engine):
+    def processar(lote):
+        raise RuntimeError("falha no lote")
+
+    with pytest.raises(RuntimeError):
+        reservas.processar_reservando(engine, 'E2', E2.CONSULTA_FILA_E2, processar)
+    assert _reservadas(engine) == []
+
+
+def test_reserva_escolhe_pela_pontuacao_da_janela(engine):
+    # Mais antiga que as outras, mas com termo de regulador: pela ordem do SQL ficaria por último
+    with engine.begin() as connection:
+        connection.execute(setup_db.noticias_table.insert(), [{
+            'url': 'https://a/cvm', 'gestora': 'gestora a', 'titulo': 'CVM abre processo sancionador',
+            'status_e2': 'PENDENTE', 'timestamp_e1': datetime.now() - timedelta(days=3),
+        }])
+
+    token, lote = reservas.reservar(engine, 'E2', E2.CONSULTA_FILA_E2, limite=1)
+
+    assert lote == ['https://a/cvm']
+    reservas.liberar(engine, token)
+    assert _reservadas(engine) == []
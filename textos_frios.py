@@ -0,0 +1,161 @@
+import os
+import zlib
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+
+import armazenamento
+import setup_db
+
+# zstd é opcional (TEXTOS_CODEC=zstd + pacote 'zstandard'); o codec fica gravado em cada linha
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- CONFIGURAÇÕES ---
+load_dotenv()
+DB_URL = os.getenv("DB_URL", "sqlite:///./data/noticias_pipeline.db")
+TABLE_NAME = setup_db.TABLE_NAME
+TEXTOS_TABLE_NAME = setup_db.TEXTOS_TABLE_NAME
+CAMPOS_FRIOS = ('texto', 'resposta_modelo', 'justificativa_alvo')
+CODEC_PADRAO = 'zstd' if (os.getenv("TEXTOS_CODEC", "zlib") == 'zstd' and zstandard is not None) else 'zlib'
+LOTE_CONSULTA = 500 # URLs por consulta IN (...), abaixo do limite de variáveis do SQLite
+
+# ---------------------- COMPRESSÃO ----------------------
+
+def comprimir(valor: str, codec: str = CODEC_PADRAO) -> bytes:
+    dados = valor.encode('utf-8')
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(dados)
+    return zlib.compress(dados, 9)
+
+def descomprimir(dados: bytes, codec: str) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Texto gravado com zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdDecompressor().decompress(dados).decode('utf-8')
+    return zlib.decompress(dados).decode('utf-8')
+
+# ---------------------- GRAVAÇÃO ----------------------
+
+def gravar_textos(connection, linhas: list, campo: str):
+    """
+    Grava (upsert) o campo de cada linha {'url', campo} na tabela fria, dentro da transação recebida.
+    Valores vazios são ignorados; a linha quente em 'noticias' não é tocada.
+    """
+    if campo not in CAMPOS_FRIOS:
+        raise ValueError(f"Campo '{campo}' não pertence ao armazenamento frio.")
+    registros = [
+        {'url': linha['url'], 'campo': campo, 'codec': CODEC_PADRAO, 'dados': comprimir(str(linha[campo]))}
+        for linha in linhas
+        if linha.get(campo) is not None and not pd.isna(linha.get(campo))
+    ]
+    if not registros:
+        return
+    upsert = {'sqlite': insert_sqlite, 'postgresql': insert_postgresql}.get(connection.dialect.name)
+    if upsert is not None:
+        # Insert do Core: o PostgreSQL recebe o lote em INSERTs de múltiplas linhas (insertmanyvalues)
+        comando = upsert(setup_db.noticias_textos_table)
+        connection.execute(
+            comando.on_conflict_do_update(index_elements=['url', 'campo'],
+                                          set_={'codec': comando.excluded.codec, 'dados': comando.excluded.dados}),
+            registros
+        )
+        return
+    connection.execute(
+        text(f"""
+        INSERT INTO {TEXTOS_TABLE_NAME}(url, campo, codec, dados)
+        VALUES(:url, :campo, :codec, :dados)
+        ON CONFLICT(url, campo) DO UPDATE SET codec = excluded.codec, dados = excluded.dados
+        """),
+        registros
+    )
+
+# ---------------------- LEITURA (ACESSORES TRANSPARENTES) ----------------------
+
+def carregar_textos(engine, urls, campos=CAMPOS_FRIOS) -> dict:
+    """Retorna {url: {campo: texto}} com os textos frios das URLs informadas."""
+    urls = [u for u in dict.fromkeys(urls) if u is not None]
+    resultado = {}
+    if not urls:
+        return resultado
+    query = text(f"""
+        SELECT url, campo, codec, dados
+        FROM {TEXTOS_TABLE_NAME}
+        WHERE url IN :urls AND campo IN :campos
+    """).bindparams(bindparam('urls', expanding=True), bindparam('campos', expanding=True))
+    with engine.connect() as connection:
+        for i in range(0, len(urls), LOTE_CONSULTA):
+            lote = urls[i:i + LOTE_CONSULTA]
+            for url, campo, codec, dados in connection.execute(query, {'urls': lote, 'campos': list(campos)}):
+                resultado.setdefault(url, {})[campo] = descomprimir(dados, codec)
+    return resultado
+
+def anexar_textos(engine, df: pd.DataFrame, campos=CAMPOS_FRIOS) -> pd.DataFrame:
+    """
+    Preenche no DataFrame (coluna 'url' obrigatória) os campos frios pedidos.
+    Valores ainda gravados inline em 'noticias' (bancos não migrados) são preservados.
+    """
+    if df.empty:
+        for campo in campos:
+            if campo not in df.columns:
+                df[campo] = pd.Series(dtype=object)
+        return df
+    frios = carregar_textos(engine, df['url'].tolist(), campos)
+    for campo in campos:
+        valores = df['url'].map(lambda u: frios.get(u, {}).get(campo))
+        if campo in df.columns:
+            df[campo] = valores.where(valores.notna(), df[campo])
+        else:
+            df[campo] = valores
+    return df
+
+def anexar_textos_linhas(engine, linhas: list, campos=CAMPOS_FRIOS) -> list:
+    """Mesmo que anexar_textos, para linhas já materializadas como dicts (leitura em blocos das etapas)."""
+    frios = carregar_textos(engine, [linha['url'] for linha in linhas], campos)
+    for linha in linhas:
+        for campo in campos:
+            valor = frios.get(linha['url'], {}).get(campo)
+            if valor is not None or campo not in linha:
+                linha[campo] = valor
+    return linhas
+
+# ---------------------- MIGRAÇÃO DE BANCOS ANTIGOS ----------------------
+
+def migrar_textos_inline(engine, lote: int = LOTE_CONSULTA) -> int:
+    """
+    Move para a tabela fria os textos ainda gravados inline em 'noticias' e zera as colunas.
+    No SQLite, executa VACUUM ao final para devolver o espaço ao arquivo.
+    Retorna a quantidade de linhas migradas.
+    """
+    setup_db.garantir_schema(engine)
+    filtro = " OR ".join(f"{c} IS NOT NULL" for c in CAMPOS_FRIOS)
+    migradas = 0
+    while True:
+        with engine.begin() as connection:
+            linhas = connection.execute(
+                text(f"SELECT url, {', '.join(CAMPOS_FRIOS)} FROM {TABLE_NAME} WHERE {filtro} LIMIT {int(lote)}")
+            ).mappings().all()
+            if not linhas:
+                break
+            linhas = [dict(l) for l in linhas]
+            for campo in CAMPOS_FRIOS:
+                gravar_textos(connection, linhas, campo)
+            connection.execute(
+                text(f"UPDATE {TABLE_NAME} SET {', '.join(f'{c} = NULL' for c in CAMPOS_FRIOS)} WHERE url = :url"),
+                [{'url': l['url']} for l in linhas]
+            )
+            migradas += len(linhas)
+    if migradas and engine.dialect.name == 'sqlite':
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+    return migradas
+
+if __name__ == "__main__":
+    engine = armazenamento.obter_engine(DB_URL)
+    total = migrar_textos_inline(engine)
+    print(f"✅ {total} notícias com textos movidos para '{TEXTOS_TABLE_NAME}' (codec {CODEC_PADRAO}).")